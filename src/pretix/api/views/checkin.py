@@ -1,5 +1,7 @@
+from collections import Counter
+
 from django.core.exceptions import ValidationError
-from django.db.models import Count, F, Max, OuterRef, Prefetch, Subquery
+from django.db.models import F, Max, OuterRef, Prefetch, Subquery
 from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 from django.utils.functional import cached_property
@@ -17,7 +19,8 @@ from pretix.api.views import RichOrderingFilter
 from pretix.api.views.order import OrderPositionFilter
 from pretix.base.models import Checkin, CheckinList, Order, OrderPosition
 from pretix.base.services.checkin import (
-    CheckInError, RequiredQuestionsError, perform_checkin,
+    CheckInError, RequiredQuestionsError, get_checkin_counters,
+    perform_checkin,
 )
 from pretix.helpers.database import FixedOrderBy
 
@@ -77,43 +80,22 @@ class CheckinListViewSet(viewsets.ModelViewSet):
     @detail_route(methods=['GET'])
     def status(self, *args, **kwargs):
         clist = self.get_object()
-        cqs = Checkin.objects.filter(
-            position__order__event=clist.event,
-            position__order__status__in=[Order.STATUS_PAID] + ([Order.STATUS_PENDING] if clist.include_pending else []),
-            list=clist
-        )
-        pqs = OrderPosition.objects.filter(
-            order__event=clist.event,
-            order__status__in=[Order.STATUS_PAID] + ([Order.STATUS_PENDING] if clist.include_pending else []),
-            subevent=clist.subevent,
-        )
-        if not clist.all_products:
-            pqs = pqs.filter(item__in=clist.limit_products.values_list('id', flat=True))
+        counters = get_checkin_counters(clist)
+        # Check-ins are counted for all dates, positions only for the date of the list
+        checkins = Counter()
+        for (subevent_id, item_id, variation_id), (positions, checkin_count) in counters.items():
+            checkins[(item_id, variation_id)] += checkin_count
+
+        def position_count(item_id=None, variation_id=None):
+            return counters.get((clist.subevent_id, item_id, variation_id), (0, 0))[0]
 
         ev = clist.subevent or clist.event
         response = {
             'event': {
                 'name': str(ev.name),
             },
-            'checkin_count': cqs.count(),
-            'position_count': pqs.count()
-        }
-
-        op_by_item = {
-            p['item']: p['cnt']
-            for p in pqs.order_by().values('item').annotate(cnt=Count('id'))
-        }
-        op_by_variation = {
-            p['variation']: p['cnt']
-            for p in pqs.order_by().values('variation').annotate(cnt=Count('id'))
-        }
-        c_by_item = {
-            p['position__item']: p['cnt']
-            for p in cqs.order_by().values('position__item').annotate(cnt=Count('id'))
-        }
-        c_by_variation = {
-            p['position__variation']: p['cnt']
-            for p in cqs.order_by().values('position__variation').annotate(cnt=Count('id'))
+            'checkin_count': checkins[(None, None)],
+            'position_count': position_count()
         }
 
         if not clist.all_products:
@@ -127,16 +109,16 @@ class CheckinListViewSet(viewsets.ModelViewSet):
                 'id': item.pk,
                 'name': str(item),
                 'admission': item.admission,
-                'checkin_count': c_by_item.get(item.pk, 0),
-                'position_count': op_by_item.get(item.pk, 0),
+                'checkin_count': checkins[(item.pk, None)],
+                'position_count': position_count(item.pk),
                 'variations': []
             }
             for var in item.variations.all():
                 i['variations'].append({
                     'id': var.pk,
                     'value': str(var),
-                    'checkin_count': c_by_variation.get(var.pk, 0),
-                    'position_count': op_by_variation.get(var.pk, 0),
+                    'checkin_count': checkins[(item.pk, var.pk)],
+                    'position_count': position_count(item.pk, var.pk),
                 })
             response['items'].append(i)
 
@@ -2,9 +2,12 @@ import hashlib
 import time
 from typing import Callable, Dict, List
 
+from django.conf import settings
 from django.core.cache import caches
 from django.db.models import Model
 
+from pretix.base.metrics import pretix_cache_requests_total
+
 
 class NamespacedCache:
 
@@ -44,18 +47,37 @@ class NamespacedCache:
     def set(self, key: str, value: str, timeout: int=300):
         return self.cache.set(self._prefix_key(key), value, timeout)
 
+    def _count_lookups(self, hits: int, misses: int):
+        if settings.METRICS_ENABLED:
+            namespace = self.prefixkey.split(":")[0]
+            if hits:
+                pretix_cache_requests_total.inc(hits, namespace=namespace, result="hit")
+            if misses:
+                pretix_cache_requests_total.inc(misses, namespace=namespace, result="miss")
+
     def get(self, key: str) -> str:
-        return self.cache.get(self._prefix_key(key, known_prefix=self._last_prefix))
+        value = self.cache.get(self._prefix_key(key, known_prefix=self._last_prefix))
+        self._count_lookups(int(value is not None), int(value is None))
+        return value
 
     def get_or_set(self, key: str, default: Callable, timeout=300) -> str:
-        return self.cache.get_or_set(
+        missed = []
+
+        def compute():
+            missed.append(True)
+            return default() if callable(default) else default
+
+        value = self.cache.get_or_set(
             self._prefix_key(key, known_prefix=self._last_prefix),
-            default=default,
+            default=compute,
             timeout=timeout
         )
+        self._count_lookups(int(not missed), int(bool(missed)))
+        return value
 
     def get_many(self, keys: List[str]) -> Dict[str, str]:
         values = self.cache.get_many([self._prefix_key(key) for key in keys])
+        self._count_lookups(len(values), len(keys) - len(values))
         newvalues = {}
         for k, v in values.items():
             newvalues[self._strip_prefix(k)] = v
@@ -1,4 +1,9 @@
-from typing import Tuple
+import math
+import tempfile
+from typing import IO, Iterable, List, Optional, Tuple, Union
+from zipfile import ZipFile
+
+from django.db.models import Count, Max, Min
 
 
 class BaseExporter:
@@ -69,3 +74,100 @@ class BaseExporter:
         tasks.
         """
         raise NotImplementedError()  # NOQA
+
+    def render_stream(self, form_data: dict) -> Tuple[str, str, Iterable[Union[str, bytes]]]:
+        """
+        Render the exported file and return a tuple consisting of a filename, a file type
+        and an iterable of file content chunks, e.g. a generator.
+
+        The export will be written to storage chunk by chunk, so you should implement this
+        instead of ``render`` if your export might be very large. The default implementation
+        calls ``render`` and returns its result as a single chunk.
+
+        :type form_data: dict
+        :param form_data: The form data of the export details form
+        """
+        filename, filetype, data = self.render(form_data)
+        return filename, filetype, [data]
+
+    def get_shards(self, form_data: dict) -> Optional[list]:
+        """
+        Exporters that are able to split up a large export into parts that can be rendered
+        in parallel by different workers return a list of shard descriptions here. A shard
+        description can be any JSON-serializable value, e.g. a range of order IDs. Every shard
+        will then be rendered using ``render_shard`` and all shards will be combined using
+        ``merge_shards``.
+
+        The default implementation returns ``None``, which means that the export is always
+        rendered in one piece using ``render_stream``. You should also return ``None`` if an
+        export is small enough to not be worth splitting.
+
+        :type form_data: dict
+        :param form_data: The form data of the export details form
+        """
+        return None
+
+    def render_shard(self, form_data: dict, shard) -> Iterable[Union[str, bytes]]:
+        """
+        Render one part of a sharded export and return an iterable of file content chunks.
+
+        :type form_data: dict
+        :param form_data: The form data of the export details form
+        :param shard: One of the shard descriptions returned by ``get_shards``
+        """
+        raise NotImplementedError()  # NOQA
+
+    def merge_shards(self, form_data: dict, files: List[IO]) -> Tuple[str, str, Iterable[Union[str, bytes]]]:
+        """
+        Combine the rendered parts of a sharded export. Return a tuple consisting of a filename,
+        a file type and an iterable of file content chunks, just like ``render_stream``.
+
+        :type form_data: dict
+        :param form_data: The form data of the export details form
+        :param files: A list of binary file objects with the rendered shards, in the order
+                      that ``get_shards`` returned them in
+        """
+        raise NotImplementedError()  # NOQA
+
+
+def id_range_shards(qs, shard_size: int) -> Optional[List[List[int]]]:
+    """
+    Splits the objects in a queryset into ranges of primary keys with roughly ``shard_size``
+    objects each. Returns a list of ``[min_id, max_id]`` lists or ``None`` if there are not
+    more than ``shard_size`` objects.
+    """
+    agg = qs.order_by().aggregate(min_id=Min('pk'), max_id=Max('pk'), count=Count('pk'))
+    if not agg['count'] or agg['count'] <= shard_size:
+        return None
+    num = math.ceil(agg['count'] / shard_size)
+    step = math.ceil((agg['max_id'] - agg['min_id'] + 1) / num)
+    return [
+        [agg['min_id'] + i * step, min(agg['min_id'] + (i + 1) * step - 1, agg['max_id'])]
+        for i in range(num)
+    ]
+
+
+def concatenate_files(files: List[IO], chunk_size: int=1024 * 1024) -> Iterable[bytes]:
+    """
+    Yields the contents of the given binary files, one after another.
+    """
+    for f in files:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def merge_zip_files(files: List[IO], chunk_size: int=1024 * 1024) -> Iterable[bytes]:
+    """
+    Combines the members of the given ZIP files into one ZIP file and yields its content.
+    """
+    with tempfile.TemporaryFile() as tmp:
+        with ZipFile(tmp, 'w') as target:
+            for f in files:
+                with ZipFile(f, 'r') as source:
+                    for info in source.infolist():
+                        target.writestr(info, source.read(info))
+        tmp.seek(0)
+        yield from concatenate_files([tmp], chunk_size)
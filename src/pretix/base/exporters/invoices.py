@@ -8,7 +8,7 @@ from django import forms
 from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
-from ..exporter import BaseExporter
+from ..exporter import BaseExporter, id_range_shards, merge_zip_files
 from ..services.invoices import invoice_pdf_task
 from ..signals import register_data_exporters
 
@@ -16,8 +16,9 @@ from ..signals import register_data_exporters
 class InvoiceExporter(BaseExporter):
     identifier = 'invoices'
     verbose_name = _('All invoices')
+    SHARD_SIZE = 500
 
-    def render(self, form_data: dict):
+    def _get_queryset(self, form_data: dict):
         qs = self.event.invoices.filter(shredded=False)
 
         if form_data.get('payment_provider'):
@@ -35,6 +36,9 @@ class InvoiceExporter(BaseExporter):
                 date_value = dateutil.parser.parse(date_value).date()
             qs = qs.filter(date__lte=date_value)
 
+        return qs
+
+    def _render_zip(self, qs):
         with tempfile.TemporaryDirectory() as d:
             with ZipFile(os.path.join(d, 'tmp.zip'), 'w') as zipf:
                 for i in qs:
@@ -53,7 +57,22 @@ class InvoiceExporter(BaseExporter):
                         i.file.close()
 
             with open(os.path.join(d, 'tmp.zip'), 'rb') as zipf:
-                return '{}_invoices.zip'.format(self.event.slug), 'application/zip', zipf.read()
+                return zipf.read()
+
+    def render(self, form_data: dict):
+        return '{}_invoices.zip'.format(self.event.slug), 'application/zip', self._render_zip(
+            self._get_queryset(form_data)
+        )
+
+    def get_shards(self, form_data: dict):
+        # Invoice PDFs that do not exist yet are rendered during the export, which is slow
+        return id_range_shards(self._get_queryset(form_data), self.SHARD_SIZE)
+
+    def render_shard(self, form_data: dict, shard):
+        return [self._render_zip(self._get_queryset(form_data).filter(pk__gte=shard[0], pk__lte=shard[1]))]
+
+    def merge_shards(self, form_data: dict, files):
+        return '{}_invoices.zip'.format(self.event.slug), 'application/zip', merge_zip_files(files)
 
     @property
     def export_form_fields(self):
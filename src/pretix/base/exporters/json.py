@@ -4,106 +4,155 @@ from decimal import Decimal
 from django.core.serializers.json import DjangoJSONEncoder
 from django.dispatch import receiver
 
-from ..exporter import BaseExporter
+from pretix.helpers.database import iterate_in_batches
+
+from ..exporter import BaseExporter, concatenate_files, id_range_shards
 from ..signals import register_data_exporters
 
 
 class JSONExporter(BaseExporter):
     identifier = 'json'
     verbose_name = 'JSON'
+    BATCH_SIZE = 500
+    SHARD_SIZE = 20000
 
     def render(self, form_data):
-        jo = {
-            'event': {
-                'name': str(self.event.name),
-                'slug': self.event.slug,
-                'organizer': {
-                    'name': str(self.event.organizer.name),
-                    'slug': self.event.organizer.slug
-                },
-                'categories': [
-                    {
-                        'id': category.id,
-                        'name': str(category.name),
-                        'internal_name': category.internal_name
-                    } for category in self.event.categories.all()
-                ],
-                'items': [
+        filename, filetype, chunks = self.render_stream(form_data)
+        return filename, filetype, ''.join(chunks)
+
+    def render_stream(self, form_data):
+        return '{}_pretixdata.json'.format(self.event.slug), 'application/json', self._stream()
+
+    def _dumps(self, obj):
+        return json.dumps(obj, cls=DjangoJSONEncoder)
+
+    def get_shards(self, form_data):
+        return id_range_shards(self.event.orders.all(), self.SHARD_SIZE)
+
+    def render_shard(self, form_data, shard):
+        return self._orders(self.event.orders.filter(pk__gte=shard[0], pk__lte=shard[1]))
+
+    def merge_shards(self, form_data, files):
+        def merged():
+            yield from self._head()
+            first = True
+            for f in files:
+                for i, chunk in enumerate(concatenate_files([f])):
+                    if i == 0 and not first:
+                        yield ', '
+                    first = False
+                    yield chunk
+            yield from self._tail()
+
+        return '{}_pretixdata.json'.format(self.event.slug), 'application/json', merged()
+
+    def _stream(self):
+        # The output is the same as if we dumped one nested dictionary, but we only hold one batch of
+        # orders in memory at any time.
+        yield from self._head()
+        yield from self._orders(self.event.orders.all())
+        yield from self._tail()
+
+    def _head(self):
+        yield '{"event": {'
+        yield '"name": {}, "slug": {}, "organizer": {}, '.format(
+            self._dumps(str(self.event.name)),
+            self._dumps(self.event.slug),
+            self._dumps({
+                'name': str(self.event.organizer.name),
+                'slug': self.event.organizer.slug
+            }),
+        )
+        yield '"categories": {}, '.format(self._dumps([
+            {
+                'id': category.id,
+                'name': str(category.name),
+                'internal_name': category.internal_name
+            } for category in self.event.categories.all()
+        ]))
+        yield '"items": {}, '.format(self._dumps([
+            {
+                'id': item.id,
+                'name': str(item.name),
+                'internal_name': str(item.internal_name),
+                'category': item.category_id,
+                'price': item.default_price,
+                'tax_rate': item.tax_rule.rate if item.tax_rule else Decimal('0.00'),
+                'tax_name': str(item.tax_rule.name) if item.tax_rule else None,
+                'admission': item.admission,
+                'active': item.active,
+                'variations': [
                     {
-                        'id': item.id,
-                        'name': str(item.name),
-                        'internal_name': str(item.internal_name),
-                        'category': item.category_id,
-                        'price': item.default_price,
-                        'tax_rate': item.tax_rule.rate if item.tax_rule else Decimal('0.00'),
-                        'tax_name': str(item.tax_rule.name) if item.tax_rule else None,
-                        'admission': item.admission,
-                        'active': item.active,
-                        'variations': [
-                            {
-                                'id': variation.id,
-                                'active': variation.active,
-                                'price': variation.default_price if variation.default_price is not None else
-                                item.default_price,
-                                'name': str(variation)
-                            } for variation in item.variations.all()
-                        ]
-                    } for item in self.event.items.select_related('tax_rule').prefetch_related('variations')
-                ],
-                'questions': [
+                        'id': variation.id,
+                        'active': variation.active,
+                        'price': variation.default_price if variation.default_price is not None else
+                        item.default_price,
+                        'name': str(variation)
+                    } for variation in item.variations.all()
+                ]
+            } for item in self.event.items.select_related('tax_rule').prefetch_related('variations')
+        ]))
+        yield '"questions": {}, '.format(self._dumps([
+            {
+                'id': question.id,
+                'question': str(question.question),
+                'type': question.type
+            } for question in self.event.questions.all()
+        ]))
+
+        yield '"orders": ['
+
+    def _orders(self, qs):
+        orders = iterate_in_batches(
+            qs, batch_size=self.BATCH_SIZE,
+            prefetch_related=('positions', 'positions__answers', 'fees')
+        )
+        for i, order in enumerate(orders):
+            yield (', ' if i else '') + self._dumps({
+                'code': order.code,
+                'status': order.status,
+                'user': order.email,
+                'datetime': order.datetime,
+                'fees': [
                     {
-                        'id': question.id,
-                        'question': str(question.question),
-                        'type': question.type
-                    } for question in self.event.questions.all()
+                        'type': fee.fee_type,
+                        'description': fee.description,
+                        'value': fee.value,
+                    } for fee in order.fees.all()
                 ],
-                'orders': [
+                'total': order.total,
+                'positions': [
                     {
-                        'code': order.code,
-                        'status': order.status,
-                        'user': order.email,
-                        'datetime': order.datetime,
-                        'fees': [
-                            {
-                                'type': fee.fee_type,
-                                'description': fee.description,
-                                'value': fee.value,
-                            } for fee in order.fees.all()
-                        ],
-                        'total': order.total,
-                        'positions': [
+                        'id': position.id,
+                        'item': position.item_id,
+                        'variation': position.variation_id,
+                        'price': position.price,
+                        'attendee_name': position.attendee_name,
+                        'attendee_email': position.attendee_email,
+                        'secret': position.secret,
+                        'addon_to': position.addon_to_id,
+                        'answers': [
                             {
-                                'id': position.id,
-                                'item': position.item_id,
-                                'variation': position.variation_id,
-                                'price': position.price,
-                                'attendee_name': position.attendee_name,
-                                'attendee_email': position.attendee_email,
-                                'secret': position.secret,
-                                'addon_to': position.addon_to_id,
-                                'answers': [
-                                    {
-                                        'question': answer.question_id,
-                                        'answer': answer.answer
-                                    } for answer in position.answers.all()
-                                ]
-                            } for position in order.positions.all()
+                                'question': answer.question_id,
+                                'answer': answer.answer
+                            } for answer in position.answers.all()
                         ]
-                    } for order in
-                    self.event.orders.all().prefetch_related('positions', 'positions__answers', 'fees')
-                ],
-                'quotas': [
-                    {
-                        'id': quota.id,
-                        'size': quota.size,
-                        'items': [item.id for item in quota.items.all()],
-                        'variations': [variation.id for variation in quota.variations.all()],
-                    } for quota in self.event.quotas.all().prefetch_related('items', 'variations')
+                    } for position in order.positions.all()
                 ]
-            }
-        }
+            })
+
+    def _tail(self):
+        yield '], '
 
-        return '{}_pretixdata.json'.format(self.event.slug), 'application/json', json.dumps(jo, cls=DjangoJSONEncoder)
+        yield '"quotas": {}'.format(self._dumps([
+            {
+                'id': quota.id,
+                'size': quota.size,
+                'items': [item.id for item in quota.items.all()],
+                'variations': [variation.id for variation in quota.variations.all()],
+            } for quota in self.event.quotas.all().prefetch_related('items', 'variations')
+        ]))
+        yield '}}'
 
 
 @receiver(register_data_exporters, dispatch_uid="exporter_json")
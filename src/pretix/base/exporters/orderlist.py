@@ -5,7 +5,7 @@ from decimal import Decimal
 import pytz
 from defusedcsv import csv
 from django import forms
-from django.db.models import Sum
+from django.db.models import Q, Sum, prefetch_related_objects
 from django.dispatch import receiver
 from django.utils.formats import localize
 from django.utils.translation import ugettext as _, ugettext_lazy
@@ -13,13 +13,15 @@ from django.utils.translation import ugettext as _, ugettext_lazy
 from pretix.base.models import InvoiceAddress, Order, OrderPosition
 from pretix.base.models.orders import OrderFee
 
-from ..exporter import BaseExporter
+from ..exporter import BaseExporter, concatenate_files, id_range_shards
 from ..signals import register_data_exporters
 
 
 class OrderListExporter(BaseExporter):
     identifier = 'orderlistcsv'
     verbose_name = ugettext_lazy('List of orders (CSV)')
+    BATCH_SIZE = 1000
+    SHARD_SIZE = 20000
 
     @property
     def export_form_fields(self):
@@ -50,16 +52,46 @@ class OrderListExporter(BaseExporter):
         tax_rates = sorted(tax_rates)
         return tax_rates
 
-    def render(self, form_data: dict):
-        output = io.StringIO()
-        tz = pytz.timezone(self.event.settings.timezone)
-        writer = csv.writer(output, quoting=csv.QUOTE_NONNUMERIC, delimiter=",")
-
-        qs = self.event.orders.all().select_related('invoice_address').prefetch_related('invoices')
-        if form_data['paid_only']:
-            qs = qs.filter(status=Order.STATUS_PAID)
-        tax_rates = self._get_all_tax_rates(qs)
+    def _order_batches(self, qs):
+        # Keyset pagination on (datetime, id) keeps every query cheap, no matter how far into the
+        # event's orders we are, and does not require us to hold a cursor open during the export.
+        last = None
+        while True:
+            batch_qs = qs
+            if last:
+                batch_qs = batch_qs.filter(
+                    Q(datetime__gt=last.datetime) | Q(datetime=last.datetime, pk__gt=last.pk)
+                )
+            batch = list(batch_qs.order_by('datetime', 'pk')[:self.BATCH_SIZE])
+            if not batch:
+                return
+            prefetch_related_objects(batch, 'invoices')
+            yield batch
+            last = batch[-1]
+
+    def _batch_sums(self, batch):
+        order_ids = [o.pk for o in batch]
+        full_fee_sum_cache = {
+            o['order__id']: o['grosssum'] for o in
+            OrderFee.objects.filter(order_id__in=order_ids).values('order__id').order_by().annotate(
+                grosssum=Sum('value')
+            )
+        }
+        fee_sum_cache = {
+            (o['order__id'], o['tax_rate']): o for o in
+            OrderFee.objects.filter(order_id__in=order_ids).values('tax_rate', 'order__id').order_by().annotate(
+                taxsum=Sum('tax_value'), grosssum=Sum('value')
+            )
+        }
+        sum_cache = {
+            (o['order__id'], o['tax_rate']): o for o in
+            OrderPosition.objects.filter(order_id__in=order_ids).values('tax_rate', 'order__id').order_by().annotate(
+                taxsum=Sum('tax_value'), grosssum=Sum('price')
+            )
+        }
+        return full_fee_sum_cache, fee_sum_cache, sum_cache
 
+    def _get_headers(self, tax_rates):
         headers = [
             _('Order code'), _('Order total'), _('Status'), _('Email'), _('Order date'),
             _('Company'), _('Name'), _('Address'), _('ZIP code'), _('City'), _('Country'), _('VAT ID'),
@@ -74,74 +106,109 @@ class OrderListExporter(BaseExporter):
             ]
 
         headers.append(_('Invoice numbers'))
+        return headers
 
-        writer.writerow(headers)
+    def _get_queryset(self, form_data: dict):
+        qs = self.event.orders.all().select_related('invoice_address')
+        if form_data['paid_only']:
+            qs = qs.filter(status=Order.STATUS_PAID)
+        return qs
+
+    def render(self, form_data: dict):
+        filename, filetype, chunks = self.render_stream(form_data)
+        return filename, filetype, b''.join(chunks)
+
+    def render_stream(self, form_data: dict):
+        return '{}_orders.csv'.format(self.event.slug), 'text/csv', self._stream(form_data)
+
+    def get_shards(self, form_data: dict):
+        return id_range_shards(self._get_queryset(form_data), self.SHARD_SIZE)
+
+    def render_shard(self, form_data: dict, shard):
+        return self._stream(form_data, id_range=shard, header=False)
+
+    def merge_shards(self, form_data: dict, files):
+        def merged():
+            output = io.StringIO()
+            writer = csv.writer(output, quoting=csv.QUOTE_NONNUMERIC, delimiter=",")
+            writer.writerow(self._get_headers(self._get_all_tax_rates(self._get_queryset(form_data))))
+            yield output.getvalue().encode("utf-8")
+            yield from concatenate_files(files)
+
+        return '{}_orders.csv'.format(self.event.slug), 'text/csv', merged()
+
+    def _stream(self, form_data: dict, id_range=None, header=True):
+        output = io.StringIO()
+        tz = pytz.timezone(self.event.settings.timezone)
+        writer = csv.writer(output, quoting=csv.QUOTE_NONNUMERIC, delimiter=",")
+
+        def flush():
+            data = output.getvalue().encode("utf-8")
+            output.seek(0)
+            output.truncate()
+            return data
+
+        qs = self._get_queryset(form_data)
+        if id_range:
+            qs = qs.filter(pk__gte=id_range[0], pk__lte=id_range[1])
+        # The tax rates are determined for the whole event, so all shards of an export have the same columns
+        tax_rates = self._get_all_tax_rates(qs)
+
+        if header:
+            writer.writerow(self._get_headers(tax_rates))
+            yield flush()
 
         provider_names = {
             k: v.verbose_name
             for k, v in self.event.get_payment_providers().items()
         }
 
-        full_fee_sum_cache = {
-            o['order__id']: o['grosssum'] for o in
-            OrderFee.objects.values('tax_rate', 'order__id').order_by().annotate(grosssum=Sum('value'))
-        }
-        fee_sum_cache = {
-            (o['order__id'], o['tax_rate']): o for o in
-            OrderFee.objects.values('tax_rate', 'order__id').order_by().annotate(
-                taxsum=Sum('tax_value'), grosssum=Sum('value')
-            )
-        }
-        sum_cache = {
-            (o['order__id'], o['tax_rate']): o for o in
-            OrderPosition.objects.values('tax_rate', 'order__id').order_by().annotate(
-                taxsum=Sum('tax_value'), grosssum=Sum('price')
-            )
-        }
+        for batch in self._order_batches(qs):
+            full_fee_sum_cache, fee_sum_cache, sum_cache = self._batch_sums(batch)
 
-        for order in qs.order_by('datetime'):
-            row = [
-                order.code,
-                localize(order.total),
-                order.get_status_display(),
-                order.email,
-                order.datetime.astimezone(tz).strftime('%Y-%m-%d'),
-            ]
-            try:
-                row += [
-                    order.invoice_address.company,
-                    order.invoice_address.name,
-                    order.invoice_address.street,
-                    order.invoice_address.zipcode,
-                    order.invoice_address.city,
-                    order.invoice_address.country if order.invoice_address.country else order.invoice_address.country_old,
-                    order.invoice_address.vat_id,
+            for order in batch:
+                row = [
+                    order.code,
+                    localize(order.total),
+                    order.get_status_display(),
+                    order.email,
+                    order.datetime.astimezone(tz).strftime('%Y-%m-%d'),
                 ]
-            except InvoiceAddress.DoesNotExist:
-                row += ['', '', '', '', '', '', '']
-
-            row += [
-                order.payment_date.astimezone(tz).strftime('%Y-%m-%d') if order.payment_date else '',
-                provider_names.get(order.payment_provider, order.payment_provider),
-                localize(full_fee_sum_cache.get(order.id) or Decimal('0.00')),
-                order.locale,
-            ]
-
-            for tr in tax_rates:
-                taxrate_values = sum_cache.get((order.id, tr), {'grosssum': Decimal('0.00'), 'taxsum': Decimal('0.00')})
-                fee_taxrate_values = fee_sum_cache.get((order.id, tr), {'grosssum': Decimal('0.00'), 'taxsum': Decimal('0.00')})
+                try:
+                    row += [
+                        order.invoice_address.company,
+                        order.invoice_address.name,
+                        order.invoice_address.street,
+                        order.invoice_address.zipcode,
+                        order.invoice_address.city,
+                        order.invoice_address.country if order.invoice_address.country else order.invoice_address.country_old,
+                        order.invoice_address.vat_id,
+                    ]
+                except InvoiceAddress.DoesNotExist:
+                    row += ['', '', '', '', '', '', '']
 
                 row += [
-                    localize(taxrate_values['grosssum'] + fee_taxrate_values['grosssum']),
-                    localize(taxrate_values['grosssum'] - taxrate_values['taxsum']
-                             + fee_taxrate_values['grosssum'] - fee_taxrate_values['taxsum']),
-                    localize(taxrate_values['taxsum'] + fee_taxrate_values['taxsum']),
+                    order.payment_date.astimezone(tz).strftime('%Y-%m-%d') if order.payment_date else '',
+                    provider_names.get(order.payment_provider, order.payment_provider),
+                    localize(full_fee_sum_cache.get(order.id) or Decimal('0.00')),
+                    order.locale,
                 ]
 
-            row.append(', '.join([i.number for i in order.invoices.all()]))
-            writer.writerow(row)
+                for tr in tax_rates:
+                    taxrate_values = sum_cache.get((order.id, tr), {'grosssum': Decimal('0.00'), 'taxsum': Decimal('0.00')})
+                    fee_taxrate_values = fee_sum_cache.get((order.id, tr), {'grosssum': Decimal('0.00'), 'taxsum': Decimal('0.00')})
+
+                    row += [
+                        localize(taxrate_values['grosssum'] + fee_taxrate_values['grosssum']),
+                        localize(taxrate_values['grosssum'] - taxrate_values['taxsum']
+                                 + fee_taxrate_values['grosssum'] - fee_taxrate_values['taxsum']),
+                        localize(taxrate_values['taxsum'] + fee_taxrate_values['taxsum']),
+                    ]
+
+                row.append(', '.join([i.number for i in order.invoices.all()]))
+                writer.writerow(row)
 
-        return '{}_orders.csv'.format(self.event.slug), 'text/csv', output.getvalue().encode("utf-8")
+            yield flush()
 
 
 class QuotaListExporter(BaseExporter):
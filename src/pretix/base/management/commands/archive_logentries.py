@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+
+from pretix.base.models import Event
+from pretix.base.services.logarchive import (
+    archivable_events, archive_logentries, restore_logentries,
+)
+
+
+class Command(BaseCommand):
+    help = "Move the log entries of past events into the compressed log archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, dest='days', default=settings.PRETIX_LOG_ARCHIVE_AFTER,
+                            help='Archive the log entries of events that ended more than this number of days ago')
+        parser.add_argument('--event', type=int, dest='event',
+                            help='Only process the event with this ID, regardless of its date')
+        parser.add_argument('--restore', action='store_true', dest='restore',
+                            help='Move archived log entries back into the log table instead')
+
+    def handle(self, *args, **options):
+        if options['event']:
+            events = Event.objects.filter(pk=options['event'])
+        elif options['restore']:
+            events = Event.objects.filter(logentry_archives__isnull=False).distinct()
+        elif options['days']:
+            events = archivable_events(options['days'])
+        else:
+            raise CommandError('Please specify the number of days with --days or an event with --event.')
+
+        for event in events:
+            if options['restore']:
+                count = restore_logentries(event)
+                self.stdout.write('Restored {} log entries of event {} ({})'.format(count, event.pk, event.slug))
+            else:
+                count = archive_logentries(event, now() - timedelta(days=options['days']) if options['days'] else None)
+                self.stdout.write('Archived {} log entries of event {} ({})'.format(count, event.pk, event.slug))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from pretix.base.models import Organizer
+from pretix.base.services.calendarindex import rebuild_organizer_calendar
+from pretix.base.settings import GlobalSettingsObject
+
+
+class Command(BaseCommand):
+    help = "Compute the calendar entries of all organizers from scratch"
+
+    def handle(self, *args, **options):
+        for organizer in Organizer.objects.all():
+            rebuild_organizer_calendar(organizer)
+            self.stdout.write('Rebuilt calendar of organizer {}'.format(organizer.slug))
+        GlobalSettingsObject().settings.set('calendar_index_built', True)
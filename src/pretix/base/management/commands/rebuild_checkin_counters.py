@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from pretix.base.models import CheckinList
+from pretix.base.services.checkin import rebuild_checkin_counters
+
+
+class Command(BaseCommand):
+    help = "Compute the position and check-in counters of all check-in lists from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', dest='all',
+                            help='Also compute the counters of lists whose status has never been requested')
+
+    def handle(self, *args, **options):
+        lists = CheckinList.objects.select_related('event')
+        if not options['all']:
+            lists = lists.filter(counters__isnull=False).distinct()
+        for clist in lists:
+            rebuild_checkin_counters(clist)
+            self.stdout.write('Rebuilt check-in list {} ({})'.format(clist.pk, clist.event.slug))
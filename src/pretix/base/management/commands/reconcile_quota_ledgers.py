@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from pretix.base.models import QuotaLedger
+from pretix.base.services.quotas import reconcile_quota_ledger
+
+
+class Command(BaseCommand):
+    help = "Compare all quota ledgers to a full count and correct them"
+
+    def handle(self, *args, **options):
+        for ledger in QuotaLedger.objects.select_related('quota', 'quota__event'):
+            drift = reconcile_quota_ledger(ledger)
+            if drift:
+                self.stdout.write('Quota {} ({}): {}'.format(ledger.quota.pk, ledger.quota.event.slug, drift))
@@ -1,17 +1,31 @@
+import atexit
+import logging
 import math
+import threading
+import time
 from collections import defaultdict
 
 from django.apps import apps
 from django.conf import settings
+from django.db import connection
 
 if settings.HAS_REDIS:
     import django_redis
     redis = django_redis.get_redis_connection("redis")
 
+logger = logging.getLogger(__name__)
+
 REDIS_KEY = "pretix_metrics"
 _INF = float("inf")
 _MINUS_INF = float("-inf")
 
+# Values are aggregated in memory and written to redis in one batch at most every
+# METRICS_FLUSH_INTERVAL seconds per process.
+_pending_increments = defaultdict(float)
+_pending_values = {}
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
 
 def _float_to_go_string(d):
     # inspired by https://github.com/prometheus/client_python/blob/master/prometheus_client/core.py
@@ -65,31 +79,58 @@ class Metric(object):
 
             return metricname + "{" + ",".join(named_labels) + "}"
 
-    def _inc_in_redis(self, key, amount, pipeline=None):
+    def _inc_in_redis(self, key, amount):
         """
-        Increments given key in Redis.
+        Increments given key in Redis with the next flush.
         """
         if settings.HAS_REDIS:
-            if not pipeline:
-                pipeline = redis
-            pipeline.hincrbyfloat(REDIS_KEY, key, amount)
+            with _pending_lock:
+                _pending_increments[key] += amount
+            _flush_if_due()
 
-    def _set_in_redis(self, key, value, pipeline=None):
+    def _set_in_redis(self, key, value):
         """
-        Sets given key in Redis.
+        Sets given key in Redis with the next flush.
         """
         if settings.HAS_REDIS:
-            if not pipeline:
-                pipeline = redis
-            pipeline.hset(REDIS_KEY, key, value)
+            with _pending_lock:
+                _pending_increments.pop(key, None)
+                _pending_values[key] = value
+            _flush_if_due()
 
-    def _get_redis_pipeline(self):
-        if settings.HAS_REDIS:
-            return redis.pipeline()
 
-    def _execute_redis_pipeline(self, pipeline):
-        if settings.HAS_REDIS:
-            return pipeline.execute()
+def flush():
+    """
+    Writes all values aggregated in this process to redis.
+    """
+    global _last_flush
+    with _pending_lock:
+        values = dict(_pending_values)
+        increments = dict(_pending_increments)
+        _pending_values.clear()
+        _pending_increments.clear()
+        _last_flush = time.monotonic()
+
+    if not settings.HAS_REDIS or not (values or increments):
+        return
+    pipe = redis.pipeline()
+    for key, value in values.items():
+        pipe.hset(REDIS_KEY, key, value)
+    for key, amount in increments.items():
+        pipe.hincrbyfloat(REDIS_KEY, key, amount)
+    pipe.execute()
+
+
+def _flush_if_due():
+    if time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL:
+        try:
+            flush()
+        except Exception:
+            # Metrics must never break the operation they are measuring
+            logger.exception('Could not write metrics to redis.')
+
+
+atexit.register(flush)
 
 
 class Counter(Metric):
@@ -181,24 +222,22 @@ class Histogram(Metric):
             raise ValueError("Amount must be greater than zero. Otherwise use inc().")
 
         self._check_label_consistency(kwargs)
+        if not settings.HAS_REDIS:
+            return
 
-        pipe = self._get_redis_pipeline()
-
-        countmetric = self._construct_metric_identifier(self.name + '_count', kwargs)
-        self._inc_in_redis(countmetric, 1, pipeline=pipe)
-
-        summetric = self._construct_metric_identifier(self.name + '_sum', kwargs)
-        self._inc_in_redis(summetric, amount, pipeline=pipe)
-
+        keys = [self._construct_metric_identifier(self.name + '_count', kwargs)]
         kwargs_le = dict(kwargs.items())
         for i, bound in enumerate(self.buckets):
             if amount <= bound:
                 kwargs_le['le'] = _float_to_go_string(bound)
-                bmetric = self._construct_metric_identifier(self.name + '_bucket', kwargs_le,
-                                                            labelnames=self.labelnames + ["le"])
-                self._inc_in_redis(bmetric, 1, pipeline=pipe)
+                keys.append(self._construct_metric_identifier(self.name + '_bucket', kwargs_le,
+                                                              labelnames=self.labelnames + ["le"]))
 
-        self._execute_redis_pipeline(pipe)
+        with _pending_lock:
+            _pending_increments[self._construct_metric_identifier(self.name + '_sum', kwargs)] += amount
+            for key in keys:
+                _pending_increments[key] += 1
+        _flush_if_due()
 
 
 def metric_values():
@@ -209,6 +248,7 @@ def metric_values():
 
     # Metrics from redis
     if settings.HAS_REDIS:
+        flush()
         for key, value in redis.hscan_iter(REDIS_KEY):
             dkey = key.decode("utf-8")
             splitted = dkey.split("{", 2)
@@ -223,12 +263,66 @@ def metric_values():
         metrics[a] = metrics[atarget]
 
     # Throwaway metrics
+    estimates = _estimated_row_counts()
     for m in apps.get_models():  # Count all models
-        metrics['pretix_model_instances']['{model="%s"}' % m._meta] = m.objects.count()
+        if m._meta.db_table in estimates:
+            count = estimates[m._meta.db_table]
+        else:
+            count = m.objects.count()
+        metrics['pretix_model_instances']['{model="%s"}' % m._meta] = count
+
+    if settings.HAS_CELERY:
+        for queue, length in _queue_lengths().items():
+            metrics['pretix_celery_tasks_queued']['{queue="%s"}' % queue] = length
 
     return metrics
 
 
+def _estimated_row_counts():
+    """
+    Returns the number of rows per table as estimated by the database's statistics, which is a
+    lot faster than counting the rows of large tables. Tables without statistics are left out.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT relname, reltuples FROM pg_class "
+                "WHERE relkind = 'r' AND reltuples >= 0 "
+                "AND relnamespace = (SELECT oid FROM pg_namespace WHERE nspname = current_schema())"
+            )
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_name, table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_rows IS NOT NULL"
+            )
+        else:
+            return {}
+        return {table: int(rows) for table, rows in cursor.fetchall()}
+
+
+def _queue_lengths():
+    """
+    Returns the number of tasks waiting in every celery queue.
+    """
+    from pretix.celery_app import app
+
+    lengths = {}
+    try:
+        with app.connection_or_acquire() as conn:
+            for queue in settings.CELERY_TASK_QUEUES:
+                channel = conn.channel()
+                try:
+                    lengths[queue.name] = channel.queue_declare(queue=queue.name, passive=True).message_count
+                except conn.channel_errors:
+                    # The queue does not exist (yet), e.g. because nothing has been sent to it
+                    lengths[queue.name] = 0
+                finally:
+                    channel.close()
+    except Exception:
+        logger.exception('Could not determine the length of the celery queues.')
+    return lengths
+
+
 """
 Provided metrics
 """
@@ -238,3 +332,27 @@ pretix_task_runs_total = Counter("pretix_task_runs_total", "Total calls to a cel
                                  ["task_name", "status"])
 pretix_task_duration_seconds = Histogram("pretix_task_duration_seconds", "Call time of a celery task",
                                          ["task_name"])
+pretix_lock_wait_seconds = Histogram("pretix_lock_wait_seconds", "Time spent waiting to acquire a booking lock.",
+                                     ["event"])
+pretix_lock_hold_seconds = Histogram("pretix_lock_hold_seconds", "Time a booking lock was held.",
+                                     ["event"])
+pretix_lock_timeouts_total = Counter("pretix_lock_timeouts_total", "Total failed attempts to acquire a booking lock",
+                                     ["event"])
+pretix_log_write_seconds = Histogram("pretix_log_write_seconds", "Time spent writing log entries to the database.",
+                                     ["mode"])
+pretix_view_queries = Histogram("pretix_view_queries", "Number of database queries made by views.",
+                                ["url_name"], buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, _INF))
+pretix_view_query_seconds = Histogram("pretix_view_query_seconds", "Time spent in the database by views.",
+                                      ["url_name"])
+pretix_view_repeated_queries_total = Counter("pretix_view_repeated_queries_total",
+                                             "Total queries that views ran repeatedly with different parameters",
+                                             ["url_name"])
+pretix_task_queries = Histogram("pretix_task_queries", "Number of database queries made by celery tasks.",
+                                ["task_name"], buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, _INF))
+pretix_task_query_seconds = Histogram("pretix_task_query_seconds", "Time spent in the database by celery tasks.",
+                                      ["task_name"])
+pretix_task_repeated_queries_total = Counter("pretix_task_repeated_queries_total",
+                                             "Total queries that celery tasks ran repeatedly with different parameters",
+                                             ["task_name"])
+pretix_cache_requests_total = Counter("pretix_cache_requests_total", "Total lookups in the object-related caches",
+                                      ["namespace", "result"])
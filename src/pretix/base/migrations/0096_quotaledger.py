@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-06-18 09:12
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pretixbase', '0095_auto_20180604_1129'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaLedger',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paid_orders', models.IntegerField(default=0)),
+                ('pending_orders', models.IntegerField(default=0)),
+                ('waiting_list', models.IntegerField(default=0)),
+                ('reconciled', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('quota', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ledger',
+                                               to='pretixbase.Quota')),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-06-27 14:02
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pretixbase', '0097_delta_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckinListCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position_count', models.IntegerField(default=0)),
+                ('checkin_count', models.IntegerField(default=0)),
+                ('rebuilt', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('checkin_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counters',
+                                                   to='pretixbase.CheckinList')),
+                ('item', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE,
+                                           to='pretixbase.Item')),
+                ('subevent', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE,
+                                               to='pretixbase.SubEvent')),
+                ('variation', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE,
+                                                to='pretixbase.ItemVariation')),
+            ],
+        ),
+    ]
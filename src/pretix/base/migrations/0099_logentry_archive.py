@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-07-02 10:12
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pretixbase', '0098_checkinlistcounter'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='logentry',
+            index_together=set([('content_type', 'object_id', 'datetime'), ('event', 'datetime')]),
+        ),
+        migrations.CreateModel(
+            name='LogEntryArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('first_datetime', models.DateTimeField()),
+                ('last_datetime', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('event', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='logentry_archives', to='pretixbase.Event')),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-07-04 09:31
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.timezone import now
+
+
+def mark_all_events(apps, schema_editor):
+    Event = apps.get_model('pretixbase', 'Event')
+    EventActivity = apps.get_model('pretixbase', 'EventActivity')
+    t = now()
+    EventActivity.objects.bulk_create([
+        EventActivity(event_id=pk, last_activity=t) for pk in Event.objects.values_list('pk', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pretixbase', '0099_logentry_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventActivity',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity', serialize=False, to='pretixbase.Event')),
+                ('last_activity', models.DateTimeField()),
+                ('quotas_refreshed', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(mark_all_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-07-09 14:12
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from pretix.base.models.invoices import last_invoice_numbers
+
+
+def seed_sequences(apps, schema_editor):
+    Invoice = apps.get_model('pretixbase', 'Invoice')
+    InvoiceNumberSequence = apps.get_model('pretixbase', 'InvoiceNumberSequence')
+    InvoiceNumberSequence.objects.bulk_create([
+        InvoiceNumberSequence(organizer_id=organizer, prefix=prefix, last_number=last_number)
+        for (organizer, prefix), last_number in last_invoice_numbers(Invoice.objects.all()).items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pretixbase', '0100_eventactivity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceNumberSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=160)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+                ('organizer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invoice_number_sequences', to='pretixbase.Organizer')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='invoicenumbersequence',
+            unique_together=set([('organizer', 'prefix')]),
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
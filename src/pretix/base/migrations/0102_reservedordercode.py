@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-07-11 10:47
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def reserve_existing_codes(apps, schema_editor):
+    Order = apps.get_model('pretixbase', 'Order')
+    ReservedOrderCode = apps.get_model('pretixbase', 'ReservedOrderCode')
+    seen = set()
+    batch = []
+    for organizer, code in Order.objects.values_list('event__organizer_id', 'code').iterator():
+        if (organizer, code) in seen:
+            continue
+        seen.add((organizer, code))
+        batch.append(ReservedOrderCode(organizer_id=organizer, code=code))
+        if len(batch) >= 1000:
+            ReservedOrderCode.objects.bulk_create(batch)
+            batch = []
+    ReservedOrderCode.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pretixbase', '0101_invoicenumbersequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservedOrderCode',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=16)),
+                ('organizer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reserved_order_codes', to='pretixbase.Organizer')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='reservedordercode',
+            unique_together=set([('organizer', 'code')]),
+        ),
+        migrations.RunPython(reserve_existing_codes, migrations.RunPython.noop),
+    ]
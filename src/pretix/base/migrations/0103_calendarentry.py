@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-07-16 14:02
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pretixbase', '0102_reservedordercode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('continued', models.BooleanField(default=False)),
+                ('time', models.TimeField(blank=True, null=True)),
+                ('datetime_from', models.DateTimeField()),
+                ('url', models.CharField(max_length=500)),
+                ('timezone', models.CharField(max_length=100)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_entries', to='pretixbase.Event')),
+                ('organizer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_entries', to='pretixbase.Organizer')),
+                ('subevent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='calendar_entries', to='pretixbase.SubEvent')),
+            ],
+            options={
+                'ordering': ('day', 'datetime_from', 'pk'),
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='calendarentry',
+            index_together=set([('organizer', 'day')]),
+        ),
+    ]
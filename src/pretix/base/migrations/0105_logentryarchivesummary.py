@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-07-20 10:41
+from __future__ import unicode_literals
+
+import json
+import zlib
+from collections import Counter
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# The layout of the rows in LogEntryArchive.data at the time of this migration
+FIELDS = ('id', 'content_type_id', 'object_id', 'datetime', 'user_id', 'api_token_id',
+          'oauth_application_id', 'event_id', 'action_type', 'data', 'visible', 'shredded')
+KEY_FIELDS = ('content_type_id', 'object_id', 'action_type', 'user_id', 'visible')
+
+
+def summarize_archives(apps, schema_editor):
+    LogEntryArchive = apps.get_model('pretixbase', 'LogEntryArchive')
+    LogEntryArchiveSummary = apps.get_model('pretixbase', 'LogEntryArchiveSummary')
+    for archive in LogEntryArchive.objects.iterator():
+        counts = Counter()
+        for row in json.loads(zlib.decompress(bytes(archive.data)).decode()):
+            values = dict(zip(FIELDS, row))
+            counts[tuple(values[f] for f in KEY_FIELDS)] += 1
+        LogEntryArchiveSummary.objects.bulk_create([
+            LogEntryArchiveSummary(archive=archive, count=count, **dict(zip(KEY_FIELDS, key)))
+            for key, count in counts.items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('pretixbase', '0104_logentry_datetime_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogEntryArchiveSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('action_type', models.CharField(max_length=255)),
+                ('visible', models.BooleanField(default=True)),
+                ('count', models.PositiveIntegerField()),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='pretixbase.LogEntryArchive')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='logentryarchivesummary',
+            index_together=set([('content_type', 'object_id')]),
+        ),
+        migrations.RunPython(summarize_archives, migrations.RunPython.noop),
+    ]
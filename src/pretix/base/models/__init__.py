@@ -1,23 +1,27 @@
 from ..settings import GlobalSettingsObject_SettingsStore
 from .auth import U2FDevice, User
-from .base import CachedFile, LoggedModel, cachedfile_name
-from .checkin import Checkin, CheckinList
+from .base import CachedFile, LoggedModel, buffered_logging, cachedfile_name
+from .checkin import Checkin, CheckinList, CheckinListCounter
 from .event import (
-    Event, Event_SettingsStore, EventLock, EventMetaProperty, EventMetaValue,
-    RequiredAction, SubEvent, SubEventMetaValue, generate_invite_token,
+    CalendarEntry, Event, Event_SettingsStore, EventActivity, EventLock,
+    EventMetaProperty, EventMetaValue, RequiredAction, SubEvent,
+    SubEventMetaValue, generate_invite_token,
+)
+from .invoices import (
+    Invoice, InvoiceLine, InvoiceNumberSequence, invoice_filename,
 )
-from .invoices import Invoice, InvoiceLine, invoice_filename
 from .items import (
     Item, ItemAddOn, ItemCategory, ItemVariation, Question, QuestionOption,
-    Quota, SubEventItem, SubEventItemVariation, itempicture_upload_to,
+    Quota, QuotaLedger, SubEventItem, SubEventItemVariation,
+    itempicture_upload_to,
 )
-from .log import LogEntry
+from .log import LogEntry, LogEntryArchive, LogEntryArchiveSummary
 from .notifications import NotificationSetting
 from .orders import (
     AbstractPosition, CachedCombinedTicket, CachedTicket, CartPosition,
-    InvoiceAddress, Order, OrderPosition, QuestionAnswer,
-    cachedcombinedticket_name, cachedticket_name, generate_position_secret,
-    generate_secret,
+    InvoiceAddress, Order, OrderPosition, QuestionAnswer, ReservedOrderCode,
+    RevokedTicketSecret, cachedcombinedticket_name, cachedticket_name,
+    generate_position_secret, generate_secret,
 )
 from .organizer import (
     Organizer, Organizer_SettingsStore, Team, TeamAPIToken, TeamInvite,
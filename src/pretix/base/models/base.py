@@ -1,6 +1,10 @@
 import json
+import threading
+import time
 import uuid
+from contextlib import contextmanager
 
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.db.models.signals import post_delete
@@ -34,6 +38,48 @@ def cached_file_delete(sender, instance, **kwargs):
         instance.file.delete(False)
 
 
+_log_buffer = threading.local()
+
+
+@contextmanager
+def buffered_logging():
+    """
+    Context manager that collects all log entries created with ``log_action`` within its block and
+    writes them to the database with a single query when the block is left. This is meant for code
+    that logs many actions within the same transaction, so it should be used inside of a
+    ``transaction.atomic()`` block. If the block raises an exception, the collected log entries are
+    discarded.
+
+    Log entries that trigger a notification are still written immediately. All other log entries
+    returned by ``log_action`` within the block do not have a primary key.
+    """
+    if getattr(_log_buffer, 'entries', None) is not None:
+        # Nested usage, the outermost block writes the log entries
+        yield
+        return
+
+    _log_buffer.entries = []
+    try:
+        yield
+        entries = _log_buffer.entries
+    finally:
+        _log_buffer.entries = None
+
+    if entries:
+        from .log import LogEntry
+
+        t0 = time.perf_counter()
+        LogEntry.objects.bulk_create(entries)
+        _observe_log_write(t0, 'buffered')
+
+
+def _observe_log_write(t0, mode):
+    if settings.METRICS_ENABLED:
+        from pretix.base.metrics import pretix_log_write_seconds
+
+        pretix_log_write_seconds.observe(time.perf_counter() - t0, mode=mode)
+
+
 class LoggingMixin:
 
     def log_action(self, action, data=None, user=None, api_token=None, auth=None, save=True):
@@ -49,7 +95,7 @@ class LoggingMixin:
         from .event import Event
         from pretix.api.models import OAuthAccessToken, OAuthApplication
         from .organizer import TeamAPIToken
-        from ..notifications import get_all_notification_types
+        from ..notifications import get_notification_action_types
         from ..services.notifications import notify
 
         event = None
@@ -74,9 +120,17 @@ class LoggingMixin:
         if data:
             logentry.data = json.dumps(data, cls=CustomJSONEncoder)
         if save:
+            notifies = action in get_notification_action_types(event)
+            buffer = getattr(_log_buffer, 'entries', None)
+            if buffer is not None and not notifies:
+                buffer.append(logentry)
+                return logentry
+
+            t0 = time.perf_counter()
             logentry.save()
+            _observe_log_write(t0, 'immediate')
 
-            if action in get_all_notification_types():
+            if notifies:
                 notify.apply_async(args=(logentry.pk,))
         return logentry
 
@@ -97,3 +151,17 @@ class LoggedModel(models.Model, LoggingMixin):
         return LogEntry.objects.filter(
             content_type=ContentType.objects.get_for_model(type(self)), object_id=self.pk
         ).select_related('user', 'event', 'oauth_application', 'api_token')
+
+    def archived_logentries(self):
+        """
+        Returns all log entries attached to this object that have been moved to the log archive.
+        They are sorted from newest to oldest and are always older than the ones returned by
+        ``all_logentries``.
+
+        :return: A list of LogEntry objects
+        """
+        from .event import Event
+        from ..services.logarchive import archived_logentries
+
+        event = self if isinstance(self, Event) else getattr(self, 'event', None)
+        return archived_logentries(event, self)
@@ -163,6 +163,7 @@ class Checkin(models.Model):
     list = models.ForeignKey(
         'pretixbase.CheckinList', related_name='checkins', on_delete=models.PROTECT,
     )
+    last_modified = models.DateTimeField(auto_now=True, db_index=True)
 
     def __repr__(self):
         return "<Checkin: pos {} on list '{}' at {}>".format(
@@ -176,3 +177,36 @@ class Checkin(models.Model):
     def delete(self, **kwargs):
         self.position.order.touch()
         super().delete(**kwargs)
+
+
+class CheckinListCounter(models.Model):
+    """
+    Incrementally maintained numbers of order positions and check-ins for a :py:class:`CheckinList`
+    that are used to answer the frequent status requests of check-in dashboards without counting
+    all positions and check-ins every time. There is one row per list and date for the totals, one
+    per product and one per product variation. The counters are only maintained for lists whose
+    status has been requested before (see :py:mod:`pretix.base.services.checkin`), those lists
+    always have a row without date, product and variation.
+
+    :param checkin_list: The check-in list these numbers belong to
+    :type checkin_list: CheckinList
+    :param subevent: The date of the counted positions
+    :type subevent: SubEvent
+    :param item: The product of the counted positions, or ``None`` for the totals
+    :type item: Item
+    :param variation: The variation of the counted positions, or ``None``
+    :type variation: ItemVariation
+    :param position_count: The number of positions that count for the list
+    :type position_count: int
+    :param checkin_count: The number of check-ins on the list
+    :type checkin_count: int
+    :param rebuilt: The last time the counters have been computed from scratch
+    :type rebuilt: datetime
+    """
+    checkin_list = models.ForeignKey(CheckinList, related_name='counters', on_delete=models.CASCADE)
+    subevent = models.ForeignKey('SubEvent', null=True, on_delete=models.CASCADE)
+    item = models.ForeignKey('Item', null=True, on_delete=models.CASCADE)
+    variation = models.ForeignKey('ItemVariation', null=True, on_delete=models.CASCADE)
+    position_count = models.IntegerField(default=0)
+    checkin_count = models.IntegerField(default=0)
+    rebuilt = models.DateTimeField(default=now, db_index=True)
@@ -313,13 +313,17 @@ class Event(EventMixin, LoggedModel):
 
         return ObjectRelatedCache(self)
 
-    def lock(self):
+    def lock(self, quotas=None, vouchers=None, positions=None):
         """
         Returns a contextmanager that can be used to lock an event for bookings.
+
+        If quota-level locking is enabled and you pass the quotas, vouchers or positions affected
+        by your operation, only the respective quotas and vouchers will be locked instead of the
+        whole event. See :py:class:`pretix.base.services.locking.LockManager` for details.
         """
         from pretix.base.services import locking
 
-        return locking.LockManager(self)
+        return locking.LockManager(self, quotas=quotas, vouchers=vouchers, positions=positions)
 
     def get_mail_backend(self, force_custom=False):
         """
@@ -820,6 +824,58 @@ class EventLock(models.Model):
     token = models.UUIDField(default=uuid.uuid4)
 
 
+class EventActivity(models.Model):
+    """
+    Tracks when the orders, carts, vouchers, waiting list entries or quotas of an event last changed
+    and when the cached availabilities of its quotas were last refreshed. This is kept separate from
+    the event itself to avoid lost updates and lock contention on the event row.
+
+    :param last_activity: A point in time that is not earlier than the last relevant change
+    :type last_activity: datetime
+    :param quotas_refreshed: The time at which the last complete refresh of the quota caches started
+    :type quotas_refreshed: datetime
+    """
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, related_name='activity', primary_key=True)
+    last_activity = models.DateTimeField()
+    quotas_refreshed = models.DateTimeField(null=True, blank=True)
+
+
+class CalendarEntry(models.Model):
+    """
+    A precomputed entry in the public calendar of an organizer. Every public and live event
+    without subevents as well as every active subevent of a public and live event has one
+    entry for every day it is shown on in the calendar. The entries are kept up to date by
+    :py:mod:`pretix.base.services.calendarindex`.
+
+    :param day: The day this entry is shown on, in the timezone of the event
+    :type day: date
+    :param continued: ``True`` on all but the first day of an event that spans multiple days
+    :type continued: bool
+    :param time: The start time shown in the calendar, if any
+    :type time: time
+    :param datetime_from: The start of the event or subevent
+    :type datetime_from: datetime
+    :param url: The URL of the event or subevent
+    :type url: str
+    :param timezone: The name of the timezone of the event
+    :type timezone: str
+    """
+    organizer = models.ForeignKey(Organizer, on_delete=models.CASCADE, related_name='calendar_entries')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='calendar_entries')
+    subevent = models.ForeignKey(SubEvent, on_delete=models.CASCADE, related_name='calendar_entries',
+                                 null=True, blank=True)
+    day = models.DateField()
+    continued = models.BooleanField(default=False)
+    time = models.TimeField(null=True, blank=True)
+    datetime_from = models.DateTimeField()
+    url = models.CharField(max_length=500)
+    timezone = models.CharField(max_length=100)
+
+    class Meta:
+        ordering = ('day', 'datetime_from', 'pk')
+        index_together = (('organizer', 'day'),)
+
+
 class RequiredAction(models.Model):
     """
     Represents an action that is to be done by an admin. The admin will be
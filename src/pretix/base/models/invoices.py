@@ -1,7 +1,7 @@
 import string
 from decimal import Decimal
 
-from django.db import DatabaseError, models, transaction
+from django.db import DatabaseError, IntegrityError, models, transaction
 from django.utils import timezone
 from django.utils.crypto import get_random_string
 from django.utils.functional import cached_property
@@ -93,11 +93,7 @@ class Invoice(models.Model):
         return '{:05d}'.format(int(number))
 
     def _get_numeric_invoice_number(self):
-        numeric_invoices = Invoice.objects.filter(
-            event__organizer=self.event.organizer,
-            prefix=self.prefix,
-        ).exclude(invoice_no__contains='-')
-        return self._to_numeric_invoice_number(numeric_invoices.count() + 1)
+        return self._to_numeric_invoice_number(InvoiceNumberSequence.next_number(self.organizer, self.prefix))
 
     def _get_invoice_number_from_order(self):
         return '{order}-{count}'.format(
@@ -114,12 +110,16 @@ class Invoice(models.Model):
             self.organizer = self.order.event.organizer
         if not self.prefix:
             self.prefix = self.event.settings.invoice_numbers_prefix or (self.event.slug.upper() + '-')
+        if not self.invoice_no and self.event.settings.get('invoice_numbers_consecutive'):
+            with transaction.atomic():
+                # The number is only used up if the invoice is saved in the same transaction
+                self.invoice_no = self._get_numeric_invoice_number()
+                self.full_invoice_no = self.prefix + self.invoice_no
+                return super().save(*args, **kwargs)
         if not self.invoice_no:
             for i in range(10):
-                if self.event.settings.get('invoice_numbers_consecutive'):
-                    self.invoice_no = self._get_numeric_invoice_number()
-                else:
-                    self.invoice_no = self._get_invoice_number_from_order()
+                self.invoice_no = self._get_invoice_number_from_order()
+                self.full_invoice_no = self.prefix + self.invoice_no
                 try:
                     with transaction.atomic():
                         return super().save(*args, **kwargs)
@@ -158,6 +158,63 @@ class Invoice(models.Model):
         ordering = ('invoice_no',)
 
 
+def last_invoice_numbers(invoices) -> dict:
+    """
+    Returns the highest numeric invoice number among the given invoices for every combination of
+    organizer and prefix, as a dictionary with ``(organizer_id, prefix)`` tuples as keys. This is
+    also used by migrations, so it must work with historical models as well.
+    """
+    last_numbers = {}
+    numbers = invoices.exclude(invoice_no__contains='-').values_list('organizer_id', 'prefix', 'invoice_no')
+    for organizer, prefix, invoice_no in numbers.iterator():
+        if invoice_no.isdigit():
+            key = (organizer, prefix)
+            last_numbers[key] = max(last_numbers.get(key, 0), int(invoice_no))
+    return last_numbers
+
+
+class InvoiceNumberSequence(models.Model):
+    """
+    Keeps track of the last consecutive invoice number that has been issued for a combination
+    of organizer and invoice number prefix.
+
+    :param organizer: The organizer this belongs to
+    :type organizer: Organizer
+    :param prefix: The invoice number prefix
+    :type prefix: str
+    :param last_number: The last number that has been issued
+    :type last_number: int
+    """
+    organizer = models.ForeignKey('Organizer', related_name='invoice_number_sequences', on_delete=models.CASCADE)
+    prefix = models.CharField(max_length=160)
+    last_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('organizer', 'prefix')
+
+    @classmethod
+    def next_number(cls, organizer, prefix: str) -> int:
+        """
+        Returns the next consecutive invoice number for the given organizer and prefix. This needs to
+        be called within a transaction. The sequence stays locked until the transaction ends, so
+        concurrent callers wait for each other and a number is given back if the transaction is
+        rolled back.
+        """
+        seq = cls.objects.select_for_update().filter(organizer=organizer, prefix=prefix).first()
+        if not seq:
+            last_numbers = last_invoice_numbers(Invoice.objects.filter(organizer=organizer, prefix=prefix))
+            try:
+                with transaction.atomic():
+                    seq = cls.objects.create(organizer=organizer, prefix=prefix,
+                                             last_number=last_numbers.get((organizer.pk, prefix), 0))
+            except IntegrityError:
+                # Someone else created the sequence in the meantime
+                seq = cls.objects.select_for_update().get(organizer=organizer, prefix=prefix)
+        seq.last_number += 1
+        seq.save(update_fields=['last_number'])
+        return seq.last_number
+
+
 class InvoiceLine(models.Model):
     """
     One position listed on an Invoice.
@@ -1,5 +1,6 @@
 import sys
 import uuid
+from collections import Counter, defaultdict
 from datetime import date, datetime, time
 from decimal import Decimal, DecimalException
 from typing import Tuple
@@ -9,7 +10,7 @@ import pytz
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models import F, Func, Q, Sum
+from django.db.models import Count, F, Func, Q, Sum
 from django.utils import formats
 from django.utils.crypto import get_random_string
 from django.utils.functional import cached_property
@@ -863,6 +864,132 @@ class QuestionOption(models.Model):
         ordering = ('position', 'id')
 
 
+class QuotaManager(models.Manager):
+
+    def for_positions(self, positions):
+        """
+        Returns a queryset of all quotas the given cart or order positions count towards.
+        """
+        q = Q(pk__in=[])
+        for item_id, variation_id, subevent_id in {(p.item_id, p.variation_id, p.subevent_id) for p in positions}:
+            if variation_id:
+                q |= Q(variations__id=variation_id, subevent_id=subevent_id)
+            else:
+                q |= Q(items__id=item_id, subevent_id=subevent_id)
+        return self.filter(q).distinct()
+
+    def bulk_availability(self, quotas, now_dt: datetime=None, count_waitinglist=True, allow_cache=False) -> dict:
+        """
+        Calculates the availability of many quotas at once. In contrast to calling
+        :py:meth:`Quota.availability()` for every quota, this uses a constant number of
+        grouped queries, independent of the number of quotas.
+
+        :param quotas: An iterable of :py:class:`Quota` objects
+        :param allow_cache: If ``True``, the cached availability will be used for quotas with a hot cache.
+        :returns: a dictionary mapping quota IDs to tuples as returned by :py:meth:`Quota.availability()`
+        """
+        from pretix.base.models import (
+            CartPosition, Order, OrderPosition, Voucher, WaitingListEntry,
+        )
+
+        now_dt = now_dt or now()
+        results = {}
+        quotas = {q.pk: q for q in quotas}
+        for q in quotas.values():
+            if q.size is None:
+                results[q.pk] = Quota.AVAILABILITY_OK, None
+            elif allow_cache and count_waitinglist and q.cache_is_hot(now_dt):
+                results[q.pk] = q.cached_availability_state, q.cached_availability_number
+        quotas = {pk: q for pk, q in quotas.items() if pk not in results}
+        if not quotas:
+            return results
+
+        item_quotas = defaultdict(set)
+        for quota_id, item_id in Quota.items.through.objects.filter(
+                quota_id__in=quotas.keys()).values_list('quota_id', 'item_id'):
+            item_quotas[item_id].add(quota_id)
+        var_quotas = defaultdict(set)
+        for quota_id, var_id in Quota.variations.through.objects.filter(
+                quota_id__in=quotas.keys()).values_list('quota_id', 'itemvariation_id'):
+            var_quotas[var_id].add(quota_id)
+
+        def matching_quotas(row):
+            # Mirrors the logic of Quota._position_lookup
+            if row['variation']:
+                candidates = set(var_quotas.get(row['variation'], ()))
+            else:
+                candidates = set(item_quotas.get(row['item'], ()))
+            if row.get('quota'):
+                candidates.add(row['quota'])
+            return [pk for pk in candidates if pk in quotas and quotas[pk].subevent_id == row['subevent']]
+
+        usage = defaultdict(Counter)
+        position_lookup = (
+            Q(variation__isnull=True, item_id__in=item_quotas.keys()) | Q(variation__in=var_quotas.keys())
+        )
+
+        if settings.PRETIX_QUOTA_LEDGER:
+            ledgers = {ql.quota_id: ql for ql in QuotaLedger.objects.filter(quota_id__in=quotas.keys())}
+            for pk, q in quotas.items():
+                ledger = ledgers[pk] if pk in ledgers else q.get_ledger()
+                usage[pk]['paid_orders'] = ledger.paid_orders
+                usage[pk]['pending_orders'] = ledger.pending_orders
+                usage[pk]['waiting_list'] = ledger.waiting_list
+        else:
+            positions = OrderPosition.objects.filter(
+                position_lookup, order__status__in=(Order.STATUS_PAID, Order.STATUS_PENDING)
+            ).order_by().values('order__status', 'item', 'variation', 'subevent').annotate(c=Count('id'))
+            for row in positions:
+                field = 'paid_orders' if row['order__status'] == Order.STATUS_PAID else 'pending_orders'
+                for pk in matching_quotas(row):
+                    usage[pk][field] += row['c']
+
+            if count_waitinglist:
+                entries = WaitingListEntry.objects.filter(
+                    position_lookup, voucher__isnull=True
+                ).order_by().values('item', 'variation', 'subevent').annotate(c=Count('id'))
+                for row in entries:
+                    for pk in matching_quotas(row):
+                        usage[pk]['waiting_list'] += row['c']
+
+        if 'sqlite3' in settings.DATABASES['default']['ENGINE']:
+            func = 'MAX'
+        else:  # NOQA
+            func = 'GREATEST'
+        vouchers = Voucher.objects.filter(
+            Q(block_quota=True) &
+            Q(Q(valid_until__isnull=True) | Q(valid_until__gte=now_dt)) &
+            Q(position_lookup | Q(quota_id__in=quotas.keys()))
+        ).order_by().values('item', 'variation', 'quota', 'subevent').annotate(
+            free=Sum(Func(F('max_usages') - F('redeemed'), 0, function=func))
+        )
+        for row in vouchers:
+            for pk in matching_quotas(row):
+                usage[pk]['blocking_vouchers'] += row['free'] or 0
+
+        carts = CartPosition.objects.filter(
+            Q(expires__gte=now_dt) &
+            Q(
+                Q(voucher__isnull=True)
+                | Q(voucher__block_quota=False)
+                | Q(voucher__valid_until__lt=now_dt)
+            ) &
+            position_lookup
+        ).order_by().values('item', 'variation', 'subevent').annotate(c=Count('id'))
+        for row in carts:
+            for pk in matching_quotas(row):
+                usage[pk]['in_cart'] += row['c']
+
+        for pk, q in quotas.items():
+            u = usage[pk]
+            q.cached_availability_paid_orders = u['paid_orders']
+            results[pk] = Quota._availability_from_usage(
+                q.size, u['paid_orders'], u['pending_orders'], u['blocking_vouchers'], u['in_cart'],
+                u['waiting_list'] if count_waitinglist else 0
+            )
+        return results
+
+
 class Quota(LoggedModel):
     """
     A quota is a "pool of tickets". It is there to limit the number of items
@@ -955,6 +1082,8 @@ class Quota(LoggedModel):
     cached_availability_paid_orders = models.PositiveIntegerField(null=True, blank=True)
     cached_availability_time = models.DateTimeField(null=True, blank=True)
 
+    objects = QuotaManager()
+
     class Meta:
         verbose_name = _("Quota")
         verbose_name_plural = _("Quotas")
@@ -973,6 +1102,9 @@ class Quota(LoggedModel):
         super().save(*args, **kwargs)
         if self.event and clear_cache:
             self.event.cache.clear()
+            if settings.PRETIX_QUOTA_LEDGER:
+                # The subevent might have changed, the ledger will be seeded again on the next calculation
+                QuotaLedger.objects.filter(quota=self).delete()
 
     def rebuild_cache(self, now_dt=None):
         self.cached_availability_time = None
@@ -1011,7 +1143,9 @@ class Quota(LoggedModel):
             self.cached_availability_number = res[1]
             self.cached_availability_time = now_dt
             if self.size is None:
-                self.cached_availability_paid_orders = self.count_paid_orders()
+                self.cached_availability_paid_orders = (
+                    self.get_ledger().paid_orders if settings.PRETIX_QUOTA_LEDGER else self.count_paid_orders()
+                )
             self.save(
                 update_fields=[
                     'cached_availability_state', 'cached_availability_number', 'cached_availability_time',
@@ -1031,13 +1165,21 @@ class Quota(LoggedModel):
         if size_left is None:
             return Quota.AVAILABILITY_OK, None
 
-        paid_orders = self.count_paid_orders()
+        if settings.PRETIX_QUOTA_LEDGER:
+            ledger = self.get_ledger()
+            paid_orders = ledger.paid_orders
+            pending_orders = ledger.pending_orders
+            waiting_list_pending = ledger.waiting_list
+        else:
+            paid_orders = self.count_paid_orders()
+            pending_orders = waiting_list_pending = None
+
         self.cached_availability_paid_orders = paid_orders
         size_left -= paid_orders
         if size_left <= 0:
             return Quota.AVAILABILITY_GONE, 0
 
-        size_left -= self.count_pending_orders()
+        size_left -= pending_orders if pending_orders is not None else self.count_pending_orders()
         if size_left <= 0:
             return Quota.AVAILABILITY_ORDERED, 0
 
@@ -1050,12 +1192,51 @@ class Quota(LoggedModel):
             return Quota.AVAILABILITY_RESERVED, 0
 
         if count_waitinglist:
-            size_left -= self.count_waiting_list_pending()
+            size_left -= (
+                waiting_list_pending if waiting_list_pending is not None else self.count_waiting_list_pending()
+            )
             if size_left <= 0:
                 return Quota.AVAILABILITY_RESERVED, 0
 
         return Quota.AVAILABILITY_OK, size_left
 
+    @staticmethod
+    def _availability_from_usage(size, paid_orders, pending_orders, blocking_vouchers, in_cart, waiting_list=0):
+        size_left = size - paid_orders
+        if size_left <= 0:
+            return Quota.AVAILABILITY_GONE, 0
+
+        size_left -= pending_orders
+        if size_left <= 0:
+            return Quota.AVAILABILITY_ORDERED, 0
+
+        size_left -= blocking_vouchers + in_cart + waiting_list
+        if size_left <= 0:
+            return Quota.AVAILABILITY_RESERVED, 0
+
+        return Quota.AVAILABILITY_OK, size_left
+
+    def get_ledger(self):
+        """
+        Returns the :py:class:`QuotaLedger` of this quota. If the quota does not have a ledger yet,
+        it will be seeded by counting all relevant order positions and waiting list entries.
+        """
+        try:
+            return QuotaLedger.objects.get(quota=self)
+        except QuotaLedger.DoesNotExist:
+            ledger, created = QuotaLedger.objects.get_or_create(quota=self, defaults=self.count_ledger_values())
+            return ledger
+
+    def count_ledger_values(self) -> dict:
+        """
+        Counts the values stored in a :py:class:`QuotaLedger` from scratch.
+        """
+        return {
+            'paid_orders': self.count_paid_orders(),
+            'pending_orders': self.count_pending_orders(),
+            'waiting_list': self.count_waiting_list_pending(),
+        }
+
     def count_blocking_vouchers(self, now_dt: datetime=None) -> int:
         from pretix.base.models import Voucher
 
@@ -1151,3 +1332,37 @@ class Quota(LoggedModel):
         else:
             if subevent:
                 raise ValidationError(_('The subevent does not belong to this event.'))
+
+
+class QuotaLedger(models.Model):
+    """
+    A set of incrementally maintained usage counters for a :py:class:`Quota`. If the
+    ``quota_ledger`` option is enabled, availability calculations read these counters
+    instead of counting order positions and waiting list entries every time. The counters
+    are updated within the same transaction as the state transitions that affect them
+    (see :py:mod:`pretix.base.services.quotas`) and are periodically reconciled against
+    a full count.
+
+    Cart positions and blocking vouchers are not part of the ledger, since whether they
+    count towards a quota depends on the current time.
+
+    :param quota: The quota this ledger belongs to
+    :type quota: Quota
+    :param paid_orders: The number of positions in paid orders
+    :type paid_orders: int
+    :param pending_orders: The number of positions in pending orders
+    :type pending_orders: int
+    :param waiting_list: The number of waiting list entries without a voucher
+    :type waiting_list: int
+    :param reconciled: The last time the counters have been compared to a full count
+    :type reconciled: datetime
+    """
+    quota = models.OneToOneField(
+        Quota,
+        on_delete=models.CASCADE,
+        related_name='ledger'
+    )
+    paid_orders = models.IntegerField(default=0)
+    pending_orders = models.IntegerField(default=0)
+    waiting_list = models.IntegerField(default=0)
+    reconciled = models.DateTimeField(default=now, db_index=True)
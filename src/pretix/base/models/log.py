@@ -1,11 +1,15 @@
 import json
+import zlib
+from collections import Counter
 
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.urls import reverse
+from django.utils.dateparse import parse_datetime
 from django.utils.functional import cached_property
 from django.utils.html import escape
+from django.utils.timezone import now
 from django.utils.translation import pgettext_lazy, ugettext_lazy as _
 
 from pretix.base.signals import logentry_object_link
@@ -38,7 +42,8 @@ class LogEntry(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField(db_index=True)
     content_object = GenericForeignKey('content_type', 'object_id')
-    datetime = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Not auto_now_add, as that would give buffered log entries the time they are written at
+    datetime = models.DateTimeField(default=now, db_index=True)
     user = models.ForeignKey('User', null=True, blank=True, on_delete=models.PROTECT)
     api_token = models.ForeignKey('TeamAPIToken', null=True, blank=True, on_delete=models.PROTECT)
     oauth_application = models.ForeignKey('pretixapi.OAuthApplication', null=True, blank=True, on_delete=models.PROTECT)
@@ -53,6 +58,10 @@ class LogEntry(models.Model):
 
     class Meta:
         ordering = ('-datetime',)
+        index_together = (
+            ('content_type', 'object_id', 'datetime'),
+            ('event', 'datetime'),
+        )
 
     def display(self):
         from ..signals import logentry_display
@@ -174,3 +183,91 @@ class LogEntry(models.Model):
 
     def delete(self, using=None, keep_parents=False):
         raise TypeError("Logs cannot be deleted.")
+
+
+class LogEntryArchive(models.Model):
+    """
+    A compressed chunk of log entries of an event that have been moved out of the
+    :py:class:`LogEntry` table to keep it small. See ``pretix.base.services.logarchive``.
+
+    :param first_datetime: The timestamp of the oldest log entry in this chunk
+    :type first_datetime: datetime
+    :param last_datetime: The timestamp of the newest log entry in this chunk
+    :type last_datetime: datetime
+    :param count: The number of log entries in this chunk
+    :type count: int
+    """
+    event = models.ForeignKey('Event', null=True, blank=True, on_delete=models.SET_NULL,
+                              related_name='logentry_archives')
+    created = models.DateTimeField(auto_now_add=True)
+    first_datetime = models.DateTimeField()
+    last_datetime = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    FIELDS = ('id', 'content_type_id', 'object_id', 'datetime', 'user_id', 'api_token_id',
+              'oauth_application_id', 'event_id', 'action_type', 'data', 'visible', 'shredded')
+
+    @classmethod
+    def pack(cls, entries: list) -> bytes:
+        rows = []
+        for le in entries:
+            row = [getattr(le, f) for f in cls.FIELDS]
+            row[3] = row[3].isoformat()
+            rows.append(row)
+        return zlib.compress(json.dumps(rows, separators=(',', ':')).encode())
+
+    def entries(self) -> list:
+        """
+        Returns the log entries of this chunk as unsaved :py:class:`LogEntry` objects with their
+        original primary keys.
+        """
+        result = []
+        for row in json.loads(zlib.decompress(bytes(self.data)).decode()):
+            values = dict(zip(self.FIELDS, row))
+            values['datetime'] = parse_datetime(values['datetime'])
+            result.append(LogEntry(**values))
+        return result
+
+
+class LogEntryArchiveSummary(models.Model):
+    """
+    The number of log entries within a chunk of the log archive that belong to the same object and
+    share the same action type, user and visibility. This allows to find and count archived log
+    entries in the database without decompressing all chunks. The fields have the same names as
+    the ones of :py:class:`LogEntry`, so the same filters can be applied to both.
+
+    :param archive: The chunk of the log archive
+    :type archive: LogEntryArchive
+    :param count: The number of log entries
+    :type count: int
+    """
+    archive = models.ForeignKey(LogEntryArchive, related_name='summaries', on_delete=models.CASCADE)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    action_type = models.CharField(max_length=255)
+    user = models.ForeignKey('User', null=True, blank=True, on_delete=models.PROTECT)
+    visible = models.BooleanField(default=True)
+    count = models.PositiveIntegerField()
+
+    KEY_FIELDS = ('content_type_id', 'object_id', 'action_type', 'user_id', 'visible')
+
+    class Meta:
+        index_together = (
+            ('content_type', 'object_id'),
+        )
+
+    @classmethod
+    def key(cls, logentry: LogEntry) -> tuple:
+        return tuple(getattr(logentry, f) for f in cls.KEY_FIELDS)
+
+    @classmethod
+    def summarize(cls, archive: LogEntryArchive, entries: list) -> list:
+        """
+        Returns the unsaved summaries of the given log entries, which are stored in ``archive``.
+        """
+        counts = Counter(cls.key(le) for le in entries)
+        return [
+            cls(archive=archive, count=count, **dict(zip(cls.KEY_FIELDS, key)))
+            for key, count in counts.items()
+        ]
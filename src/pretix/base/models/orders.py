@@ -9,7 +9,7 @@ from typing import Any, Dict, List, Union
 import dateutil
 import pytz
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.db.models import F, Sum
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
@@ -216,6 +216,8 @@ class Order(LoggedModel):
             kwargs['update_fields'] = list(kwargs['update_fields']) + ['last_modified']
         if not self.code:
             self.assign_code()
+        elif not self.pk and not ReservedOrderCode.reserve(self.event.organizer_id, self.code):
+            raise IntegrityError('The order code {} has already been used by this organizer.'.format(self.code))
         if not self.datetime:
             self.datetime = now()
         if not self.expires:
@@ -286,7 +288,7 @@ class Order(LoggedModel):
         charset = list('ABCDEFGHJKLMNPQRSTUVWXYZ3789')
         while True:
             code = get_random_string(length=settings.ENTROPY['order_code'], allowed_chars=charset)
-            if not Order.objects.filter(event__organizer=self.event.organizer, code=code).exists():
+            if ReservedOrderCode.reserve(self.event.organizer_id, code):
                 self.code = code
                 return
 
@@ -840,12 +842,22 @@ class OrderPosition(AbstractPosition):
         unique=True,
         db_index=True
     )
+    last_modified = models.DateTimeField(
+        auto_now=True, db_index=True
+    )
 
     class Meta:
         verbose_name = _("Order position")
         verbose_name_plural = _("Order positions")
         ordering = ("positionid", "id")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the secret we loaded, so we know if it has been replaced when saving
+        instance._loaded_secret = instance.__dict__.get('secret')
+        return instance
+
     @cached_property
     def sort_key(self):
         return self.addon_to.positionid if self.addon_to else self.positionid, self.addon_to_id or 0
@@ -915,6 +927,8 @@ class OrderPosition(AbstractPosition):
             self.tax_rate = Decimal('0.00')
 
     def save(self, *args, **kwargs):
+        if 'update_fields' in kwargs and 'last_modified' not in kwargs['update_fields']:
+            kwargs['update_fields'] = list(kwargs['update_fields']) + ['last_modified']
         if self.tax_rate is None:
             self._calculate_tax()
         self.order.touch()
@@ -925,7 +939,18 @@ class OrderPosition(AbstractPosition):
         if not self.pseudonymization_id:
             self.assign_pseudonymization_id()
 
-        return super().save(*args, **kwargs)
+        loaded_secret = getattr(self, '_loaded_secret', None)
+        if self.pk and loaded_secret and loaded_secret != self.secret:
+            RevokedTicketSecret.objects.create(event=self.order.event, secret=loaded_secret)
+
+        ret = super().save(*args, **kwargs)
+        self._loaded_secret = self.secret
+        return ret
+
+    def delete(self, **kwargs):
+        RevokedTicketSecret.objects.create(event=self.order.event, secret=self.secret)
+        self.order.touch()
+        super().delete(**kwargs)
 
     def assign_pseudonymization_id(self):
         # This omits some character pairs completely because they are hard to read even on screens (1/I and O/0)
@@ -940,6 +965,43 @@ class OrderPosition(AbstractPosition):
                 return
 
 
+class RevokedTicketSecret(models.Model):
+    """
+    Records a ticket secret that is no longer valid because its position has been deleted or
+    has received a new secret. Check-in devices use these to remove tickets from their local
+    database when they synchronize.
+    """
+    event = models.ForeignKey(Event, related_name='revoked_secrets', on_delete=models.CASCADE)
+    secret = models.CharField(max_length=64)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class ReservedOrderCode(models.Model):
+    """
+    Records that an order code is in use within an organizer. Order codes need to be unique among all
+    events of an organizer, which the orders table can not enforce by itself. With this table, a new
+    code can be allocated with a single insert instead of looking it up in all orders of the organizer.
+    """
+    organizer = models.ForeignKey('Organizer', related_name='reserved_order_codes', on_delete=models.CASCADE)
+    code = models.CharField(max_length=16)
+
+    class Meta:
+        unique_together = ('organizer', 'code')
+
+    @classmethod
+    def reserve(cls, organizer: int, code: str) -> bool:
+        """
+        Reserves the given order code for the organizer with the given ID. Returns ``False`` if it
+        already has been reserved before.
+        """
+        try:
+            with transaction.atomic():
+                cls.objects.create(organizer_id=organizer, code=code)
+        except IntegrityError:
+            return False
+        return True
+
+
 class CartPosition(AbstractPosition):
     """
     A cart position is similar to an order line, except that it is not
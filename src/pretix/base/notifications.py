@@ -12,6 +12,7 @@ from pretix.helpers.urls import build_absolute_uri
 
 logger = logging.getLogger(__name__)
 _ALL_TYPES = None
+_ACTION_TYPES = {}
 
 
 NotificationAttribute = namedtuple('NotificationAttribute', ('title', 'value'))
@@ -115,6 +116,21 @@ def get_all_notification_types(event=None):
     return types
 
 
+def get_notification_action_types(event=None) -> frozenset:
+    """
+    Returns the action types of all notification types that are available for the given event.
+    Which notification types are registered only depends on the plugins that are active, so
+    unlike :py:func:`get_all_notification_types`, the result is cached for every event and set of
+    plugins without sending the signal again.
+    """
+    key = (event.pk, event.plugins) if event else None
+    if key not in _ACTION_TYPES:
+        if len(_ACTION_TYPES) > 1000:
+            _ACTION_TYPES.clear()
+        _ACTION_TYPES[key] = frozenset(get_all_notification_types(event))
+    return _ACTION_TYPES[key]
+
+
 class ActionRequiredNotificationType(NotificationType):
     required_permission = "can_change_orders"
     action_type = "pretix.event.action_required"
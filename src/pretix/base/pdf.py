@@ -1,19 +1,21 @@
 import copy
+import hashlib
+import itertools
+import json
 import logging
 import re
-import uuid
+import threading
 from collections import OrderedDict
+from functools import lru_cache
 from io import BytesIO
 
 import bleach
 from django.contrib.staticfiles import finders
 from django.utils.formats import date_format
 from django.utils.translation import ugettext_lazy as _
-from PyPDF2 import PdfFileReader
+from PyPDF2 import PdfFileReader, PdfFileWriter
 from pytz import timezone
-from reportlab.graphics import renderPDF
-from reportlab.graphics.barcode.qr import QrCodeWidget
-from reportlab.graphics.shapes import Drawing
+from reportlab.graphics.barcode import qrencoder
 from reportlab.lib.colors import Color
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.lib.styles import ParagraphStyle
@@ -183,32 +185,154 @@ def get_variables(event):
     return v
 
 
+def _clean_text(text):
+    return re.sub(
+        "<br[^>]*>", "<br/>",
+        bleach.clean(text or "", tags=["br"], attributes={}, styles=[], strip=True)
+    )
+
+
+@lru_cache(maxsize=128)
+def compile_layout(layout: str) -> tuple:
+    """
+    Prepares everything that is the same for all pages rendered with a layout, i.e. everything
+    but the content of text areas that show variables. Since the result only depends on the
+    layout itself, it is cached by the layout's JSON representation.
+
+    :param layout: The layout as a JSON string
+    :returns: A tuple of dictionaries, one per layout object, each containing at least the
+              ``type`` and the original ``object``
+    """
+    align_map = {
+        'left': TA_LEFT,
+        'center': TA_CENTER,
+        'right': TA_RIGHT
+    }
+    plan = []
+    for i, o in enumerate(json.loads(layout)):
+        element = {'type': o['type'], 'object': o}
+        if o['type'] == 'textarea':
+            font = o['fontfamily']
+            if o['bold']:
+                font += ' B'
+            if o['italic']:
+                font += ' I'
+            fontsize = float(o['fontsize'])
+            ad = getAscentDescent(font, fontsize)
+            element.update({
+                'style': ParagraphStyle(
+                    name='textarea-{}'.format(i),
+                    fontName=font,
+                    fontSize=fontsize,
+                    leading=fontsize,
+                    autoLeading="max",
+                    textColor=Color(o['color'][0] / 255, o['color'][1] / 255, o['color'][2] / 255),
+                    alignment=align_map[o['align']]
+                ),
+                'width': float(o['width']) * mm,
+                'x': float(o['left']) * mm,
+                'y': float(o['bottom']) * mm - ad[1],
+                'static': None,
+            })
+            if not o['content']:
+                element['static'] = '(error)'
+            elif o['content'] == 'other':
+                element['static'] = _clean_text(o['text'].replace("\n", "<br/>\n"))
+        plan.append(element)
+    return tuple(plan)
+
+
+# Quiet zone around the code, in modules, as used by reportlab's QrCodeWidget
+QR_BORDER = 4
+
+
+@lru_cache(maxsize=4096)
+def qr_matrix(content: str, level: str='H') -> tuple:
+    """
+    Computes the modules of a QR code. The result is cached, since the same ticket is usually
+    rendered more than once, e.g. as a single ticket and as part of the combined order file.
+
+    :returns: A tuple with one tuple per row, containing ``(start, length)`` tuples for every
+              run of dark modules in that row
+    """
+    qr = qrencoder.QRCode(None, getattr(qrencoder.QRErrorCorrectLevel, level))
+    qr.addData(content)
+    qr.make()
+    rows = []
+    for row in qr.modules:
+        runs = []
+        c = 0
+        for dark, group in itertools.groupby(bool(m) for m in row):
+            length = len(list(group))
+            if dark:
+                runs.append((c, length))
+            c += length
+        rows.append(tuple(runs))
+    return tuple(rows)
+
+
+def draw_qrcode(canvas: Canvas, content: str, x: float, y: float, size: float, level: str='H'):
+    """
+    Draws a QR code with the same geometry as reportlab's ``QrCodeWidget``, but as a single
+    path instead of one rectangle object per run of modules. The path is stored as a form
+    XObject, so the same code is only embedded once per document.
+    """
+    name = 'qr-' + hashlib.sha1('{}|{}|{}'.format(content, level, size).encode()).hexdigest()
+    forms = canvas.__dict__.setdefault('_pretix_qr_forms', set())
+    if name not in forms:
+        rows = qr_matrix(content, level)
+        box = size / (len(rows) + QR_BORDER * 2.0)
+        canvas.beginForm(name, lowerx=0, lowery=0, upperx=size, uppery=size)
+        canvas.setFillColorRGB(0, 0, 0)
+        path = canvas.beginPath()
+        for r, runs in enumerate(rows):
+            for c, length in runs:
+                path.rect((c + QR_BORDER) * box, size - (r + QR_BORDER + 1) * box, length * box, box)
+        canvas.drawPath(path, stroke=0, fill=1)
+        canvas.endForm()
+        forms.add(name)
+
+    canvas.saveState()
+    canvas.translate(x, y)
+    canvas.doForm(name)
+    canvas.restoreState()
+
+
 class Renderer:
 
     def __init__(self, event, layout, background_file):
         self.layout = layout
         self.background_file = background_file
         self.variables = get_variables(event)
+        self._plan = None
         if self.background_file:
-            self.bg_pdf = PdfFileReader(BytesIO(self.background_file.read()))
+            self.bg_bytes = self.background_file.read()
         else:
-            self.bg_pdf = None
+            self.bg_bytes = None
 
     @classmethod
     def _register_fonts(cls):
-        pdfmetrics.registerFont(TTFont('Open Sans', finders.find('fonts/OpenSans-Regular.ttf')))
-        pdfmetrics.registerFont(TTFont('Open Sans I', finders.find('fonts/OpenSans-Italic.ttf')))
-        pdfmetrics.registerFont(TTFont('Open Sans B', finders.find('fonts/OpenSans-Bold.ttf')))
-        pdfmetrics.registerFont(TTFont('Open Sans B I', finders.find('fonts/OpenSans-BoldItalic.ttf')))
-
+        # Parsing a font file is expensive, so we only do it once per process. Plugins might add new
+        # fonts later on, so we still check every time.
+        fonts = [
+            ('Open Sans', 'fonts/OpenSans-Regular.ttf'),
+            ('Open Sans I', 'fonts/OpenSans-Italic.ttf'),
+            ('Open Sans B', 'fonts/OpenSans-Bold.ttf'),
+            ('Open Sans B I', 'fonts/OpenSans-BoldItalic.ttf'),
+        ]
         for family, styles in get_fonts().items():
-            pdfmetrics.registerFont(TTFont(family, finders.find(styles['regular']['truetype'])))
+            fonts.append((family, styles['regular']['truetype']))
             if 'italic' in styles:
-                pdfmetrics.registerFont(TTFont(family + ' I', finders.find(styles['italic']['truetype'])))
+                fonts.append((family + ' I', styles['italic']['truetype']))
             if 'bold' in styles:
-                pdfmetrics.registerFont(TTFont(family + ' B', finders.find(styles['bold']['truetype'])))
+                fonts.append((family + ' B', styles['bold']['truetype']))
             if 'bolditalic' in styles:
-                pdfmetrics.registerFont(TTFont(family + ' B I', finders.find(styles['bolditalic']['truetype'])))
+                fonts.append((family + ' B I', styles['bolditalic']['truetype']))
+
+        registered = set(pdfmetrics.getRegisteredFontNames())
+        for name, path in fonts:
+            if name not in registered:
+                pdfmetrics.registerFont(TTFont(name, finders.find(path)))
 
     def _draw_barcodearea(self, canvas: Canvas, op: OrderPosition, o: dict):
         content = o.get('content', 'secret')
@@ -218,12 +342,7 @@ class Renderer:
             content = op.pseudonymization_id
 
         reqs = float(o['size']) * mm
-        qrw = QrCodeWidget(content, barLevel='H', barHeight=reqs, barWidth=reqs)
-        d = Drawing(reqs, reqs)
-        d.add(qrw)
-        qr_x = float(o['left']) * mm
-        qr_y = float(o['bottom']) * mm
-        renderPDF.draw(d, canvas, qr_x, qr_y)
+        draw_qrcode(canvas, content, float(o['left']) * mm, float(o['bottom']) * mm, reqs)
 
     def _get_ev(self, op, order):
         return op.subevent or order.event
@@ -244,64 +363,98 @@ class Renderer:
                 return '(error)'
         return ''
 
-    def _draw_textarea(self, canvas: Canvas, op: OrderPosition, order: Order, o: dict):
-        font = o['fontfamily']
-        if o['bold']:
-            font += ' B'
-        if o['italic']:
-            font += ' I'
-
-        align_map = {
-            'left': TA_LEFT,
-            'center': TA_CENTER,
-            'right': TA_RIGHT
-        }
-        style = ParagraphStyle(
-            name=uuid.uuid4().hex,
-            fontName=font,
-            fontSize=float(o['fontsize']),
-            leading=float(o['fontsize']),
-            autoLeading="max",
-            textColor=Color(o['color'][0] / 255, o['color'][1] / 255, o['color'][2] / 255),
-            alignment=align_map[o['align']]
-        )
-        text = re.sub(
-            "<br[^>]*>", "<br/>",
-            bleach.clean(
-                self._get_text_content(op, order, o) or "",
-                tags=["br"], attributes={}, styles=[], strip=True
-            )
-        )
-        p = Paragraph(text, style=style)
-        p.wrapOn(canvas, float(o['width']) * mm, 1000 * mm)
-        # p_size = p.wrap(float(o['width']) * mm, 1000 * mm)
-        ad = getAscentDescent(font, float(o['fontsize']))
-        p.drawOn(canvas, float(o['left']) * mm, float(o['bottom']) * mm - ad[1])
+    def _draw_textarea(self, canvas: Canvas, op: OrderPosition, order: Order, element: dict):
+        text = element['static']
+        if text is None:
+            text = _clean_text(self._get_text_content(op, order, element['object']))
+        p = Paragraph(text, style=element['style'])
+        p.wrapOn(canvas, element['width'], 1000 * mm)
+        p.drawOn(canvas, element['x'], element['y'])
+
+    @property
+    def plan(self) -> tuple:
+        if self._plan is None:
+            # Compiling requires the fonts to be registered, so we can't do it in the constructor
+            self._plan = compile_layout(json.dumps(self.layout, sort_keys=True))
+        return self._plan
 
     def draw_page(self, canvas: Canvas, order: Order, op: OrderPosition):
-        for o in self.layout:
-            if o['type'] == "barcodearea":
-                self._draw_barcodearea(canvas, op, o)
-            elif o['type'] == "textarea":
-                self._draw_textarea(canvas, op, order, o)
+        for element in self.plan:
+            if element['type'] == "barcodearea":
+                self._draw_barcodearea(canvas, op, element['object'])
+            elif element['type'] == "textarea":
+                self._draw_textarea(canvas, op, order, element)
         canvas.showPage()
 
+    def background_pdf(self):
+        """
+        Returns a newly parsed copy of the background PDF file. A PDF reader must not be used
+        for more than one output file, as writing an output modifies the pages of the reader.
+        """
+        if self.bg_bytes is None:
+            return None
+        return PdfFileReader(BytesIO(self.bg_bytes))
+
     def render_background(self, buffer, title=_('Ticket')):
-        from PyPDF2 import PdfFileWriter, PdfFileReader
         buffer.seek(0)
-        new_pdf = PdfFileReader(buffer)
-        output = PdfFileWriter()
-
-        for page in new_pdf.pages:
-            bg_page = copy.copy(self.bg_pdf.getPage(0))
-            bg_page.mergePage(page)
-            output.addPage(bg_page)
-
-        output.addMetadata({
-            '/Title': str(title),
-            '/Creator': 'pretix',
-        })
-        outbuffer = BytesIO()
-        output.write(outbuffer)
-        outbuffer.seek(0)
-        return outbuffer
+        num_pages = PdfFileReader(buffer).getNumPages()
+        return merge_backgrounds(buffer, [self.background_pdf()] * num_pages, title)
+
+
+def merge_backgrounds(buffer, backgrounds: list, title=_('Ticket')):
+    """
+    Puts the pages of a PDF file rendered with reportlab on top of their backgrounds.
+
+    :param buffer: A file-like object containing the rendered pages
+    :param backgrounds: A list with one parsed background PDF per page, the first page of
+                        which is used as the background. The same object may be given for
+                        multiple pages, but must not be used for another call.
+    :returns: A ``BytesIO`` containing the resulting PDF file
+    """
+    buffer.seek(0)
+    new_pdf = PdfFileReader(buffer)
+    output = PdfFileWriter()
+
+    for page, bg_pdf in zip(new_pdf.pages, backgrounds):
+        bg_page = copy.copy(bg_pdf.getPage(0))
+        bg_page.mergePage(page)
+        output.addPage(bg_page)
+
+    output.addMetadata({
+        '/Title': str(title),
+        '/Creator': 'pretix',
+    })
+    outbuffer = BytesIO()
+    output.write(outbuffer)
+    outbuffer.seek(0)
+    return outbuffer
+
+
+_background_cache = OrderedDict()
+_background_cache_lock = threading.Lock()
+BACKGROUND_CACHE_SIZE = 16
+
+
+def cached_background(key, open_file) -> BytesIO:
+    """
+    Returns the content of a background PDF file, reading it only if it has not been read by
+    this process before.
+
+    :param key: An identifier for the content of the file that needs to change if the content
+                changes, e.g. the storage name of an uploaded file.
+    :param open_file: A callable returning an opened file, which is called if the file is not
+                      yet cached.
+    """
+    with _background_cache_lock:
+        if key in _background_cache:
+            _background_cache.move_to_end(key)
+            return BytesIO(_background_cache[key])
+
+    with open_file() as f:
+        content = f.read()
+
+    with _background_cache_lock:
+        _background_cache[key] = content
+        while len(_background_cache) > BACKGROUND_CACHE_SIZE:
+            _background_cache.popitem(last=False)
+    return BytesIO(content)
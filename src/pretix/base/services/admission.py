@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from django.conf import settings
+
+from pretix.base.models import Event
+
+# Number of seconds a visitor in the queue may go without checking their status before they lose
+# their position. The presale frontend checks every few seconds while the queue page is open.
+QUEUE_TIMEOUT = 60
+
+
+class AdmissionBackend:
+    """
+    Keeps track of the visitors that are currently admitted to add products to their cart and
+    of the order in which all other visitors are waiting for their turn.
+
+    Visitors are identified by an opaque token, e.g. their cart ID.
+    """
+
+    def check(self, event_id: int, token: str, size: int, ttl: int) -> Tuple[bool, int]:
+        """
+        Admits the visitor if there is capacity left or puts them at the end of the queue.
+        Calling this again refreshes the visitor's admission or their position in the queue.
+        If capacity frees up, the visitors who waited longest are admitted first.
+
+        :param event_id: The ID of the event the visitor wants to buy tickets for
+        :param token: The identifier of the visitor
+        :param size: The number of visitors that may be admitted at the same time
+        :param ttl: The number of seconds an admission stays valid without being refreshed
+        :returns: A tuple of a boolean that tells whether the visitor is admitted and the
+                  visitor's position in the queue, starting at 1 (0 if admitted)
+        """
+        raise NotImplementedError()
+
+    def leave(self, event_id: int, token: str) -> None:
+        """
+        Removes the visitor from the queue and gives their admission to the next visitor.
+        """
+        raise NotImplementedError()
+
+
+class LocalAdmissionBackend(AdmissionBackend):
+    """
+    Keeps the queue in memory. This only works within one process and is therefore only
+    used if no redis server is configured, e.g. in development and tests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._admitted = {}
+        self._queues = {}
+
+    def check(self, event_id, token, size, ttl):
+        t = time.time()
+        with self._lock:
+            admitted = {k: v for k, v in self._admitted.get(event_id, {}).items() if v > t}
+            queue = OrderedDict(
+                (k, v) for k, v in self._queues.get(event_id, OrderedDict()).items() if v > t - QUEUE_TIMEOUT
+            )
+            self._admitted[event_id], self._queues[event_id] = admitted, queue
+
+            if token in admitted:
+                admitted[token] = t + ttl
+                return True, 0
+
+            queue[token] = t
+            while len(admitted) < size and queue:
+                k, v = queue.popitem(last=False)
+                admitted[k] = t + ttl
+
+            if token in admitted:
+                return True, 0
+            return False, list(queue).index(token) + 1
+
+    def leave(self, event_id, token):
+        with self._lock:
+            self._admitted.get(event_id, {}).pop(token, None)
+            self._queues.get(event_id, OrderedDict()).pop(token, None)
+
+
+class RedisAdmissionBackend(AdmissionBackend):
+    """
+    Keeps the queue in redis, using three sorted sets per event: The admitted visitors scored by
+    the expiry of their admission, the waiting visitors scored by their arrival and the waiting
+    visitors scored by the last time they checked their status. All changes are done in a single
+    Lua script to make them atomic.
+    """
+    CHECK_SCRIPT = """
+    local token, t = ARGV[1], tonumber(ARGV[2])
+    local size, ttl, timeout = tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', t)
+    for _, k in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', t - timeout)) do
+        redis.call('ZREM', KEYS[2], k)
+        redis.call('ZREM', KEYS[3], k)
+    end
+    for i = 1, 4 do
+        redis.call('EXPIRE', KEYS[i], ttl + timeout)
+    end
+
+    if redis.call('ZSCORE', KEYS[1], token) then
+        redis.call('ZADD', KEYS[1], t + ttl, token)
+        return 0
+    end
+
+    if not redis.call('ZSCORE', KEYS[2], token) then
+        redis.call('ZADD', KEYS[2], redis.call('INCR', KEYS[4]), token)
+    end
+    redis.call('ZADD', KEYS[3], t, token)
+
+    local free = size - redis.call('ZCARD', KEYS[1])
+    if free > 0 then
+        for _, k in ipairs(redis.call('ZRANGE', KEYS[2], 0, free - 1)) do
+            redis.call('ZADD', KEYS[1], t + ttl, k)
+            redis.call('ZREM', KEYS[2], k)
+            redis.call('ZREM', KEYS[3], k)
+        end
+    end
+
+    if redis.call('ZSCORE', KEYS[1], token) then
+        return 0
+    end
+    return redis.call('ZRANK', KEYS[2], token) + 1
+    """
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+
+        self.redis = get_redis_connection("redis")
+        self._check = self.redis.register_script(self.CHECK_SCRIPT)
+
+    def _keys(self, event_id):
+        return ['pretix_admission_{}_{}'.format(event_id, k) for k in ('admitted', 'queue', 'seen', 'counter')]
+
+    def check(self, event_id, token, size, ttl):
+        position = self._check(keys=self._keys(event_id), args=[token, time.time(), size, ttl, QUEUE_TIMEOUT])
+        return position == 0, position
+
+    def leave(self, event_id, token):
+        pipe = self.redis.pipeline()
+        for key in self._keys(event_id)[:3]:
+            pipe.zrem(key, token)
+        pipe.execute()
+
+
+_backend = None
+
+
+def get_backend() -> AdmissionBackend:
+    global _backend
+    if _backend is None:
+        _backend = RedisAdmissionBackend() if settings.HAS_REDIS else LocalAdmissionBackend()
+    return _backend
+
+
+def check_admission(event: Event, token: str) -> Tuple[bool, int]:
+    """
+    Checks whether the visitor identified by ``token`` may add products to their cart right now.
+    Visitors are always admitted if the queue is disabled for this event.
+
+    :returns: A tuple of a boolean that tells whether the visitor is admitted and the
+              visitor's position in the queue, starting at 1 (0 if admitted)
+    """
+    size = event.settings.queue_size
+    if not size:
+        return True, 0
+    # Admission lasts as long as the products in the visitor's cart are reserved
+    ttl = max(event.settings.reservation_time, 1) * 60
+    return get_backend().check(event.pk, token, size, ttl)
+
+
+def leave_queue(event: Event, token: str) -> None:
+    """
+    Frees the admission of the visitor identified by ``token``, e.g. after they placed their order.
+    """
+    if event.settings.queue_size:
+        get_backend().leave(event.pk, token)
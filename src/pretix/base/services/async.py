@@ -16,14 +16,31 @@ from django.conf import settings
 from django.db import transaction
 
 from pretix.base.metrics import (
-    pretix_task_duration_seconds, pretix_task_runs_total,
+    pretix_task_duration_seconds, pretix_task_queries,
+    pretix_task_query_seconds, pretix_task_repeated_queries_total,
+    pretix_task_runs_total,
 )
 from pretix.celery_app import app
+from pretix.helpers.profile.queries import QueryProfile
 
 
 class ProfiledTask(app.Task):
     def __call__(self, *args, **kwargs):
+        if not settings.METRICS_ENABLED:
+            return self._run_profiled(*args, **kwargs)[0]
 
+        with QueryProfile(enabled=random.random() < settings.METRICS_QUERY_SAMPLE_RATE) as profile:
+            ret, tottime = self._run_profiled(*args, **kwargs)
+        pretix_task_duration_seconds.observe(tottime, task_name=self.name)
+        if profile.enabled:
+            pretix_task_queries.observe(profile.count, task_name=self.name)
+            pretix_task_query_seconds.observe(profile.duration, task_name=self.name)
+            repeated = profile.repeated()
+            if repeated:
+                pretix_task_repeated_queries_total.inc(len(repeated), task_name=self.name)
+        return ret
+
+    def _run_profiled(self, *args, **kwargs):
         if settings.PROFILING_RATE > 0 and random.random() < settings.PROFILING_RATE / 100:
             profiler = cProfile.Profile()
             profiler.enable()
@@ -38,10 +55,7 @@ class ProfiledTask(app.Task):
             t0 = time.perf_counter()
             ret = super().__call__(*args, **kwargs)
             tottime = time.perf_counter() - t0
-
-        if settings.METRICS_ENABLED:
-            pretix_task_duration_seconds.observe(tottime, task_name=self.name)
-        return ret
+        return ret, tottime
 
     def on_failure(self, exc, task_id, args, kwargs, einfo):
         if settings.METRICS_ENABLED:
@@ -0,0 +1,200 @@
+from datetime import timedelta
+
+import pytz
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_delete,
+)
+from django.dispatch import receiver
+
+from pretix.base.models import (
+    CalendarEntry, Event, Event_SettingsStore, Organizer,
+    Organizer_SettingsStore, SubEvent,
+)
+from pretix.base.settings import GlobalSettingsObject
+from pretix.celery_app import app
+from pretix.multidomain.urlreverse import eventreverse
+
+from ..signals import periodic_task
+
+# Settings that change how an event is shown in the calendar
+CALENDAR_SETTINGS = ('timezone', 'show_date_to', 'show_times')
+
+# Events that are currently being deleted, see calendar_event_deleting
+_deleting = set()
+
+
+def calendar_entries(event: Event, subevent: SubEvent=None) -> list:
+    """
+    Returns the unsaved calendar entries of an event or, if given, of one of its subevents,
+    regardless of whether they should be shown in the calendar at all.
+    """
+    ev = subevent or event
+    tzname = event.settings.timezone
+    tz = pytz.timezone(tzname)
+    show_times = event.settings.show_times
+    url = eventreverse(event, 'presale:event.index', kwargs={'subevent': subevent.pk} if subevent else None)
+
+    datetime_from = ev.date_from.astimezone(tz)
+    date_from = datetime_from.date()
+    if event.settings.show_date_to and ev.date_to:
+        date_to = ev.date_to.astimezone(tz).date()
+    else:
+        date_to = date_from
+
+    entries = []
+    d = date_from
+    while d <= date_to:
+        first = d == date_from
+        entries.append(CalendarEntry(
+            organizer_id=event.organizer_id,
+            event=event,
+            subevent=subevent,
+            day=d,
+            continued=not first,
+            time=datetime_from.time().replace(tzinfo=None) if first and show_times else None,
+            datetime_from=ev.date_from,
+            url=url,
+            timezone=tzname,
+        ))
+        d += timedelta(days=1)
+    return entries
+
+
+def _shown_entries(event: Event, subevent: SubEvent=None) -> list:
+    if not event.live or not event.is_public:
+        return []
+
+    if subevent:
+        return calendar_entries(event, subevent) if subevent.active else []
+
+    entries = []
+    if not event.has_subevents:
+        entries += calendar_entries(event)
+    for se in event.subevents.filter(active=True):
+        entries += calendar_entries(event, se)
+    return entries
+
+
+def rebuild_calendar_entries(event: Event, subevent: SubEvent=None) -> None:
+    """
+    Replaces the calendar entries of an event and all of its subevents or, if given, of only one
+    of its subevents.
+    """
+    qs = CalendarEntry.objects.filter(event=event)
+    if subevent:
+        qs = qs.filter(subevent=subevent)
+    qs.delete()
+    CalendarEntry.objects.bulk_create(_shown_entries(event, subevent))
+
+
+def rebuild_organizer_calendar(organizer: Organizer) -> None:
+    """
+    Replaces all calendar entries of an organizer.
+    """
+    CalendarEntry.objects.filter(organizer=organizer).delete()
+    entries = []
+    events = organizer.events.filter(live=True, is_public=True).select_related('organizer').prefetch_related(
+        '_settings_objects'
+    )
+    for event in events:
+        # The URLs of the events might have changed as well
+        event.cache.clear()
+        entries += _shown_entries(event)
+    CalendarEntry.objects.bulk_create(entries)
+
+
+def calendar_index_built() -> bool:
+    """
+    Returns whether the calendar entries have been computed for all organizers. Until then, e.g.
+    right after the upgrade that introduced them, calendars need to be built from the events.
+    """
+    return GlobalSettingsObject().settings.calendar_index_built
+
+
+@receiver(signal=periodic_task)
+def build_calendar_index(sender, **kwargs):
+    gs = GlobalSettingsObject()
+    if not gs.settings.calendar_index_built and not gs.settings.calendar_index_queued:
+        # A rebuild might take longer than the interval of the periodic tasks, so we only start it once
+        gs.settings.set('calendar_index_queued', True)
+        rebuild_calendar_index.apply_async()
+
+
+@app.task
+def rebuild_calendar_index():
+    for organizer in Organizer.objects.all():
+        rebuild_organizer_calendar(organizer)
+    GlobalSettingsObject().settings.set('calendar_index_built', True)
+
+
+def _event_state(event):
+    return tuple(event.__dict__.get(f) for f in (
+        'organizer_id', 'slug', 'live', 'is_public', 'has_subevents', 'date_from', 'date_to'
+    ))
+
+
+def _subevent_state(subevent):
+    return tuple(subevent.__dict__.get(f) for f in ('event_id', 'active', 'date_from', 'date_to'))
+
+
+@receiver(post_init, sender=Event, dispatch_uid="calendar_event_init")
+def calendar_event_init(sender, instance, **kwargs):
+    instance._calendar_state = _event_state(instance)
+
+
+@receiver(post_save, sender=Event, dispatch_uid="calendar_event_saved")
+def calendar_event_saved(sender, instance, created, **kwargs):
+    old_state = instance._calendar_state
+    new_state = instance._calendar_state = _event_state(instance)
+    if old_state == new_state and not created:
+        return
+    # Event.save() clears the cache only after this signal, but we need the new URL now
+    instance.cache.clear()
+    rebuild_calendar_entries(instance)
+
+
+@receiver(post_init, sender=SubEvent, dispatch_uid="calendar_subevent_init")
+def calendar_subevent_init(sender, instance, **kwargs):
+    instance._calendar_state = _subevent_state(instance)
+
+
+@receiver(post_save, sender=SubEvent, dispatch_uid="calendar_subevent_saved")
+def calendar_subevent_saved(sender, instance, created, **kwargs):
+    old_state = instance._calendar_state
+    new_state = instance._calendar_state = _subevent_state(instance)
+    if old_state == new_state and not created:
+        return
+    rebuild_calendar_entries(instance.event, instance)
+
+
+@receiver(pre_delete, sender=Event, dispatch_uid="calendar_event_deleting")
+def calendar_event_deleting(sender, instance, **kwargs):
+    # The settings of an event are deleted before the event itself. We must not create new
+    # calendar entries for it in the meantime.
+    _deleting.add(instance.pk)
+
+
+@receiver(post_delete, sender=Event, dispatch_uid="calendar_event_deleted")
+def calendar_event_deleted(sender, instance, **kwargs):
+    _deleting.discard(instance.pk)
+
+
+@receiver(post_save, sender=Event_SettingsStore, dispatch_uid="calendar_event_setting_saved")
+@receiver(post_delete, sender=Event_SettingsStore, dispatch_uid="calendar_event_setting_deleted")
+def calendar_event_setting_changed(sender, instance, **kwargs):
+    if instance.key not in CALENDAR_SETTINGS or instance.object_id in _deleting:
+        return
+    event = Event.objects.select_related('organizer').get(pk=instance.object_id)
+    # The settings cache is only flushed after this signal
+    event.settings.flush()
+    rebuild_calendar_entries(event)
+
+
+@receiver(post_save, sender=Organizer_SettingsStore, dispatch_uid="calendar_organizer_setting_saved")
+@receiver(post_delete, sender=Organizer_SettingsStore, dispatch_uid="calendar_organizer_setting_deleted")
+def calendar_organizer_setting_changed(sender, instance, **kwargs):
+    if instance.key not in CALENDAR_SETTINGS:
+        return
+    organizer = Organizer.objects.get(pk=instance.object_id)
+    organizer.settings.flush()
+    rebuild_organizer_calendar(organizer)
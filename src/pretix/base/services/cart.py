@@ -12,7 +12,7 @@ from django.utils.translation import pgettext_lazy, ugettext as _
 
 from pretix.base.i18n import language
 from pretix.base.models import (
-    CartPosition, Event, InvoiceAddress, Item, ItemVariation, Voucher,
+    CartPosition, Event, InvoiceAddress, Item, ItemVariation, Quota, Voucher,
 )
 from pretix.base.models.event import SubEvent
 from pretix.base.models.orders import OrderFee
@@ -479,10 +479,11 @@ class CartManager:
 
     def _get_quota_availability(self):
         quotas_ok = defaultdict(int)
+        availabilities = Quota.objects.bulk_availability(self._quota_diff.keys(), self.now_dt)
         for quota, count in self._quota_diff.items():
             if count <= 0:
                 quotas_ok[quota] = 0
-            avail = quota.availability(self.now_dt)
+            avail = availabilities[quota.pk]
             if avail[1] is not None and avail[1] < count:
                 quotas_ok[quota] = min(count, avail[1])
             else:
@@ -611,7 +612,9 @@ class CartManager:
         self._check_max_cart_size()
         self._calculate_expiry()
 
-        with self.event.lock() as now_dt:
+        # Expired positions in the cart might be extended, so we need to lock their quotas as well
+        with self.event.lock(quotas=self._quota_diff.keys(), vouchers=self._voucher_use_diff.keys(),
+                             positions=self.positions) as now_dt:
             with transaction.atomic():
                 self.now_dt = now_dt
                 self._extend_expiry_of_valid_existing_positions()
@@ -1,11 +1,24 @@
+from collections import Counter
+from datetime import timedelta
+
 from django.db import transaction
-from django.db.models import Prefetch
+from django.db.models import Count, F, Prefetch
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_init, post_save, pre_delete,
+)
+from django.dispatch import receiver
 from django.utils.timezone import now
 from django.utils.translation import ugettext as _
 
 from pretix.base.models import (
-    Checkin, CheckinList, Order, OrderPosition, Question, QuestionOption,
+    Checkin, CheckinList, CheckinListCounter, Order, OrderPosition, Question,
+    QuestionOption,
 )
+from pretix.celery_app import app
+
+from ..signals import periodic_task
+
+COUNTER_REBUILD_INTERVAL = 3600
 
 
 class CheckInError(Exception):
@@ -145,3 +158,274 @@ def perform_checkin(op: OrderPosition, clist: CheckinList, given_answers: dict,
             'datetime': dt,
             'list': clist.pk
         })
+
+
+def _counted_statuses(clist):
+    return [Order.STATUS_PAID] + ([Order.STATUS_PENDING] if clist.include_pending else [])
+
+
+def _counter_keys(subevent_id, item_id, variation_id):
+    keys = [(subevent_id, None, None), (subevent_id, item_id, None)]
+    if variation_id:
+        keys.append((subevent_id, item_id, variation_id))
+    return keys
+
+
+def _lock_list(list_id: int) -> None:
+    list(CheckinList.objects.select_for_update().filter(pk=list_id).values_list('pk', flat=True))
+
+
+def rebuild_checkin_counters(clist: CheckinList) -> None:
+    """
+    Computes the counters of a check-in list from scratch.
+    """
+    statuses = _counted_statuses(clist)
+    positions = OrderPosition.objects.filter(order__event_id=clist.event_id, order__status__in=statuses)
+    if not clist.all_products:
+        positions = positions.filter(item__in=clist.limit_products.values_list('id', flat=True))
+    checkins = Checkin.objects.filter(list=clist, position__order__status__in=statuses)
+
+    with transaction.atomic():
+        _lock_list(clist.pk)
+        values = Counter()
+        for p in positions.order_by().values('subevent', 'item', 'variation').annotate(c=Count('id')):
+            for key in _counter_keys(p['subevent'], p['item'], p['variation']):
+                values[('position_count',) + key] += p['c']
+        for c in checkins.order_by().values(
+                'position__subevent', 'position__item', 'position__variation'
+        ).annotate(c=Count('id')):
+            for key in _counter_keys(c['position__subevent'], c['position__item'], c['position__variation']):
+                values[('checkin_count',) + key] += c['c']
+
+        t = now()
+        # The row without date, product and variation is always created, it marks the list as counted
+        counters = {(None, None, None): CheckinListCounter(checkin_list=clist, rebuilt=t)}
+        for (field, subevent_id, item_id, variation_id), value in values.items():
+            key = (subevent_id, item_id, variation_id)
+            if key not in counters:
+                counters[key] = CheckinListCounter(
+                    checkin_list=clist, subevent_id=subevent_id, item_id=item_id, variation_id=variation_id,
+                    rebuilt=t
+                )
+            setattr(counters[key], field, value)
+
+        clist.counters.all().delete()
+        CheckinListCounter.objects.bulk_create(counters.values())
+
+
+def get_checkin_counters(clist: CheckinList) -> dict:
+    """
+    Returns the numbers of order positions and check-ins of a check-in list. If the counters of
+    this list are not maintained yet, they are computed now and kept up to date from then on.
+
+    :returns: A dictionary with tuples of ``(subevent_id, item_id, variation_id)`` as keys and
+              tuples of ``(position_count, checkin_count)`` as values. Keys with an ``item_id``
+              of ``None`` contain the totals of a date, keys with a ``variation_id`` of ``None``
+              the totals of a product.
+    """
+    counters = list(clist.counters.all())
+    if not counters:
+        rebuild_checkin_counters(clist)
+        counters = list(clist.counters.all())
+    return {
+        (c.subevent_id, c.item_id, c.variation_id): (c.position_count, c.checkin_count)
+        for c in counters
+    }
+
+
+def apply_checkin_counter_delta(delta: Counter):
+    """
+    Applies changes to the counters of check-in lists.
+
+    :param delta: A counter with tuples of ``(list_id, field, subevent_id, item_id, variation_id)``
+                  as keys and the number the counter field should change by as values.
+    """
+    for (list_id, field, subevent_id, item_id, variation_id), value in delta.items():
+        if not value:
+            continue
+        for s, i, v in _counter_keys(subevent_id, item_id, variation_id):
+            updated = CheckinListCounter.objects.filter(
+                checkin_list_id=list_id, subevent_id=s, item_id=i, variation_id=v
+            ).update(**{field: F(field) + value})
+            if not updated:
+                with transaction.atomic():
+                    # Most keys of a counter are nullable, so a unique constraint can't prevent
+                    # duplicates. Instead, new counters of a list are only created while holding a
+                    # lock on the list and after checking again that nobody else created them.
+                    _lock_list(list_id)
+                    updated = CheckinListCounter.objects.filter(
+                        checkin_list_id=list_id, subevent_id=s, item_id=i, variation_id=v
+                    ).update(**{field: F(field) + value})
+                    if not updated:
+                        CheckinListCounter.objects.create(
+                            checkin_list_id=list_id, subevent_id=s, item_id=i, variation_id=v, **{field: value}
+                        )
+
+
+def _counted_lists(event_id):
+    counted = CheckinListCounter.objects.filter(
+        checkin_list__event_id=event_id, subevent__isnull=True, item__isnull=True, variation__isnull=True
+    ).values_list('checkin_list_id', flat=True)
+    return list(CheckinList.objects.filter(pk__in=counted).prefetch_related('limit_products'))
+
+
+def _counts_position(clist, item_id):
+    return clist.all_products or item_id in {i.pk for i in clist.limit_products.all()}
+
+
+def _position_state(instance):
+    # Read from __dict__ to avoid queries for deferred fields
+    return (
+        instance.__dict__.get('order_id'), instance.__dict__.get('subevent_id'),
+        instance.__dict__.get('item_id'), instance.__dict__.get('variation_id'),
+    )
+
+
+@receiver(post_init, sender=Order, dispatch_uid="checkin_counter_order_init")
+def counter_order_init(sender, instance, **kwargs):
+    instance._checkin_counter_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Order, dispatch_uid="checkin_counter_order_saved")
+def counter_order_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    old_status = instance._checkin_counter_status
+    instance._checkin_counter_status = instance.status
+    if created or old_status is None or old_status == instance.status:
+        return
+
+    delta = Counter()
+    positions = None
+    checkins = None
+    for clist in _counted_lists(instance.event_id):
+        statuses = _counted_statuses(clist)
+        was_counted, is_counted = old_status in statuses, instance.status in statuses
+        if was_counted == is_counted:
+            continue
+        sign = 1 if is_counted else -1
+
+        if positions is None:
+            positions = OrderPosition.objects.filter(order=instance).order_by().values(
+                'subevent', 'item', 'variation'
+            ).annotate(c=Count('id'))
+            checkins = Checkin.objects.filter(position__order=instance).order_by().values(
+                'list', 'position__subevent', 'position__item', 'position__variation'
+            ).annotate(c=Count('id'))
+        for p in positions:
+            if _counts_position(clist, p['item']):
+                delta[(clist.pk, 'position_count', p['subevent'], p['item'], p['variation'])] += sign * p['c']
+        for c in checkins:
+            if c['list'] == clist.pk:
+                delta[(clist.pk, 'checkin_count', c['position__subevent'], c['position__item'],
+                       c['position__variation'])] += sign * c['c']
+    apply_checkin_counter_delta(delta)
+
+
+@receiver(post_init, sender=OrderPosition, dispatch_uid="checkin_counter_position_init")
+def counter_position_init(sender, instance, **kwargs):
+    instance._checkin_counter_state = _position_state(instance)
+
+
+@receiver(post_save, sender=OrderPosition, dispatch_uid="checkin_counter_position_saved")
+def counter_position_saved(sender, instance, created, **kwargs):
+    old_state = instance._checkin_counter_state
+    new_state = instance._checkin_counter_state = _position_state(instance)
+    if old_state == new_state and not created:
+        return
+
+    clists = _counted_lists(instance.order.event_id)
+    if not clists:
+        return
+    if created:
+        old_status = None
+    elif old_state[0] == instance.order_id:
+        old_status = instance.order.status
+    else:
+        old_status = Order.objects.filter(pk=old_state[0]).values_list('status', flat=True).first()
+    checkins = {} if created else {
+        c['list']: c['c']
+        for c in Checkin.objects.filter(position=instance).order_by().values('list').annotate(c=Count('id'))
+    }
+
+    delta = Counter()
+    for clist in clists:
+        statuses = _counted_statuses(clist)
+        if old_status in statuses:
+            if _counts_position(clist, old_state[2]):
+                delta[(clist.pk, 'position_count') + old_state[1:]] -= 1
+            delta[(clist.pk, 'checkin_count') + old_state[1:]] -= checkins.get(clist.pk, 0)
+        if instance.order.status in statuses:
+            if _counts_position(clist, new_state[2]):
+                delta[(clist.pk, 'position_count') + new_state[1:]] += 1
+            delta[(clist.pk, 'checkin_count') + new_state[1:]] += checkins.get(clist.pk, 0)
+    apply_checkin_counter_delta(delta)
+
+
+@receiver(post_delete, sender=OrderPosition, dispatch_uid="checkin_counter_position_deleted")
+def counter_position_deleted(sender, instance, **kwargs):
+    # Check-ins of the position are deleted before and have already been subtracted
+    state = instance._checkin_counter_state
+    delta = Counter()
+    for clist in _counted_lists(instance.order.event_id):
+        if instance.order.status in _counted_statuses(clist) and _counts_position(clist, state[2]):
+            delta[(clist.pk, 'position_count') + state[1:]] -= 1
+    apply_checkin_counter_delta(delta)
+
+
+def _checkin_delta(instance, position, sign):
+    clist = instance.list
+    if not clist.counters.filter(subevent__isnull=True, item__isnull=True, variation__isnull=True).exists():
+        return
+    if position.order.status in _counted_statuses(clist):
+        apply_checkin_counter_delta(Counter({
+            (clist.pk, 'checkin_count', position.subevent_id, position.item_id, position.variation_id): sign
+        }))
+
+
+@receiver(post_save, sender=Checkin, dispatch_uid="checkin_counter_checkin_saved")
+def counter_checkin_saved(sender, instance, created, **kwargs):
+    if created:
+        _checkin_delta(instance, instance.position, 1)
+
+
+@receiver(pre_delete, sender=Checkin, dispatch_uid="checkin_counter_checkin_deleting")
+def counter_checkin_deleting(sender, instance, **kwargs):
+    # The position might be deleted along with the check-in, so we need to look at it now
+    _checkin_delta(instance, instance.position, -1)
+
+
+@receiver(post_save, sender=CheckinList, dispatch_uid="checkin_counter_list_saved")
+def counter_list_saved(sender, instance, created, **kwargs):
+    # The settings of the list might have changed which positions count. We drop the counters and
+    # they will be computed again on next use.
+    if not created:
+        instance.counters.all().delete()
+
+
+@receiver(m2m_changed, sender=CheckinList.limit_products.through, dispatch_uid="checkin_counter_products_changed")
+def counter_list_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        instance.counters.all().delete()
+    elif action == 'pre_clear':
+        CheckinListCounter.objects.filter(checkin_list__in=instance.checkinlist_set.all()).delete()
+    else:
+        CheckinListCounter.objects.filter(checkin_list_id__in=pk_set).delete()
+
+
+@receiver(signal=periodic_task)
+def rebuild_all_checkin_counters(sender, **kwargs):
+    rebuild_stale_checkin_counters.apply_async()
+
+
+@app.task
+def rebuild_stale_checkin_counters(max_age: int=COUNTER_REBUILD_INTERVAL):
+    # Counters can drift if they change while they are computed, so we compute them again every now and then
+    lists = CheckinList.objects.filter(
+        counters__subevent__isnull=True, counters__item__isnull=True, counters__variation__isnull=True,
+        counters__rebuilt__lt=now() - timedelta(seconds=max_age)
+    )
+    for clist in lists:
+        rebuild_checkin_counters(clist)
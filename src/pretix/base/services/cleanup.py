@@ -3,9 +3,14 @@ from datetime import timedelta
 from django.dispatch import receiver
 from django.utils.timezone import now
 
-from ..models import CachedFile, CartPosition, InvoiceAddress
+from ..models import (
+    CachedFile, CartPosition, InvoiceAddress, RevokedTicketSecret,
+)
 from ..signals import periodic_task
 
+# Check-in devices that did not synchronize for longer than this need to download all tickets again
+REVOKED_SECRET_RETENTION = timedelta(days=30)
+
 
 @receiver(signal=periodic_task)
 def clean_cart_positions(sender, **kwargs):
@@ -19,3 +24,8 @@ def clean_cart_positions(sender, **kwargs):
 def clean_cached_files(sender, **kwargs):
     for cf in CachedFile.objects.filter(expires__isnull=False, expires__lt=now()):
         cf.delete()
+
+
+@receiver(signal=periodic_task)
+def clean_revoked_secrets(sender, **kwargs):
+    RevokedTicketSecret.objects.filter(created__lt=now() - REVOKED_SECRET_RETENTION).delete()
@@ -1,7 +1,12 @@
-from typing import Any, Dict
+import tempfile
+from datetime import timedelta
+from typing import Any, Dict, List
 
-from django.core.files.base import ContentFile
-from django.utils.timezone import override
+from celery import chord
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.utils.timezone import now, override
 
 from pretix.base.i18n import language
 from pretix.base.models import CachedFile, Event, cachedfile_name
@@ -10,16 +15,82 @@ from pretix.base.signals import register_data_exporters
 from pretix.celery_app import app
 
 
-@app.task(base=ProfiledTask)
-def export(event: str, fileid: str, provider: str, form_data: Dict[str, Any]) -> None:
+def _get_exporter(event: Event, provider: str):
+    responses = register_data_exporters.send(event)
+    for receiver, response in responses:
+        ex = response(event)
+        if ex.identifier == provider:
+            return ex
+
+
+def _save_chunks(file: CachedFile, chunks) -> None:
+    with tempfile.TemporaryFile() as f:
+        for chunk in chunks:
+            f.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        f.seek(0)
+        file.file.save(cachedfile_name(file, file.filename), File(f))
+    file.save()
+
+
+@app.task(base=ProfiledTask, bind=True)
+def export(self, event: str, fileid: str, provider: str, form_data: Dict[str, Any]) -> None:
     event = Event.objects.get(id=event)
     file = CachedFile.objects.get(id=fileid)
     with language(event.settings.locale), override(event.settings.timezone):
-        responses = register_data_exporters.send(event)
-        for receiver, response in responses:
-            ex = response(event)
-            if ex.identifier == provider:
-                file.filename, file.type, data = ex.render(form_data)
-                file.file.save(cachedfile_name(file, file.filename), ContentFile(data))
-                file.save()
+        ex = _get_exporter(event, provider)
+        if ex:
+            # Sharding only makes sense if there are workers to run the shards in parallel
+            shards = ex.get_shards(form_data) if settings.HAS_CELERY else None
+            if shards:
+                # The merge task inherits our task ID, so whoever waits for this task will
+                # receive the result of the merge.
+                raise self.replace(chord(
+                    [
+                        export_shard.s(event.pk, provider, form_data, shard, self.request.id, len(shards))
+                        for shard in shards
+                    ],
+                    export_merge.s(event.pk, fileid, provider, form_data)
+                ))
+
+            file.filename, file.type, chunks = ex.render_stream(form_data)
+            _save_chunks(file, chunks)
     return file.pk
+
+
+@app.task(base=ProfiledTask, bind=True)
+def export_shard(self, event: int, provider: str, form_data: Dict[str, Any], shard: Any, export_id: str,
+                 total: int) -> str:
+    event = Event.objects.get(id=event)
+    file = CachedFile(expires=now() + timedelta(days=1), date=now())
+    with language(event.settings.locale), override(event.settings.timezone):
+        ex = _get_exporter(event, provider)
+        file.filename = 'shard'
+        file.type = 'application/octet-stream'
+        _save_chunks(file, ex.render_shard(form_data, shard))
+
+    # Report progress on the task that the user is waiting for
+    key = 'pretix_export_shards_done_{}'.format(export_id)
+    cache.add(key, 0, 3600)
+    done = cache.incr(key)
+    self.backend.store_result(export_id, {'value': round(done / total * 100)}, 'PROGRESS')
+    return str(file.pk)
+
+
+@app.task(base=ProfiledTask)
+def export_merge(shard_ids: List[str], event: int, fileid: str, provider: str, form_data: Dict[str, Any]) -> str:
+    event = Event.objects.get(id=event)
+    file = CachedFile.objects.get(id=fileid)
+    shard_files = [CachedFile.objects.get(id=i) for i in shard_ids]
+    with language(event.settings.locale), override(event.settings.timezone):
+        ex = _get_exporter(event, provider)
+        for f in shard_files:
+            f.file.open('rb')
+        try:
+            file.filename, file.type, chunks = ex.merge_shards(form_data, [f.file for f in shard_files])
+            _save_chunks(file, chunks)
+        finally:
+            for f in shard_files:
+                f.file.close()
+    for f in shard_files:
+        f.delete()
+    return str(file.pk)
@@ -7,22 +7,49 @@ from django.conf import settings
 from django.db import transaction
 from django.utils.timezone import now
 
-from pretix.base.models import EventLock
+from pretix.base.metrics import (
+    pretix_lock_hold_seconds, pretix_lock_timeouts_total,
+    pretix_lock_wait_seconds,
+)
+from pretix.base.models import EventLock, Quota
 
 logger = logging.getLogger('pretix.base.locking')
 LOCK_TIMEOUT = 120
 
 
 class LockManager:
-    def __init__(self, event):
+    """
+    Context manager that locks an event for bookings. If the quotas affected by an operation
+    are given and quota-level locking is enabled, only those quotas and vouchers are locked
+    instead of the whole event, which allows operations on disjoint products to run in parallel.
+
+    All parameters are only evaluated if quota-level locking is enabled, so you can pass
+    lazy querysets without any cost in the default configuration.
+
+    :param quotas: An iterable of the :py:class:`Quota` objects affected by the operation
+    :param vouchers: An iterable of the :py:class:`Voucher` objects affected by the operation
+    :param positions: An iterable of cart or order positions affected by the operation. Their quotas
+                      and vouchers will be locked as well.
+    """
+
+    def __init__(self, event, quotas=None, vouchers=None, positions=None):
         self.event = event
+        self.quotas = quotas
+        self.vouchers = vouchers
+        self.positions = positions
+        self.keys = []
 
     def __enter__(self):
-        lock_event(self.event)
+        keys = None
+        if settings.PRETIX_QUOTA_LOCKING and (self.quotas is not None or self.positions is not None):
+            keys = quota_lock_keys(self.quotas or (), self.vouchers or (), self.positions or ())
+        if not keys:
+            keys = event_lock_keys(self.event)
+        self.keys = acquire_locks(self.event, keys)
         return now()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        release_event(self.event)
+        release_locks(self.event, self.keys)
         if exc_type is not None:
             return False
 
@@ -35,6 +62,128 @@ class LockReleaseException(Exception):
     pass
 
 
+def event_lock_keys(event):
+    """
+    Returns the keys that need to be locked to lock a whole event. If quota-level locking is
+    enabled, this includes all quotas of the event, so locking a whole event is mutually
+    exclusive with locking any of its quotas.
+    """
+    keys = [('event', event.pk)]
+    if settings.PRETIX_QUOTA_LOCKING:
+        keys += [('quota', pk) for pk in event.quotas.values_list('pk', flat=True)]
+    return keys
+
+
+def quota_lock_keys(quotas, vouchers=(), positions=()):
+    """
+    Returns the keys that need to be locked to lock the given quotas and vouchers as well as the
+    quotas and vouchers of the given positions. If this does not include any quotas, an empty
+    list is returned and the caller should lock the whole event instead.
+    """
+    positions = list(positions)
+    keys = [('quota', q.pk) for q in quotas]
+    keys += [('quota', q.pk) for q in Quota.objects.for_positions(positions)]
+    if not keys:
+        return []
+    keys += [('voucher', v.pk) for v in vouchers]
+    keys += [('voucher', p.voucher_id) for p in positions if p.voucher_id]
+    return keys
+
+
+def acquire_locks(event, keys):
+    """
+    Acquires all given lock keys that are not yet held through this python representation
+    of the event. Keys are always acquired in sorted order to prevent deadlocks between
+    concurrent operations. If one of the keys can not be obtained, all keys acquired by
+    this call are released again.
+
+    If ``PRETIX_LOCK_WAIT`` is set, we wait for up to this many seconds for every key
+    instead of giving up after a few short retries.
+
+    :returns: The list of keys that have been acquired by this call
+    :raises LockTimeoutException: if one of the keys is locked every time we try to obtain it
+    """
+    if not hasattr(event, '_locks'):
+        event._locks = {}
+        event._lock_times = {}
+
+    acquired = []
+    t0 = time.perf_counter()
+    try:
+        for key in sorted(set(keys)):
+            if key in event._locks:
+                continue
+            if settings.HAS_REDIS:
+                event._locks[key] = lock_key_redis(key)
+            else:
+                event._locks[key] = lock_key_db(key)
+            event._lock_times[key] = time.perf_counter()
+            acquired.append(key)
+    except LockTimeoutException:
+        release_locks(event, acquired)
+        if settings.METRICS_ENABLED:
+            pretix_lock_timeouts_total.inc(event=_metric_label(event))
+        raise
+
+    if settings.METRICS_ENABLED and acquired:
+        pretix_lock_wait_seconds.observe(time.perf_counter() - t0, event=_metric_label(event))
+    return acquired
+
+
+def release_locks(event, keys):
+    """
+    Releases the given lock keys held through this python representation of the event.
+
+    :raises LockReleaseException: if we do not own one of the locks any more
+    """
+    error = None
+    acquired_at = None
+    for key in reversed(keys):
+        lock = getattr(event, '_locks', {}).pop(key, None)
+        t = event._lock_times.pop(key, None) if lock is not None else None
+        if t is not None and (acquired_at is None or t < acquired_at):
+            acquired_at = t
+        if lock is None:
+            error = LockReleaseException('Lock is not owned by this thread')
+            continue
+        try:
+            if settings.HAS_REDIS:
+                release_key_redis(lock)
+            else:
+                release_key_db(lock)
+        except (LockReleaseException, LockTimeoutException) as e:
+            error = e
+    if settings.METRICS_ENABLED and acquired_at is not None:
+        pretix_lock_hold_seconds.observe(time.perf_counter() - acquired_at, event=_metric_label(event))
+    if error:
+        raise error
+
+
+def _metric_label(event):
+    return '{}/{}'.format(event.organizer.slug, event.slug)
+
+
+def _retry_delays():
+    """
+    Yields the time to sleep between two attempts to obtain a lock. Without ``PRETIX_LOCK_WAIT``,
+    these are five exponentially growing delays adding up to roughly 300ms. Otherwise, the delays
+    keep growing up to half a second until the configured waiting time is used up.
+    """
+    if not settings.PRETIX_LOCK_WAIT:
+        for i in range(5):
+            yield 2 ** i / 100
+        return
+
+    deadline = time.perf_counter() + settings.PRETIX_LOCK_WAIT
+    i = 0
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        yield min(2 ** i / 100, .5, remaining)
+        i += 1
+
+
 def lock_event(event):
     """
     Issue a lock on this event so nobody can book tickets for this event until
@@ -43,13 +192,11 @@ def lock_event(event):
     :raises LockTimeoutException: if the event is locked every time we try
                                   to obtain the lock
     """
-    if hasattr(event, '_lock') and event._lock:
+    if ('event', event.pk) in getattr(event, '_locks', {}):
         return True
 
-    if settings.HAS_REDIS:
-        return lock_event_redis(event)
-    else:
-        return lock_event_db(event)
+    acquire_locks(event, event_lock_keys(event))
+    return True
 
 
 def release_event(event):
@@ -60,79 +207,103 @@ def release_event(event):
 
     :raises LockReleaseException: if we do not own the lock
     """
-    if not hasattr(event, '_lock') or not event._lock:
+    if ('event', event.pk) not in getattr(event, '_locks', {}):
         raise LockReleaseException('Lock is not owned by this thread')
-    if settings.HAS_REDIS:
-        return release_event_redis(event)
-    else:
-        return release_event_db(event)
-
-
-def lock_event_db(event):
-    retries = 5
-    for i in range(retries):
-        with transaction.atomic():
-            dt = now()
-            l, created = EventLock.objects.get_or_create(event=event.id)
-            if created:
-                event._lock = l
-                return True
-            elif l.date < now() - timedelta(seconds=LOCK_TIMEOUT):
-                newtoken = str(uuid.uuid4())
-                updated = EventLock.objects.filter(event=event.id, token=l.token).update(date=dt, token=newtoken)
-                if updated:
-                    l.token = newtoken
-                    event._lock = l
-                    return True
-        time.sleep(2 ** i / 100)
+    release_locks(event, list(event._locks))
+
+
+def _try_lock_key_db(name):
+    with transaction.atomic():
+        dt = now()
+        l, created = EventLock.objects.get_or_create(event=name)
+        if created:
+            return l
+        elif l.date < now() - timedelta(seconds=LOCK_TIMEOUT):
+            newtoken = str(uuid.uuid4())
+            updated = EventLock.objects.filter(event=name, token=l.token).update(date=dt, token=newtoken)
+            if updated:
+                l.token = newtoken
+                return l
+
+
+def lock_key_db(key):
+    # The database offers us no way to be notified of a released lock, so even when
+    # waiting is enabled, we can only poll.
+    name = str(key[1]) if key[0] == 'event' else '{}-{}'.format(*key)
+    for delay in _retry_delays():
+        lock = _try_lock_key_db(name)
+        if lock:
+            return lock
+        time.sleep(delay)
     raise LockTimeoutException()
 
 
 @transaction.atomic
-def release_event_db(event):
-    if not hasattr(event, '_lock') or not event._lock:
-        raise LockReleaseException('Lock is not owned by this thread')
+def release_key_db(lock):
     try:
-        lock = EventLock.objects.get(event=event.id, token=event._lock.token)
+        lock = EventLock.objects.get(event=lock.event, token=lock.token)
         lock.delete()
-        event._lock = None
     except EventLock.DoesNotExist:
         raise LockReleaseException('Lock is no longer owned by this thread')
 
 
-def redis_lock_from_event(event):
+def redis_lock_from_key(key):
     from django_redis import get_redis_connection
     from redis.lock import Lock
 
-    if not hasattr(event, '_lock') or not event._lock:
-        rc = get_redis_connection("redis")
-        event._lock = Lock(redis=rc, name='pretix_event_%s' % event.id, timeout=LOCK_TIMEOUT)
-    return event._lock
+    rc = get_redis_connection("redis")
+    return Lock(redis=rc, name='pretix_{}_{}'.format(*key), timeout=LOCK_TIMEOUT)
+
 
+def _redis_wakeup_name(lock):
+    return '{}_released'.format(lock.name)
 
-def lock_event_redis(event):
+
+def lock_key_redis(key):
     from redis.exceptions import RedisError
 
-    lock = redis_lock_from_event(event)
-    retries = 5
-    for i in range(retries):
-        try:
-            if lock.acquire(False):
-                return True
-        except RedisError:
-            logger.exception('Error locking an event')
+    lock = redis_lock_from_key(key)
+    try:
+        if lock.acquire(False):
+            return lock
+        if not settings.PRETIX_LOCK_WAIT:
+            for i in range(4):
+                time.sleep(2 ** i / 100)
+                if lock.acquire(False):
+                    return lock
             raise LockTimeoutException()
-        time.sleep(2 ** i / 100)
-    raise LockTimeoutException()
+
+        # Every release pushes a token to a wake-up list, so instead of sleeping for a fixed
+        # time, we block on that list until the lock is free again. We still check again at
+        # least once per second in case the holder crashed and the lock expired instead.
+        deadline = time.perf_counter() + settings.PRETIX_LOCK_WAIT
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise LockTimeoutException()
+            if remaining >= 1:
+                lock.redis.blpop(_redis_wakeup_name(lock), timeout=1)
+            else:
+                time.sleep(remaining)
+            if lock.acquire(False):
+                return lock
+    except RedisError:
+        logger.exception('Error locking an event')
+        raise LockTimeoutException()
 
 
-def release_event_redis(event):
+def release_key_redis(lock):
     from redis import RedisError
 
-    lock = redis_lock_from_event(event)
     try:
         lock.release()
+        if settings.PRETIX_LOCK_WAIT:
+            wakeup = _redis_wakeup_name(lock)
+            pipe = lock.redis.pipeline()
+            pipe.rpush(wakeup, 1)
+            pipe.ltrim(wakeup, 0, 0)
+            pipe.expire(wakeup, LOCK_TIMEOUT)
+            pipe.execute()
     except RedisError:
         logger.exception('Error releasing an event lock')
         raise LockTimeoutException()
-    event._lock = None
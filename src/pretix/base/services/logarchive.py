@@ -0,0 +1,210 @@
+from datetime import timedelta
+from typing import List
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import DateTimeField, Exists, Max, OuterRef, Q, Sum
+from django.db.models.functions import Coalesce
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from django.utils.timezone import now
+
+from pretix.base.models import (
+    Event, LogEntry, LogEntryArchive, LogEntryArchiveSummary,
+)
+from pretix.base.services.async import ProfiledTask
+from pretix.base.signals import periodic_task
+from pretix.celery_app import app
+
+# Number of log entries that are compressed into one archive row
+ARCHIVE_CHUNK_SIZE = 1000
+
+
+def archive_logentries(event: Event, before=None) -> int:
+    """
+    Moves all log entries of the event that were created before the given time into compressed
+    archive rows. Archived log entries are still shown in the backend, but they are no longer part
+    of the ``LogEntry`` table.
+
+    :returns: The number of archived log entries
+    """
+    before = before or now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            entries = list(
+                LogEntry.all.filter(event=event, datetime__lt=before).order_by('datetime', 'pk')[:ARCHIVE_CHUNK_SIZE]
+            )
+            if not entries:
+                return total
+            archive = LogEntryArchive.objects.create(
+                event=event,
+                first_datetime=entries[0].datetime,
+                last_datetime=entries[-1].datetime,
+                count=len(entries),
+                data=LogEntryArchive.pack(entries),
+            )
+            LogEntryArchiveSummary.objects.bulk_create(LogEntryArchiveSummary.summarize(archive, entries))
+            LogEntry.all.filter(pk__in=[le.pk for le in entries]).delete()
+        total += len(entries)
+
+
+def restore_logentries(event: Event) -> int:
+    """
+    Moves all archived log entries of the event back into the ``LogEntry`` table, e.g. because
+    they need to be modified.
+
+    :returns: The number of restored log entries
+    """
+    total = 0
+    for archive in event.logentry_archives.order_by('pk'):
+        with transaction.atomic():
+            entries = archive.entries()
+            for le in entries:
+                # raw=True stores all values as they are, like loading a fixture
+                le.save_base(raw=True, force_insert=True)
+            archive.delete()
+        total += len(entries)
+    return total
+
+
+class ArchivedLogEntries:
+    """
+    The visible archived log entries of an event, newest first, optionally only the ones attached
+    to ``obj`` and matching the ``Q`` object ``q``. The filter may refer to the fields
+    ``content_type``, ``object_id``, ``action_type`` and ``user`` of :py:class:`LogEntry`. It is
+    applied to the summaries of the archive chunks in the database, so the log entries can be
+    counted without decompressing any chunk, and slicing only decompresses the chunks within
+    the slice.
+    """
+
+    def __init__(self, event: Event, q: Q=None, obj=None):
+        self.event = event
+        self.summaries = LogEntryArchiveSummary.objects.filter(archive__event=event, visible=True)
+        if obj is not None:
+            self.summaries = self.summaries.filter(
+                content_type=ContentType.objects.get_for_model(type(obj)), object_id=obj.pk
+            )
+        if q is not None:
+            self.summaries = self.summaries.filter(q)
+
+    @cached_property
+    def counts(self) -> list:
+        # All archived log entries of a chunk are older than the ones of the chunks archived later
+        if not self.event or not self.event.pk:
+            return []
+        return list(self.summaries.order_by().values('archive').annotate(
+            c=Sum('count')
+        ).order_by('-archive__last_datetime', '-archive').values_list('archive', 'c'))
+
+    def count(self) -> int:
+        return sum(c for archive, c in self.counts)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            return self[k:k + 1][0] if k >= 0 else self[:][k]
+        start, stop, step = k.indices(self.count())
+        result = []
+        offset = 0
+        for archive, c in self.counts:
+            if offset >= stop:
+                break
+            if offset + c > start:
+                result += self._entries(archive)[max(start - offset, 0):stop - offset]
+            offset += c
+        return result[::step]
+
+    def _entries(self, archive: int) -> List[LogEntry]:
+        keys = set(self.summaries.filter(archive=archive).values_list(*LogEntryArchiveSummary.KEY_FIELDS))
+        result = []
+        for le in LogEntryArchive.objects.get(pk=archive).entries():
+            if LogEntryArchiveSummary.key(le) in keys:
+                le.event = self.event
+                result.append(le)
+        result.sort(key=lambda le: (le.datetime, le.pk), reverse=True)
+        return result
+
+
+class LogEntryList:
+    """
+    The log entries of a queryset followed by archived log entries, which can be passed to a
+    paginator. The archive is only read for pages that reach past the end of the queryset.
+
+    :param qs: A queryset of log entries of an event
+    :param archived: The :py:class:`ArchivedLogEntries` of the same event, usually with the same filter
+    """
+
+    def __init__(self, qs, archived: ArchivedLogEntries):
+        self.qs = qs
+        self.archived = archived
+
+    @cached_property
+    def live_count(self) -> int:
+        return self.qs.count()
+
+    def count(self) -> int:
+        return self.live_count + self.archived.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            return self[k:k + 1][0] if k >= 0 else self[:][k]
+        start, stop, step = k.indices(self.count())
+        result = list(self.qs[start:stop]) if start < self.live_count else []
+        if stop > self.live_count:
+            result += self.archived[max(start - self.live_count, 0):stop - self.live_count]
+        return result[::step]
+
+
+def archived_logentries(event: Event, obj=None) -> List[LogEntry]:
+    """
+    Returns the visible archived log entries of an event, newest first. If ``obj`` is given, only
+    the log entries attached to this object are returned and only the archive chunks containing
+    them are read. All archived log entries are older than the log entries of the event that are
+    still in the ``LogEntry`` table, so you can append the result to a list of those without
+    sorting them again.
+    """
+    return list(ArchivedLogEntries(event, obj=obj))
+
+
+def archivable_events(days: int):
+    """
+    Returns all events that ended more than ``days`` days ago and still have log entries
+    from before that time in the ``LogEntry`` table.
+    """
+    cutoff = now() - timedelta(days=days)
+    ended = Event.objects.annotate(
+        last_date=Coalesce(
+            Max(Coalesce('subevents__date_to', 'subevents__date_from')), 'date_to', 'date_from',
+            output_field=DateTimeField()
+        )
+    ).filter(last_date__lt=cutoff).values('pk')
+    return Event.objects.annotate(
+        has_logs=Exists(LogEntry.all.filter(event=OuterRef('pk'), datetime__lt=cutoff))
+    ).filter(pk__in=ended, has_logs=True)
+
+
+@receiver(signal=periodic_task)
+def archive_old_logentries(sender, **kwargs):
+    if not settings.PRETIX_LOG_ARCHIVE_AFTER:
+        return
+    for event in archivable_events(settings.PRETIX_LOG_ARCHIVE_AFTER):
+        archive_event_logentries.apply_async(args=(event.pk,))
+
+
+@app.task(base=ProfiledTask)
+def archive_event_logentries(event: int):
+    event = Event.objects.get(pk=event)
+    archive_logentries(event, now() - timedelta(days=settings.PRETIX_LOG_ARCHIVE_AFTER))
@@ -1,6 +1,12 @@
 import logging
+import re
+import smtplib
+import threading
+import time
+from collections import OrderedDict
 from email.utils import formataddr
-from typing import Any, Dict, List, Union
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple, Union
 
 import bleach
 import cssutils
@@ -9,9 +15,15 @@ from celery import chain
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import get_template
+from django.utils import translation
+from django.utils.formats import date_format
+from django.utils.html import escape
+from django.utils.timezone import localtime
 from django.utils.translation import ugettext as _
 from i18nfield.strings import LazyI18nString
+from inlinestyler.cssselect import CSSSelector, ExpressionError
 from inlinestyler.utils import inline_css
+from lxml import etree
 
 from pretix.base.i18n import language
 from pretix.base.models import Event, Invoice, InvoiceAddress, Order
@@ -23,8 +35,18 @@ from pretix.multidomain.urlreverse import build_absolute_uri
 
 logger = logging.getLogger('pretix.base.mail')
 INVALID_ADDRESS = 'invalid-pretix-mail-address'
+MAIL_RETRIES = 2
+MAIL_RETRY_DELAY = 5
+SKELETON_CACHE_SIZE = 64
+PLACEHOLDER_BODY = 'pretix-placeholder-body'
+PLACEHOLDER_ORDER_CODE = 'pretix-placeholder-order-code'
+PLACEHOLDER_ORDER_DATE = 'pretix-placeholder-order-date'
+PLACEHOLDER_ORDER_URL = 'pretix-placeholder-order-url'
 cssutils.log.setLevel(logging.CRITICAL)
 
+_skeletons = OrderedDict()
+_skeleton_lock = threading.Lock()
+
 
 class TolerantDict(dict):
 
@@ -74,91 +96,12 @@ def mail(email: str, subject: str, template: Union[str, LazyI18nString],
     if email == INVALID_ADDRESS:
         return
 
-    headers = headers or {}
-
     with language(locale):
-        if isinstance(context, dict) and order:
-            try:
-                context.update({
-                    'invoice_name': order.invoice_address.name,
-                    'invoice_company': order.invoice_address.company
-                })
-            except InvoiceAddress.DoesNotExist:
-                context.update({
-                    'invoice_name': '',
-                    'invoice_company': ''
-                })
-        body, body_md = render_mail(template, context)
-        subject = str(subject).format_map(context)
-        sender = sender or (event.settings.get('mail_from') if event else settings.MAIL_FROM)
-        if event:
-            sender = formataddr((str(event.name), sender))
-        else:
-            sender = formataddr((settings.PRETIX_INSTANCE_NAME, sender))
-
-        subject = str(subject)
-        body_plain = body
-
-        htmlctx = {
-            'site': settings.PRETIX_INSTANCE_NAME,
-            'site_url': settings.SITE_URL,
-            'body': body_md,
-            'color': '#8E44B3'
-        }
-
-        if event:
-            htmlctx['event'] = event
-            htmlctx['color'] = event.settings.primary_color
-
-            if event.settings.mail_from == settings.DEFAULT_FROM_EMAIL and event.settings.contact_mail and not headers.get('Reply-To'):
-                headers['Reply-To'] = event.settings.contact_mail
-
-            prefix = event.settings.get('mail_prefix')
-            if prefix:
-                subject = "[%s] %s" % (prefix, subject)
-
-            body_plain += "\r\n\r\n-- \r\n"
-
-            signature = str(event.settings.get('mail_text_signature'))
-            if signature:
-                signature = signature.format(event=event.name)
-                signature_md = signature.replace('\n', '<br>\n')
-                signature_md = bleach.linkify(bleach.clean(markdown.markdown(signature_md), tags=bleach.ALLOWED_TAGS + ['p', 'br']))
-                htmlctx['signature'] = signature_md
-                body_plain += signature
-                body_plain += "\r\n\r\n-- \r\n"
-
-            if order:
-                body_plain += _(
-                    "You are receiving this email because you placed an order for {event}."
-                ).format(event=event.name)
-                htmlctx['order'] = order
-                body_plain += "\r\n"
-                body_plain += _(
-                    "You can view your order details at the following URL:\n{orderurl}."
-                ).replace("\n", "\r\n").format(
-                    event=event.name, orderurl=build_absolute_uri(
-                        order.event, 'presale:event.order', kwargs={
-                            'order': order.code,
-                            'secret': order.secret
-                        }
-                    )
-                )
-            body_plain += "\r\n"
-
-        tpl = get_template('pretixbase/email/plainwrapper.html')
-        body_html = tpl.render(htmlctx)
+        message = render_message(email, subject, template, context, event, order, headers, sender)
 
         send_task = mail_send_task.si(
-            to=[email],
-            subject=subject,
-            body=body_plain,
-            html=body_html,
-            sender=sender,
-            event=event.id if event else None,
-            headers=headers,
             invoices=[i.pk for i in invoices] if invoices else [],
-            order=order.pk if order else None
+            **message
         )
 
         if invoices:
@@ -170,13 +113,232 @@ def mail(email: str, subject: str, template: Union[str, LazyI18nString],
         chain(*task_chain).apply_async()
 
 
-@app.task
-def mail_send_task(*args, to: List[str], subject: str, body: str, html: str, sender: str,
-                   event: int=None, headers: dict=None, bcc: List[str]=None, invoices: List[int]=None,
-                   order: int=None) -> bool:
+def _static_parts(event: Event, sender: str, headers: dict) -> dict:
+    """
+    Renders the parts of an email that only depend on the event and the active language.
+    """
+    sender = sender or (event.settings.get('mail_from') if event else settings.MAIL_FROM)
+    if event:
+        sender = formataddr((str(event.name), sender))
+    else:
+        sender = formataddr((settings.PRETIX_INSTANCE_NAME, sender))
+
+    parts = {
+        'sender': sender,
+        'reply_to': None,
+        'prefix': None,
+        'signature': None,
+        'signature_md': None,
+        'color': '#8E44B3',
+        'event_url': None,
+    }
+    if event:
+        parts['color'] = event.settings.primary_color
+        parts['event_url'] = build_absolute_uri(event, 'presale:event.index')
+        if event.settings.mail_from == settings.DEFAULT_FROM_EMAIL and event.settings.contact_mail and not headers.get('Reply-To'):
+            parts['reply_to'] = event.settings.contact_mail
+        parts['prefix'] = event.settings.get('mail_prefix')
+
+        signature = str(event.settings.get('mail_text_signature'))
+        if signature:
+            parts['signature'] = signature.format(event=event.name)
+            signature_md = parts['signature'].replace('\n', '<br>\n')
+            parts['signature_md'] = bleach.linkify(bleach.clean(markdown.markdown(signature_md), tags=bleach.ALLOWED_TAGS + ['p', 'br']))
+    return parts
+
+
+def render_message(email: str, subject: str, template: Union[str, LazyI18nString],
+                   context: Dict[str, Any]=None, event: Event=None, order: Order=None,
+                   headers: dict=None, sender: str=None, static_cache: dict=None) -> dict:
+    """
+    Renders an email in the currently active language. The arguments are the same as for
+    :py:func:`mail`.
+
+    :param static_cache: If you render many emails for the same event, you can pass the same
+        dictionary every time. The parts of the email that do not depend on the recipient will
+        then only be rendered once per language.
+    :returns: A dictionary of keyword arguments for :py:func:`mail_send_task`
+    """
+    headers = dict(headers or {})
+
+    if isinstance(context, dict) and order:
+        try:
+            context.update({
+                'invoice_name': order.invoice_address.name,
+                'invoice_company': order.invoice_address.company
+            })
+        except InvoiceAddress.DoesNotExist:
+            context.update({
+                'invoice_name': '',
+                'invoice_company': ''
+            })
+    body, body_md = render_mail(template, context)
+    subject = str(subject).format_map(context)
+
+    if static_cache is not None:
+        key = (translation.get_language(), sender, bool(headers.get('Reply-To')))
+        if key not in static_cache:
+            static_cache[key] = _static_parts(event, sender, headers)
+        static = static_cache[key]
+    else:
+        static = _static_parts(event, sender, headers)
+
+    subject = str(subject)
+    body_plain = body
+
+    if event:
+        if static['reply_to']:
+            headers['Reply-To'] = static['reply_to']
+
+        if static['prefix']:
+            subject = "[%s] %s" % (static['prefix'], subject)
+
+        body_plain += "\r\n\r\n-- \r\n"
+
+        if static['signature']:
+            body_plain += static['signature']
+            body_plain += "\r\n\r\n-- \r\n"
+
+        if order:
+            orderurl = build_absolute_uri(
+                order.event, 'presale:event.order', kwargs={
+                    'order': order.code,
+                    'secret': order.secret
+                }
+            )
+            body_plain += _(
+                "You are receiving this email because you placed an order for {event}."
+            ).format(event=event.name)
+            body_plain += "\r\n"
+            body_plain += _(
+                "You can view your order details at the following URL:\n{orderurl}."
+            ).replace("\n", "\r\n").format(
+                event=event.name, orderurl=orderurl
+            )
+        body_plain += "\r\n"
+
+    skeleton, css, wrapper = _get_skeleton(event, static, bool(event and order))
+    body_html = skeleton.replace(PLACEHOLDER_BODY, _inline_fragment(body_md, css, wrapper))
+    if event and order:
+        body_html = body_html.replace(PLACEHOLDER_ORDER_CODE, escape(order.code)).replace(
+            PLACEHOLDER_ORDER_DATE, escape(date_format(localtime(order.datetime), 'SHORT_DATE_FORMAT'))
+        ).replace(PLACEHOLDER_ORDER_URL, escape(orderurl))
+
+    return {
+        'to': [email],
+        'subject': subject,
+        'body': body_plain,
+        'html': body_html,
+        'sender': static['sender'],
+        'event': event.id if event else None,
+        'headers': headers,
+        'order': order.pk if order else None,
+        'inline': False,
+    }
+
+
+def _get_skeleton(event: Event, static: dict, with_order: bool) -> Tuple[str, str, str]:
+    """
+    Returns the HTML wrapper of an email with all CSS already inlined and placeholders in the
+    spots that differ between recipients, as well as the stylesheet of the wrapper and the
+    wrapper before the CSS has been inlined. The result
+    is cached per process for all combinations of settings it depends on, so a change to one
+    of these settings never leads to an outdated wrapper.
+    """
+    key = (
+        translation.get_language(), event.pk if event else None, str(event.name) if event else None,
+        static['event_url'], static['color'], static['signature_md'], with_order
+    )
+    with _skeleton_lock:
+        if key in _skeletons:
+            _skeletons.move_to_end(key)
+            return _skeletons[key]
+
+    htmlctx = {
+        'site': settings.PRETIX_INSTANCE_NAME,
+        'site_url': settings.SITE_URL,
+        'body': PLACEHOLDER_BODY,
+        'color': static['color']
+    }
+    if event:
+        htmlctx['event'] = event
+        htmlctx['signature'] = static['signature_md']
+        if with_order:
+            htmlctx['order'] = True
+            htmlctx['order_code'] = PLACEHOLDER_ORDER_CODE
+            htmlctx['order_date'] = PLACEHOLDER_ORDER_DATE
+            htmlctx['order_url'] = PLACEHOLDER_ORDER_URL
+
+    tpl = get_template('pretixbase/email/plainwrapper.html')
+    html = tpl.render(htmlctx)
+    css = ''.join(re.findall(r'<style[^>]*>(.*?)</style>', html, re.DOTALL))
+    skeleton = (inline_css(html), css, html)
+
+    with _skeleton_lock:
+        _skeletons[key] = skeleton
+        while len(_skeletons) > SKELETON_CACHE_SIZE:
+            _skeletons.popitem(last=False)
+    return skeleton
+
+
+@lru_cache(maxsize=32)
+def _compile_css(css: str) -> list:
+    rules = []
+    for rule in cssutils.parseString(css):
+        if rule.type != rule.STYLE_RULE:
+            continue
+        for selector in rule.selectorList:
+            try:
+                rules.append((CSSSelector(selector.selectorText), selector.specificity, list(rule.style)))
+            except ExpressionError:
+                pass
+    return rules
+
+
+def _inline_fragment(html: str, css: str, wrapper: str) -> str:
+    """
+    Inlines the given stylesheet into an HTML fragment that replaces the body placeholder of the
+    email wrapper. This follows the same rules as ``inline_css`` on the complete email, but only
+    looks at the elements of the fragment and reuses the parsed stylesheet.
+    """
+    document = etree.HTML(wrapper)
+    container = next(e for e in document.iter() if e.text and PLACEHOLDER_BODY in e.text)
+    fragment = etree.HTML('<div>{}</div>'.format(html)).find('.//div')
+    children = list(fragment)
+    container.text = fragment.text
+    for i, child in enumerate(children):
+        container.insert(i, child)
+    content = {element for child in children for element in child.iter()}
+    view = OrderedDict()
+    specificities = {}
+    for selector, specificity, properties in _compile_css(css):
+        for element in selector(document):
+            if element not in content:
+                continue
+            if element not in view:
+                view[element] = cssutils.css.CSSStyleDeclaration(cssText=element.get('style') or '')
+                specificities[element] = {p.name: (1, 0, 0, 0) for p in view[element]}
+            style = view[element]
+            for p in properties:
+                same_priority = p.priority == style.getPropertyPriority(p.name)
+                if (p.name not in specificities[element] or (not same_priority and p.priority)
+                        or (same_priority and specificity >= specificities[element][p.name])):
+                    style.setProperty(p.name, p.value, p.priority)
+                    specificities[element][p.name] = specificity
+
+    for element, style in view.items():
+        element.set('style', style.getCssText(separator=''))
+    return escape(container.text or '') + ''.join(
+        etree.tostring(child, method='html', encoding='unicode') for child in children
+    )
+
+
+def _build_email(event: Event, to: List[str], subject: str, body: str, html: str, sender: str,
+                 headers: dict=None, bcc: List[str]=None, invoices: List[int]=None,
+                 order: Union[int, Order]=None, inline: bool=True) -> EmailMultiAlternatives:
     email = EmailMultiAlternatives(subject, body, sender, to=to, bcc=bcc, headers=headers)
     if html is not None:
-        email.attach_alternative(inline_css(html), "text/html")
+        email.attach_alternative(inline_css(html) if inline else html, "text/html")
     if invoices:
         invoices = Invoice.objects.filter(pk__in=invoices)
         for inv in invoices:
@@ -186,19 +348,28 @@ def mail_send_task(*args, to: List[str], subject: str, body: str, html: str, sen
                     inv.file.file.read(),
                     'application/pdf'
                 )
-    if event:
-        event = Event.objects.get(id=event)
-        backend = event.get_mail_backend()
-    else:
-        backend = get_connection(fail_silently=False)
 
     if event:
-        if order:
+        if order and not isinstance(order, Order):
             try:
                 order = event.orders.get(pk=order)
             except Order.DoesNotExist:
                 order = None
         email = email_filter.send_chained(event, 'message', message=email, order=order)
+    return email
+
+
+@app.task
+def mail_send_task(*args, to: List[str], subject: str, body: str, html: str, sender: str,
+                   event: int=None, headers: dict=None, bcc: List[str]=None, invoices: List[int]=None,
+                   order: int=None, inline: bool=True) -> bool:
+    if event:
+        event = Event.objects.get(id=event)
+        backend = event.get_mail_backend()
+    else:
+        backend = get_connection(fail_silently=False)
+
+    email = _build_email(event, to, subject, body, html, sender, headers, bcc, invoices, order, inline)
 
     try:
         backend.send_messages([email])
@@ -207,6 +378,82 @@ def mail_send_task(*args, to: List[str], subject: str, body: str, html: str, sen
         raise SendMailException('Failed to send an email to {}.'.format(to))
 
 
+def mail_send_batch(event: Event, messages: List[dict], retries: int=MAIL_RETRIES) -> List[int]:
+    """
+    Sends a number of rendered emails over a single connection to the mail server. Every
+    message is sent on its own, so a rejected recipient does not affect the others. Messages
+    the server rejects permanently, e.g. because of an invalid address, count as failed right
+    away. Other failed messages are retried with a new connection, since the server might have
+    closed the old one. Failing to connect to the server counts as a failed attempt of the message that was
+    about to be sent. The number of messages per second is limited by the ``ratelimit`` option
+    in the ``[mail]`` section of the configuration file.
+
+    :param event: The event the messages belong to, which determines the mail server
+    :param messages: A list of dictionaries as returned by :py:func:`render_message`, the
+        values for ``order`` may be replaced by the order objects to save queries
+    :returns: The indices of the messages within ``messages`` that could not be sent
+    """
+    backend = event.get_mail_backend() if event else get_connection(fail_silently=False)
+    interval = 1 / settings.MAIL_RATE_LIMIT if settings.MAIL_RATE_LIMIT else 0
+    last_sent = 0
+    failures = []
+    connected = False
+
+    try:
+        for i, message in enumerate(messages):
+            message = dict(message)
+            message.pop('event', None)
+            email = _build_email(event, **message)
+            for attempt in range(retries + 1):
+                wait = last_sent + interval - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+                last_sent = time.time()
+                try:
+                    if not connected:
+                        backend.open()
+                        connected = True
+                    # The connection is already open, so this does not close it
+                    backend.send_messages([email])
+                    break
+                except Exception as e:
+                    logger.exception('Error sending email')
+                    if connected and _permanent_error(e):
+                        # The server rejected this message for good, but the connection is still usable
+                        failures.append(i)
+                        break
+                    _close_quietly(backend)
+                    connected = False
+                    if attempt == retries:
+                        failures.append(i)
+                    else:
+                        time.sleep(MAIL_RETRY_DELAY * (attempt + 1))
+    finally:
+        if connected:
+            _close_quietly(backend)
+    return failures
+
+
+def _permanent_error(e: Exception) -> bool:
+    """
+    Returns whether the mail server rejected a message with a permanent (5xx) error, e.g. because
+    of an invalid recipient. Sending it again would not help.
+    """
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return bool(e.recipients) and all(code >= 500 for code, msg in e.recipients.values())
+    if isinstance(e, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+        return e.smtp_code >= 500
+    return False
+
+
+def _close_quietly(backend):
+    # The connection might already be broken, which must not keep us from sending other messages
+    try:
+        backend.close()
+    except Exception:
+        logger.exception('Error closing the connection to the mail server')
+
+
 def mail_send(*args, **kwargs):
     mail_send_task.apply_async(args=args, kwargs=kwargs)
 
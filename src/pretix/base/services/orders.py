@@ -22,7 +22,7 @@ from pretix.base.i18n import (
 )
 from pretix.base.models import (
     CartPosition, Event, Item, ItemVariation, Order, OrderPosition, Quota,
-    User, Voucher,
+    User, Voucher, buffered_logging,
 )
 from pretix.base.models.event import SubEvent
 from pretix.base.models.orders import (
@@ -106,7 +106,7 @@ def mark_order_paid(order: Order, provider: str=None, info: str=None, date: date
     if order.status == Order.STATUS_PAID:
         return order
 
-    with order.event.lock() as now_dt:
+    with order.event.lock(positions=order.positions.all()) as now_dt:
         can_be_paid = order._can_be_paid(count_waitinglist=count_waitinglist)
         if not force and can_be_paid is not True:
             raise Quota.QuotaExceededException(can_be_paid)
@@ -195,7 +195,7 @@ def extend_order(order: Order, new_date: datetime, force: bool=False, user: User
             }
         )
     else:
-        with order.event.lock() as now_dt:
+        with order.event.lock(positions=order.positions.all()) as now_dt:
             is_available = order._is_still_available(now_dt, count_waitinglist=False)
             if is_available is True or force is True:
                 order.expires = new_date
@@ -225,7 +225,7 @@ def mark_order_refunded(order, user=None, api_token=None):
         order = Order.objects.get(pk=order)
     if isinstance(user, int):
         user = User.objects.get(pk=user)
-    with order.event.lock():
+    with order.event.lock(positions=order.positions.all()):
         order.status = Order.STATUS_REFUNDED
         order.save()
 
@@ -248,7 +248,7 @@ def mark_order_expired(order, user=None, auth=None):
         order = Order.objects.get(pk=order)
     if isinstance(user, int):
         user = User.objects.get(pk=user)
-    with order.event.lock():
+    with order.event.lock(positions=order.positions.all()):
         order.status = Order.STATUS_EXPIRED
         order.save()
 
@@ -275,7 +275,7 @@ def _cancel_order(order, user=None, send_mail: bool=True, api_token=None, oauth_
         api_token = TeamAPIToken.objects.get(pk=api_token)
     if isinstance(oauth_application, int):
         oauth_application = OAuthApplication.objects.get(pk=oauth_application)
-    with order.event.lock():
+    with order.event.lock(positions=order.positions.all()):
         if not order.cancel_allowed():
             raise OrderError(_('You cannot cancel this order.'))
         order.status = Order.STATUS_CANCELED
@@ -507,7 +507,7 @@ def _perform_order(event: str, payment_provider: str, position_ids: List[str],
         except InvoiceAddress.DoesNotExist:
             pass
 
-    with event.lock() as now_dt:
+    with event.lock(positions=CartPosition.objects.filter(id__in=position_ids)) as now_dt:
         positions = list(CartPosition.objects.filter(
             id__in=position_ids).select_related('item', 'variation', 'subevent'))
         if len(positions) == 0:
@@ -1116,8 +1116,9 @@ class OrderChangeManager:
         # finally, incorporate difference in payment fees
         self._payment_fee_diff()
 
-        with transaction.atomic():
-            with self.order.event.lock():
+        with transaction.atomic(), buffered_logging():
+            with self.order.event.lock(quotas=[q for q, diff in self._quotadiff.items() if diff > 0],
+                                       positions=self.order.positions.all()):
                 if self.order.status not in (Order.STATUS_PENDING, Order.STATUS_PAID):
                     raise OrderError(self.error_messages['not_pending_or_paid'])
                 self._check_free_to_paid()
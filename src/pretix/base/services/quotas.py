@@ -1,12 +1,40 @@
-from django.db import models
-from django.db.models import F, Max, OuterRef, Q, Subquery
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_init, post_save,
+)
 from django.dispatch import receiver
+from django.utils.timezone import now
 
-from pretix.base.models import LogEntry, Quota
+from pretix.base.models import (
+    CartPosition, EventActivity, Order, OrderPosition, Quota, QuotaLedger,
+    Voucher, WaitingListEntry,
+)
+from pretix.base.services.locking import LockTimeoutException
 from pretix.celery_app import app
 
 from ..signals import periodic_task
 
+logger = logging.getLogger('pretix.base.quotas')
+
+LEDGER_FIELDS = {
+    Order.STATUS_PAID: 'paid_orders',
+    Order.STATUS_PENDING: 'pending_orders',
+}
+LEDGER_RECONCILIATION_INTERVAL = 3600
+# Maximum number of seconds a refresh of the quota caches of one event may take per run
+QUOTA_REFRESH_BUDGET = 60
+# Activity of an event is recorded at most once per this number of seconds per process
+ACTIVITY_INTERVAL = 10
+
+_activity = {}
+
 
 @receiver(signal=periodic_task)
 def build_all_quota_caches(sender, **kwargs):
@@ -15,18 +43,286 @@ def build_all_quota_caches(sender, **kwargs):
 
 @app.task
 def refresh_quota_caches():
-    last_activity = LogEntry.objects.filter(
-        event=OuterRef('event_id'),
-    ).order_by().values('event').annotate(
-        m=Max('datetime')
-    ).values(
-        'm'
-    )
-    quotas = Quota.objects.annotate(
-        last_activity=Subquery(last_activity, output_field=models.DateTimeField())
-    ).filter(
-        Q(cached_availability_time__isnull=True) |
-        Q(cached_availability_time__lt=F('last_activity'))
+    dirty = EventActivity.objects.filter(
+        Q(quotas_refreshed__isnull=True) | Q(last_activity__gt=F('quotas_refreshed'))
+    ).values_list('event_id', flat=True)
+    for event_id in dirty:
+        if settings.HAS_CELERY:
+            refresh_event_quota_caches.apply_async(args=(event_id,))
+        else:
+            refresh_event_quota_caches(event_id)
+
+
+@app.task
+def refresh_event_quota_caches(event: int, budget: int=QUOTA_REFRESH_BUDGET):
+    """
+    Recomputes the cached availability of all quotas of an event. If this takes longer than
+    ``budget`` seconds, the remaining quotas are left for the next run. Quotas with the oldest
+    cached values are computed first.
+    """
+    started = now()
+    t0 = time.monotonic()
+    quotas = Quota.objects.filter(event_id=event).select_related('event', 'subevent').order_by(
+        F('cached_availability_time').asc(nulls_first=True)
     )
     for q in quotas:
-        q.availability()
+        if time.monotonic() - t0 > budget:
+            logger.warning('Refreshing the quota caches of event %d took longer than %d seconds', event, budget)
+            return
+        # The cache might have been written less than two minutes ago, but before the activity we
+        # are handling, so we must not skip hot caches
+        q.rebuild_cache(now_dt=started)
+    EventActivity.objects.filter(event_id=event).update(quotas_refreshed=started)
+
+
+def mark_event_active(event_id: int) -> None:
+    """
+    Records that something changed in the event that might affect the availability of its quotas,
+    so that the next run of :py:func:`refresh_quota_caches` recomputes them. The change is recorded
+    after the current transaction is committed and at most every ``ACTIVITY_INTERVAL`` seconds per
+    process and event.
+    """
+    if event_id is None or _activity.get(event_id, 0) > time.time() - ACTIVITY_INTERVAL:
+        return
+
+    def record():
+        if _activity.get(event_id, 0) > time.time() - ACTIVITY_INTERVAL:
+            return
+        _activity[event_id] = time.time()
+        # We skip further calls for a while, so we record a time that lies after all of them
+        last_activity = now() + timedelta(seconds=ACTIVITY_INTERVAL)
+        if not EventActivity.objects.filter(event_id=event_id).update(last_activity=last_activity):
+            try:
+                with transaction.atomic():
+                    EventActivity.objects.create(event_id=event_id, last_activity=last_activity)
+            except IntegrityError:
+                EventActivity.objects.filter(event_id=event_id).update(last_activity=last_activity)
+
+    transaction.on_commit(record)
+
+
+@receiver(post_save, sender=Order, dispatch_uid="quota_activity_order_saved")
+@receiver(post_save, sender=CartPosition, dispatch_uid="quota_activity_cart_saved")
+@receiver(post_delete, sender=CartPosition, dispatch_uid="quota_activity_cart_deleted")
+@receiver(post_save, sender=Voucher, dispatch_uid="quota_activity_voucher_saved")
+@receiver(post_delete, sender=Voucher, dispatch_uid="quota_activity_voucher_deleted")
+@receiver(post_save, sender=WaitingListEntry, dispatch_uid="quota_activity_waitinglist_saved")
+@receiver(post_delete, sender=WaitingListEntry, dispatch_uid="quota_activity_waitinglist_deleted")
+def activity_object_changed(sender, instance, **kwargs):
+    mark_event_active(instance.event_id)
+
+
+@receiver(post_save, sender=OrderPosition, dispatch_uid="quota_activity_position_saved")
+@receiver(post_delete, sender=OrderPosition, dispatch_uid="quota_activity_position_deleted")
+def activity_position_changed(sender, instance, **kwargs):
+    mark_event_active(instance.order.event_id)
+
+
+@receiver(post_save, sender=Quota, dispatch_uid="quota_activity_quota_saved")
+def activity_quota_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields and all(f.startswith('cached_availability_') for f in update_fields):
+        # Saving the result of a refresh
+        return
+    mark_event_active(instance.event_id)
+
+
+@receiver(m2m_changed, sender=Quota.items.through, dispatch_uid="quota_activity_items_changed")
+@receiver(m2m_changed, sender=Quota.variations.through, dispatch_uid="quota_activity_variations_changed")
+def activity_quota_products_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        mark_event_active(instance.event_id)
+
+
+def apply_ledger_delta(delta: Counter):
+    """
+    Applies changes to all quota ledgers affected by them.
+
+    :param delta: A counter with tuples of ``(field, item_id, variation_id, subevent_id)`` as keys
+                  and the number the ledger field should change by as values.
+    """
+    for (field, item_id, variation_id, subevent_id), value in delta.items():
+        if not value:
+            continue
+        if variation_id:
+            quotas = Quota.variations.through.objects.filter(
+                itemvariation_id=variation_id, quota__subevent_id=subevent_id
+            )
+        else:
+            quotas = Quota.items.through.objects.filter(
+                item_id=item_id, quota__subevent_id=subevent_id
+            )
+        QuotaLedger.objects.filter(
+            quota_id__in=quotas.values_list('quota_id', flat=True)
+        ).update(**{field: F(field) + value})
+
+
+def _position_state(instance):
+    # Read from __dict__ to avoid queries for deferred fields
+    return (
+        instance.__dict__.get('order_id'), instance.__dict__.get('item_id'),
+        instance.__dict__.get('variation_id'), instance.__dict__.get('subevent_id'),
+    )
+
+
+def _order_ledger_field(order_id, position):
+    if order_id == position.order_id:
+        status = getattr(position.order, '_ledger_status', None)
+    else:
+        status = Order.objects.filter(pk=order_id).values_list('status', flat=True).first()
+    return LEDGER_FIELDS.get(status)
+
+
+@receiver(post_init, sender=Order, dispatch_uid="quota_ledger_order_init")
+def ledger_order_init(sender, instance, **kwargs):
+    instance._ledger_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Order, dispatch_uid="quota_ledger_order_saved")
+def ledger_order_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    old_status = instance._ledger_status
+    instance._ledger_status = instance.status
+    if not settings.PRETIX_QUOTA_LEDGER or created or old_status is None:
+        return
+
+    old_field, new_field = LEDGER_FIELDS.get(old_status), LEDGER_FIELDS.get(instance.status)
+    if old_field == new_field:
+        return
+
+    delta = Counter()
+    positions = OrderPosition.objects.filter(order=instance).order_by().values(
+        'item', 'variation', 'subevent'
+    ).annotate(c=Count('id'))
+    for p in positions:
+        key = (p['item'], p['variation'], p['subevent'])
+        if old_field:
+            delta[(old_field,) + key] -= p['c']
+        if new_field:
+            delta[(new_field,) + key] += p['c']
+    apply_ledger_delta(delta)
+
+
+@receiver(post_init, sender=OrderPosition, dispatch_uid="quota_ledger_position_init")
+def ledger_position_init(sender, instance, **kwargs):
+    instance._ledger_state = _position_state(instance)
+
+
+@receiver(post_save, sender=OrderPosition, dispatch_uid="quota_ledger_position_saved")
+def ledger_position_saved(sender, instance, created, **kwargs):
+    old_state = instance._ledger_state
+    new_state = instance._ledger_state = _position_state(instance)
+    if not settings.PRETIX_QUOTA_LEDGER or (old_state == new_state and not created):
+        return
+
+    delta = Counter()
+    if not created:
+        old_field = _order_ledger_field(old_state[0], instance)
+        if old_field:
+            delta[(old_field,) + old_state[1:]] -= 1
+    new_field = _order_ledger_field(new_state[0], instance)
+    if new_field:
+        delta[(new_field,) + new_state[1:]] += 1
+    apply_ledger_delta(delta)
+
+
+@receiver(post_delete, sender=OrderPosition, dispatch_uid="quota_ledger_position_deleted")
+def ledger_position_deleted(sender, instance, **kwargs):
+    if not settings.PRETIX_QUOTA_LEDGER:
+        return
+    state = instance._ledger_state
+    field = _order_ledger_field(state[0], instance)
+    if field:
+        apply_ledger_delta(Counter({(field,) + state[1:]: -1}))
+
+
+def _waitinglist_state(instance):
+    if instance.__dict__.get('voucher_id') is not None:
+        return None
+    return (
+        instance.__dict__.get('item_id'), instance.__dict__.get('variation_id'),
+        instance.__dict__.get('subevent_id'),
+    )
+
+
+@receiver(post_init, sender=WaitingListEntry, dispatch_uid="quota_ledger_waitinglist_init")
+def ledger_waitinglist_init(sender, instance, **kwargs):
+    instance._ledger_state = _waitinglist_state(instance)
+
+
+@receiver(post_save, sender=WaitingListEntry, dispatch_uid="quota_ledger_waitinglist_saved")
+def ledger_waitinglist_saved(sender, instance, created, **kwargs):
+    old_state = instance._ledger_state
+    new_state = instance._ledger_state = _waitinglist_state(instance)
+    if not settings.PRETIX_QUOTA_LEDGER or (old_state == new_state and not created):
+        return
+
+    delta = Counter()
+    if old_state and not created:
+        delta[('waiting_list',) + old_state] -= 1
+    if new_state:
+        delta[('waiting_list',) + new_state] += 1
+    apply_ledger_delta(delta)
+
+
+@receiver(post_delete, sender=WaitingListEntry, dispatch_uid="quota_ledger_waitinglist_deleted")
+def ledger_waitinglist_deleted(sender, instance, **kwargs):
+    if settings.PRETIX_QUOTA_LEDGER and instance._ledger_state:
+        apply_ledger_delta(Counter({('waiting_list',) + instance._ledger_state: -1}))
+
+
+@receiver(m2m_changed, sender=Quota.items.through, dispatch_uid="quota_ledger_items_changed")
+@receiver(m2m_changed, sender=Quota.variations.through, dispatch_uid="quota_ledger_variations_changed")
+def ledger_quota_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # If the set of products a quota applies to changes, we can't tell the effect on the counters
+    # without counting again. We therefore drop the ledger and it will be seeded again on next use.
+    if not settings.PRETIX_QUOTA_LEDGER or action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        QuotaLedger.objects.filter(quota=instance).delete()
+    elif action == 'pre_clear':
+        QuotaLedger.objects.filter(quota__in=instance.quotas.all()).delete()
+    else:
+        QuotaLedger.objects.filter(quota_id__in=pk_set).delete()
+
+
+def reconcile_quota_ledger(ledger: QuotaLedger) -> dict:
+    """
+    Compares a quota ledger to a full count and corrects it, if necessary.
+
+    :returns: A dictionary of the ledger fields that had drifted and the difference to the correct value.
+    :raises LockTimeoutException: if the event could not be locked
+    """
+    quota = ledger.quota
+    with quota.event.lock(quotas=[quota]):
+        with transaction.atomic():
+            values = quota.count_ledger_values()
+            ledger.refresh_from_db()
+            drift = {
+                k: v - getattr(ledger, k) for k, v in values.items()
+                if v != getattr(ledger, k)
+            }
+            QuotaLedger.objects.filter(pk=ledger.pk).update(reconciled=now(), **values)
+
+    if drift:
+        logger.warning('Ledger of quota %d (event %s) drifted: %r', quota.pk, quota.event.slug, drift)
+    return drift
+
+
+@receiver(signal=periodic_task)
+def reconcile_all_quota_ledgers(sender, **kwargs):
+    if settings.PRETIX_QUOTA_LEDGER:
+        reconcile_quota_ledgers.apply_async()
+
+
+@app.task
+def reconcile_quota_ledgers(max_age: int=LEDGER_RECONCILIATION_INTERVAL):
+    ledgers = QuotaLedger.objects.select_related('quota', 'quota__event')
+    if max_age is not None:
+        ledgers = ledgers.filter(reconciled__lt=now() - timedelta(seconds=max_age))
+    for ledger in ledgers:
+        try:
+            reconcile_quota_ledger(ledger)
+        except LockTimeoutException:
+            # The event is busy, we'll try again next time
+            pass
@@ -12,6 +12,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from pretix.base.models import CachedFile, Event, cachedfile_name
 from pretix.base.services.async import ProfiledTask
+from pretix.base.services.logarchive import restore_logentries
 from pretix.base.shredder import ShredError
 from pretix.celery_app import app
 
@@ -80,6 +81,9 @@ def shred(event: str, fileid: str, confirm_code: str) -> None:
     if event.logentry_set.filter(datetime__gte=parse(indexdata['time'])):
         raise ShredError(_("Something happened in your event after the export, please try again."))
 
+    # Shredders modify the log entries of the event, so they need to be in the log table
+    restore_logentries(event)
+
     for s in indexdata['shredders']:
         shredder = known_shredders.get(s)
         if not shredder:
@@ -1,20 +1,35 @@
+import logging
 import os
-from datetime import timedelta
+import time
+from datetime import datetime, timedelta
 
+from celery import chord
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import receiver
 from django.utils.timezone import now
 from django.utils.translation import ugettext as _
 
 from pretix.base.i18n import language
 from pretix.base.models import (
     CachedCombinedTicket, CachedTicket, Event, InvoiceAddress, Order,
-    OrderPosition,
+    OrderPosition, SubEvent,
 )
+from pretix.base.reldate import RelativeDateWrapper
 from pretix.base.services.async import ProfiledTask
-from pretix.base.signals import register_ticket_outputs
+from pretix.base.signals import periodic_task, register_ticket_outputs
 from pretix.celery_app import app
 from pretix.helpers.database import rolledback_transaction
 
+logger = logging.getLogger('pretix.base.tickets')
+
+PREGENERATE_BATCH_SIZE = 100
+# Tickets are pre-generated this long before the ticket download opens
+PREGENERATE_AHEAD = timedelta(hours=1)
+
 
 @app.task(base=ProfiledTask)
 def generate(order_position: str, provider: str):
@@ -31,7 +46,7 @@ def generate(order_position: str, provider: str):
 
     with language(order_position.order.locale):
         responses = register_ticket_outputs.send(order_position.order.event)
-        for receiver, response in responses:
+        for recv, response in responses:
             prov = response(order_position.order.event)
             if prov.identifier == provider:
                 filename, ct.type, data = prov.generate(order_position)
@@ -56,7 +71,7 @@ def generate_order(order: int, provider: str):
 
     with language(order.locale):
         responses = register_ticket_outputs.send(order.event)
-        for receiver, response in responses:
+        for recv, response in responses:
             prov = response(order.event)
             if prov.identifier == provider:
                 filename, ct.type, data = prov.generate_order(order)
@@ -66,6 +81,154 @@ def generate_order(order: int, provider: str):
                 ct.file.save(filename, ContentFile(data))
 
 
+def _pregenerate_positions(event: Event, provider: str, subevents: list=None):
+    qs = OrderPosition.objects.filter(
+        order__event=event, order__status=Order.STATUS_PAID
+    ).exclude(
+        id__in=CachedTicket.objects.filter(
+            order_position__order__event=event, provider=provider, file__isnull=False
+        ).exclude(file='').values('order_position_id')
+    )
+    if not event.settings.ticket_download_addons:
+        qs = qs.filter(addon_to__isnull=True)
+    if not event.settings.ticket_download_nonadm:
+        qs = qs.filter(item__admission=True)
+    if subevents is not None:
+        qs = qs.filter(subevent_id__in=subevents)
+    return qs
+
+
+@app.task(base=ProfiledTask, bind=True)
+def pregenerate(self, event: int, subevents: list=None) -> dict:
+    """
+    Generates the tickets of all paid positions of an event, or only of the given subevents,
+    for which no ticket file exists yet. The positions are split into batches which are
+    processed in parallel if there are workers.
+
+    :returns: A dictionary with the number of generated tickets (``count``) and the duration
+              in seconds (``seconds``)
+    """
+    started = time.time()
+    event = Event.objects.get(id=event)
+    batches = []
+    for recv, response in register_ticket_outputs.send(event):
+        prov = response(event)
+        if not prov.is_enabled:
+            continue
+        ids = list(
+            _pregenerate_positions(event, prov.identifier, subevents).order_by('pk').values_list('id', flat=True)
+        )
+        batches += [
+            (prov.identifier, ids[i:i + PREGENERATE_BATCH_SIZE])
+            for i in range(0, len(ids), PREGENERATE_BATCH_SIZE)
+        ]
+
+    if batches and settings.HAS_CELERY:
+        # The final task inherits our task ID, so whoever waits for this task will receive its result
+        raise self.replace(chord(
+            [
+                generate_batch.s(event.pk, provider, ids, self.request.id, len(batches))
+                for provider, ids in batches
+            ],
+            pregenerate_done.s(event.pk, started)
+        ))
+    return pregenerate_done([generate_batch(event.pk, provider, ids) for provider, ids in batches], event.pk, started)
+
+
+@app.task(base=ProfiledTask, bind=True)
+def generate_batch(self, event: int, provider: str, positions: list, pregenerate_id: str=None,
+                   total: int=1) -> int:
+    """
+    Generates the tickets of a batch of positions with one instance of the ticket output and
+    stores them at once.
+    """
+    event = Event.objects.get(id=event)
+    prov = None
+    for recv, response in register_ticket_outputs.send(event):
+        output = response(event)
+        if output.identifier == provider:
+            prov = output
+
+    tickets = []
+    qs = OrderPosition.objects.filter(order__event=event, id__in=positions).select_related(
+        'order', 'order__event', 'order__event__organizer', 'item', 'variation', 'subevent', 'addon_to'
+    ).prefetch_related(
+        'addons', 'addons__item', 'addons__variation'
+    )
+    for op in qs if prov else []:
+        with language(op.order.locale):
+            filename, filetype, data = prov.generate(op)
+        ct = CachedTicket(order_position=op, provider=provider, type=filetype,
+                          extension=os.path.splitext(filename)[1])
+        ct.file.save(filename, ContentFile(data), save=False)
+        tickets.append(ct)
+
+    with transaction.atomic():
+        # Replaces empty placeholders created by requests that are still waiting for their ticket
+        CachedTicket.objects.filter(order_position_id__in=[ct.order_position_id for ct in tickets],
+                                    provider=provider).delete()
+        CachedTicket.objects.bulk_create(tickets)
+
+    if pregenerate_id:
+        # Report progress on the task that the user is waiting for
+        key = 'pretix_ticket_pregenerate_done_{}'.format(pregenerate_id)
+        cache.add(key, 0, 3600)
+        done = cache.incr(key)
+        self.backend.store_result(pregenerate_id, {'value': round(done / total * 100)}, 'PROGRESS')
+    return len(tickets)
+
+
+@app.task(base=ProfiledTask)
+def pregenerate_done(counts: list, event: int, started: float) -> dict:
+    result = {
+        'count': sum(counts),
+        'seconds': round(time.time() - started, 1),
+    }
+    logger.info('Pre-generated %d tickets for event %d in %.1f seconds', result['count'], event, result['seconds'])
+    return result
+
+
+def _not_ended(t):
+    return Q(date_to__gte=t) | Q(Q(date_to__isnull=True) & Q(date_from__gte=t))
+
+
+def _pregenerate_due(download_date, last_run, t):
+    if download_date is None:
+        # The download is available right away, so we only need to run once. The last run is
+        # reset when pre-generation is switched on again or the ticket output settings change.
+        return last_run is None
+    start = download_date - PREGENERATE_AHEAD
+    return start <= t and (last_run is None or last_run < start)
+
+
+@receiver(signal=periodic_task)
+def pregenerate_opening_downloads(sender, **kwargs):
+    t = now()
+    # Tickets of events that are over are not going to be downloaded any more
+    qs = Event.objects.filter(live=True).filter(
+        Q(Q(has_subevents=False) & _not_ended(t))
+        | Q(has_subevents=True, subevents__in=SubEvent.objects.filter(_not_ended(t), active=True))
+    ).distinct().prefetch_related(
+        '_settings_objects', 'organizer___settings_objects'
+    ).select_related('organizer')
+    for e in qs:
+        if not e.settings.ticket_download or not e.settings.ticket_download_pregenerate:
+            continue
+        last_run = e.settings.get('ticket_download_pregenerated', as_type=datetime)
+        dl_date = e.settings.get('ticket_download_date', as_type=RelativeDateWrapper)
+        if e.has_subevents:
+            subevents = [
+                se.pk for se in e.subevents.filter(_not_ended(t), active=True)
+                if _pregenerate_due(dl_date.datetime(se) if dl_date else None, last_run, t)
+            ]
+            if subevents:
+                pregenerate.apply_async(args=(e.pk, subevents))
+                e.settings.ticket_download_pregenerated = t
+        elif _pregenerate_due(dl_date.datetime(e) if dl_date else None, last_run, t):
+            pregenerate.apply_async(args=(e.pk,))
+            e.settings.ticket_download_pregenerated = t
+
+
 class DummyRollbackException(Exception):
     pass
 
@@ -91,7 +254,7 @@ def preview(event: int, provider: str):
         InvoiceAddress.objects.create(order=order, name=_("John Doe"), company=_("Sample company"))
 
         responses = register_ticket_outputs.send(event)
-        for receiver, response in responses:
+        for recv, response in responses:
             prov = response(event)
             if prov.identifier == provider:
                 return prov.generate(p)
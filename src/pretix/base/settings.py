@@ -81,6 +81,10 @@ DEFAULTS = {
         'default': '30',
         'type': int
     },
+    'queue_size': {
+        'default': '0',
+        'type': int
+    },
     'payment_term_days': {
         'default': '14',
         'type': int
@@ -197,6 +201,14 @@ DEFAULTS = {
         'default': 'True',
         'type': bool
     },
+    'ticket_download_pregenerate': {
+        'default': 'False',
+        'type': bool
+    },
+    'ticket_download_pregenerated': {
+        'default': None,
+        'type': datetime
+    },
     'event_list_type': {
         'default': 'list',
         'type': str
@@ -487,6 +499,14 @@ Your {event} team"""))
         'default': None,
         'type': str
     },
+    'calendar_index_built': {
+        'default': 'False',
+        'type': bool
+    },
+    'calendar_index_queued': {
+        'default': 'False',
+        'type': bool
+    },
     'banner_message': {
         'default': '',
         'type': LazyI18nString
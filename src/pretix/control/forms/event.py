@@ -365,6 +365,13 @@ class EventSettingsForm(SettingsForm):
         label=_("Reservation period"),
         help_text=_("The number of minutes the items in a user's cart are reserved for this user."),
     )
+    queue_size = forms.IntegerField(
+        min_value=0,
+        label=_("Queue size"),
+        help_text=_("If set, only this number of customers can add products to their cart at the same time. "
+                    "Everyone else is put into a queue and may continue once it is their turn. Set to 0 to "
+                    "disable the queue."),
+    )
     imprint_url = forms.URLField(
         label=_("Imprint URL"),
         help_text=_("This should point e.g. to a part of your website that has your contact details and legal "
@@ -899,6 +906,15 @@ class TicketSettingsForm(SettingsForm):
         required=False,
         widget=forms.CheckboxInput(attrs={'data-display-dependency': '#id_ticket_download'}),
     )
+    ticket_download_pregenerate = forms.BooleanField(
+        label=_("Generate tickets in advance"),
+        help_text=_("If enabled, the tickets for all paid orders will be generated in the background shortly "
+                    "before the ticket download opens. This prevents long waiting times if many customers "
+                    "download their tickets at the same time. If no download date is set, this happens once "
+                    "after you enable this option or change the ticket output settings."),
+        required=False,
+        widget=forms.CheckboxInput(attrs={'data-display-dependency': '#id_ticket_download'}),
+    )
 
     def prepare_fields(self):
         # See clean()
@@ -101,6 +101,8 @@ urlpatterns = [
         url(r'^settings/tickets$', event.TicketSettings.as_view(), name='event.settings.tickets'),
         url(r'^settings/tickets/preview/(?P<output>[^/]+)$', event.TicketSettingsPreview.as_view(),
             name='event.settings.tickets.preview'),
+        url(r'^settings/tickets/pregenerate$', event.TicketPregenerate.as_view(),
+            name='event.settings.tickets.pregenerate'),
         url(r'^settings/email$', event.MailSettings.as_view(), name='event.settings.mail'),
         url(r'^settings/email/preview$', event.MailSettingsPreview.as_view(), name='event.settings.mail.preview'),
         url(r'^settings/invoice$', event.InvoiceSettings.as_view(), name='event.settings.invoice'),
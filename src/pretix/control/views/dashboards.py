@@ -17,7 +17,7 @@ from django.utils.timezone import now
 from django.utils.translation import pgettext, ugettext_lazy as _, ungettext
 
 from pretix.base.models import (
-    Item, Order, OrderPosition, RequiredAction, SubEvent, Voucher,
+    Item, Order, OrderPosition, Quota, RequiredAction, SubEvent, Voucher,
     WaitingListEntry,
 )
 from pretix.base.models.checkin import CheckinList
@@ -156,8 +156,10 @@ def waitinglist_widgets(sender, subevent=None, **kwargs):
 def quota_widgets(sender, subevent=None, **kwargs):
     widgets = []
 
-    for q in sender.quotas.filter(subevent=subevent):
-        status, left = q.availability(allow_cache=True)
+    quotas = list(sender.quotas.filter(subevent=subevent))
+    availabilities = Quota.objects.bulk_availability(quotas, allow_cache=True)
+    for q in quotas:
+        status, left = availabilities[q.pk]
         widgets.append({
             'content': NUM_WIDGET.format(num='{}/{}'.format(left, q.size) if q.size is not None else '\u221e',
                                          text=_('{quota} left').format(quota=escape(q.name))),
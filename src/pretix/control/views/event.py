@@ -11,7 +11,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.core.files import File
 from django.core.urlresolvers import reverse
 from django.db import transaction
-from django.db.models import ProtectedError
+from django.db.models import ProtectedError, Q
 from django.http import (
     Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed,
     JsonResponse,
@@ -36,8 +36,10 @@ from pretix.base.models import (
 from pretix.base.models.event import EventMetaValue
 from pretix.base.services import tickets
 from pretix.base.services.invoices import build_preview_invoice_pdf
+from pretix.base.services.logarchive import ArchivedLogEntries, LogEntryList
 from pretix.base.signals import register_ticket_outputs
 from pretix.base.templatetags.money import money_filter
+from pretix.base.views.async import AsyncAction
 from pretix.control.forms.event import (
     CommentForm, DisplaySettingsForm, EventDeleteForm, EventMetaValueForm,
     EventSettingsForm, EventUpdateForm, InvoiceSettingsForm, MailSettingsForm,
@@ -631,6 +633,31 @@ class TicketSettingsPreview(EventPermissionRequiredMixin, View):
         })
 
 
+class TicketPregenerate(EventPermissionRequiredMixin, AsyncAction, View):
+    task = tickets.pregenerate
+    permission = 'can_change_event_settings'
+
+    def get_success_message(self, value):
+        if not value['count']:
+            return _('All tickets have already been generated.')
+        return _('{num} tickets have been generated in {seconds} seconds ({rate} tickets per second).').format(
+            num=value['count'], seconds=value['seconds'],
+            rate=round(value['count'] / max(value['seconds'], 0.1), 1)
+        )
+
+    def get_success_url(self, value):
+        return self.get_error_url()
+
+    def get_error_url(self):
+        return reverse('control:event.settings.tickets', kwargs={
+            'organizer': self.request.event.organizer.slug,
+            'event': self.request.event.slug
+        })
+
+    def post(self, request, *args, **kwargs):
+        return self.do(self.request.event.id)
+
+
 class TicketSettings(EventSettingsViewMixin, EventPermissionRequiredMixin, FormView):
     model = Event
     form_class = TicketSettingsForm
@@ -692,11 +719,15 @@ class TicketSettings(EventSettingsViewMixin, EventPermissionRequiredMixin, FormV
                     CachedCombinedTicket.objects.filter(
                         order__event=self.request.event, provider=provider.identifier
                     ).delete()
+                    # Pre-generate the tickets we just deleted again
+                    self.request.event.settings.delete('ticket_download_pregenerated')
             else:
                 success = False
         form = self.get_form(self.get_form_class())
         if success and form.is_valid():
             form.save()
+            if 'ticket_download_pregenerate' in form.changed_data:
+                self.request.event.settings.delete('ticket_download_pregenerated')
             if form.has_changed():
                 self.request.event.log_action(
                     'pretix.event.tickets.settings', user=self.request.user, data={
@@ -828,22 +859,27 @@ class EventLog(EventPermissionRequiredMixin, ListView):
         qs = self.request.event.logentry_set.all().select_related(
             'user', 'content_type', 'api_token', 'oauth_application'
         ).order_by('-datetime')
-        qs = qs.exclude(action_type__in=OVERVIEW_BLACKLIST)
+        # The same filters are applied to the archived log entries
+        q = ~Q(action_type__in=OVERVIEW_BLACKLIST)
+        hidden_types = []
         if not self.request.user.has_event_permission(self.request.organizer, self.request.event, 'can_view_orders',
                                                       request=self.request):
-            qs = qs.exclude(content_type=ContentType.objects.get_for_model(Order))
+            hidden_types.append(ContentType.objects.get_for_model(Order).pk)
         if not self.request.user.has_event_permission(self.request.organizer, self.request.event, 'can_view_vouchers',
                                                       request=self.request):
-            qs = qs.exclude(content_type=ContentType.objects.get_for_model(Voucher))
-
-        if self.request.GET.get('user') == 'yes':
-            qs = qs.filter(user__isnull=False)
-        elif self.request.GET.get('user') == 'no':
-            qs = qs.filter(user__isnull=True)
-        elif self.request.GET.get('user'):
-            qs = qs.filter(user_id=self.request.GET.get('user'))
-
-        return qs
+            hidden_types.append(ContentType.objects.get_for_model(Voucher).pk)
+        if hidden_types:
+            q &= ~Q(content_type__in=hidden_types)
+
+        user = self.request.GET.get('user')
+        if user == 'yes':
+            q &= Q(user__isnull=False)
+        elif user == 'no':
+            q &= Q(user__isnull=True)
+        elif user:
+            q &= Q(user_id=user)
+
+        return LogEntryList(qs.filter(q), ArchivedLogEntries(self.request.event, q))
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data()
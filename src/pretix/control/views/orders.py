@@ -8,7 +8,7 @@ import vat_moss.id
 from django.conf import settings
 from django.contrib import messages
 from django.core.urlresolvers import reverse
-from django.db.models import Count
+from django.db.models import Count, Q
 from django.http import FileResponse, Http404, HttpResponseNotAllowed
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils.formats import date_format
@@ -36,6 +36,7 @@ from pretix.base.services.invoices import (
     invoice_qualified, regenerate_invoice,
 )
 from pretix.base.services.locking import LockTimeoutException
+from pretix.base.services.logarchive import ArchivedLogEntries, LogEntryList
 from pretix.base.services.mail import SendMailException, render_mail
 from pretix.base.services.orders import (
     OrderChangeManager, OrderError, cancel_order, extend_order,
@@ -905,11 +906,11 @@ class OrderEmailHistory(EventPermissionRequiredMixin, OrderViewMixin, ListView):
             event=self.request.event,
             code=self.kwargs['code'].upper()
         ).first()
-        qs = order.all_logentries()
-        qs = qs.filter(
-            action_type__contains="order.email"
+        q = Q(action_type__contains="order.email")
+        return LogEntryList(
+            order.all_logentries().filter(q),
+            ArchivedLogEntries(self.request.event, q, obj=order)
         )
-        return qs
 
 
 class AnswerDownload(EventPermissionRequiredMixin, OrderViewMixin, ListView):
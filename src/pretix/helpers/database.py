@@ -1,6 +1,7 @@
 import contextlib
 
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.db.models.expressions import OrderBy
 
 
@@ -57,3 +58,21 @@ class FixedOrderBy(OrderBy):
         template = template or self.template
         params = params * template.count('%(expression)s')
         return (template % placeholders).rstrip(), params
+
+
+def iterate_in_batches(qs, batch_size=500, prefetch_related=()):
+    """
+    Iterates over a queryset without loading all results into memory at once. Django ignores
+    ``prefetch_related()`` if you use ``iterator()``, so the given lookups are instead prefetched
+    for every batch of ``batch_size`` objects.
+    """
+    batch = []
+    for obj in qs.iterator():
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            prefetch_related_objects(batch, *prefetch_related)
+            yield from batch
+            batch = []
+    if batch:
+        prefetch_related_objects(batch, *prefetch_related)
+        yield from batch
@@ -1,8 +1,14 @@
+import random
 import time
 
+from django.conf import settings
 from django.urls import resolve
 
-from pretix.base.metrics import pretix_view_duration_seconds
+from pretix.base.metrics import (
+    pretix_view_duration_seconds, pretix_view_queries,
+    pretix_view_query_seconds, pretix_view_repeated_queries_total,
+)
+from pretix.helpers.profile.queries import QueryProfile
 
 
 class MetricsMiddleware(object):
@@ -26,9 +32,17 @@ class MetricsMiddleware(object):
         url = resolve(request.path_info)
 
         t0 = time.perf_counter()
-        resp = self.get_response(request)
+        with QueryProfile(enabled=random.random() < settings.METRICS_QUERY_SAMPLE_RATE) as profile:
+            resp = self.get_response(request)
         tdiff = time.perf_counter() - t0
+        url_name = url.namespace + ':' + url.url_name
         pretix_view_duration_seconds.observe(tdiff, status_code=resp.status_code, method=request.method,
-                                             url_name=url.namespace + ':' + url.url_name)
+                                             url_name=url_name)
+        if profile.enabled:
+            pretix_view_queries.observe(profile.count, url_name=url_name)
+            pretix_view_query_seconds.observe(profile.duration, url_name=url_name)
+            repeated = profile.repeated()
+            if repeated:
+                pretix_view_repeated_queries_total.inc(len(repeated), url_name=url_name)
 
         return resp
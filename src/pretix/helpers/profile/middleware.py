@@ -1,10 +1,15 @@
 import cProfile
+import logging
 import os
 import random
 import time
 
 from django.conf import settings
 
+from .queries import QueryProfile
+
+logger = logging.getLogger(__name__)
+
 
 class CProfileMiddleware(object):
     blacklist = (
@@ -36,3 +41,22 @@ class CProfileMiddleware(object):
             return response
         else:
             return self.get_response(request)
+
+
+class QueryProfileMiddleware(object):
+    """
+    Adds a summary of the database queries made during a request to the response as the
+    ``X-Pretix-Queries`` header and logs queries that have been run repeatedly. Only meant
+    to be used during development.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryProfile() as profile:
+            response = self.get_response(request)
+        response['X-Pretix-Queries'] = profile.summary()
+        for fp, count in profile.repeated():
+            logger.warning('%s ran a query %d times: %s', request.path, count, fp)
+        return response
@@ -0,0 +1,88 @@
+import re
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# A query that is run this many times with different parameters within one request or task is
+# most likely run in a loop and should be replaced by a single query (N+1 pattern).
+REPEATED_QUERY_THRESHOLD = 5
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_lists = re.compile(r"\bIN \((?:\?, )*\?\)", re.IGNORECASE)
+_whitespace = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """
+    Returns a normalized version of an SQL query with all literal values replaced, so queries that
+    only differ in their parameters have the same fingerprint.
+    """
+    sql = _whitespace.sub(' ', sql).strip()
+    sql = _literals.sub('?', sql)
+    return _in_lists.sub('IN (...)', sql)
+
+
+class QueryProfile:
+    """
+    Context manager that records the database queries made within its block, using Django's
+    query log. Nested profiles are supported.
+
+    This is not free: Django's debug cursor formats every query with its parameters and keeps
+    it in memory until the block is left, so in production this should only be used for a
+    sample of requests or tasks. If ``enabled`` is false, nothing is recorded at all, which allows
+    callers to use the same code path for sampled and unsampled runs. As Django keeps at most
+    9000 queries in its log, ``truncated`` is set if more queries have been made and the numbers
+    are only a lower bound.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, enabled=True):
+        self.connection = connections[using]
+        self.enabled = enabled
+        self.queries = []
+        self.truncated = False
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        self.force_debug_cursor = self.connection.force_debug_cursor
+        self.connection.force_debug_cursor = True
+        self.initial_queries = len(self.connection.queries_log)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.enabled:
+            return
+        self.connection.force_debug_cursor = self.force_debug_cursor
+        log = self.connection.queries_log
+        self.truncated = len(log) == log.maxlen
+        self.queries = list(islice(log, self.initial_queries, None))
+        if not self.force_debug_cursor and not settings.DEBUG:
+            # Nobody else reads the log, so we do not let it fill up between requests or tasks
+            log.clear()
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def duration(self) -> float:
+        """
+        Total time spent in the database, in seconds.
+        """
+        return sum(float(q['time']) for q in self.queries)
+
+    def repeated(self, threshold: int=REPEATED_QUERY_THRESHOLD) -> list:
+        """
+        Returns a list of ``(fingerprint, count)`` tuples of all queries that have been run at least
+        ``threshold`` times, most frequent first.
+        """
+        if self.count < threshold:
+            # Normalizing the queries is expensive, so we skip it if there can't be any result
+            return []
+        counts = Counter(fingerprint(q['sql']) for q in self.queries)
+        return [(fp, n) for fp, n in counts.most_common() if n >= threshold]
+
+    def summary(self) -> str:
+        return '{} queries; {:.1f} ms; {} repeated'.format(self.count, self.duration * 1000, len(self.repeated()))
@@ -17,15 +17,22 @@ class KnownDomain(models.Model):
         return self.domainname
 
     def save(self, *args, **kwargs):
+        from pretix.base.services.calendarindex import rebuild_organizer_calendar
+
         super().save(*args, **kwargs)
         if self.organizer:
             self.organizer.get_cache().clear()
+            rebuild_organizer_calendar(self.organizer)
         cache.delete('pretix_multidomain_organizer_{}'.format(self.domainname))
         cache.delete('pretix_multidomain_organizer_instance_{}'.format(self.domainname))
 
     def delete(self, *args, **kwargs):
+        from pretix.base.services.calendarindex import rebuild_organizer_calendar
+
         if self.organizer:
             self.organizer.get_cache().clear()
         cache.delete('pretix_multidomain_organizer_{}'.format(self.domainname))
         cache.delete('pretix_multidomain_organizer_instance_{}'.format(self.domainname))
         super().delete(*args, **kwargs)
+        if self.organizer:
+            rebuild_organizer_calendar(self.organizer)
@@ -1,6 +1,7 @@
 import json
 import logging
 import re
+from collections import defaultdict
 from decimal import Decimal
 
 from celery.exceptions import MaxRetriesExceededError
@@ -10,7 +11,7 @@ from django.db.models import Q
 from django.utils.translation import ugettext_noop
 
 from pretix.base.i18n import language
-from pretix.base.models import Event, Order, Organizer, Quota
+from pretix.base.models import Event, Order, Organizer, Quota, buffered_logging
 from pretix.base.services.async import TransactionAwareTask
 from pretix.base.services.locking import LockTimeoutException
 from pretix.base.services.mail import SendMailException
@@ -22,34 +23,13 @@ from .models import BankImportJob, BankTransaction
 logger = logging.getLogger(__name__)
 
 
-def _handle_transaction(trans: BankTransaction, code: str, event: Event=None, organizer: Organizer=None,
-                        slug: str=None):
-    if event:
-        try:
-            trans.order = event.orders.get(code=code)
-        except Order.DoesNotExist:
-            normalized_code = Order.normalize_code(code)
-            try:
-                trans.order = event.orders.get(code=normalized_code)
-            except Order.DoesNotExist:
-                trans.state = BankTransaction.STATE_NOMATCH
-                trans.save()
-                return
-    else:
-        qs = Order.objects.filter(event__organizer=organizer)
-        if slug:
-            qs = qs.filter(event__slug__iexact=slug)
-        try:
-            trans.order = qs.get(code=code)
-        except Order.DoesNotExist:
-            normalized_code = Order.normalize_code(code)
-            try:
-                trans.order = qs.get(code=normalized_code)
-            except Order.DoesNotExist:
-                trans.state = BankTransaction.STATE_NOMATCH
-                trans.save()
-                return
+# Maximum number of transactions processed while holding the lock of an event. Locks expire after
+# a while, so we do not want to hold them for the whole import of a very large file.
+MATCH_CHUNK_SIZE = 200
 
+
+def _handle_transaction(trans: BankTransaction, order: Order):
+    trans.order = order
     if trans.order.status == Order.STATUS_PAID:
         trans.state = BankTransaction.STATE_DUPLICATE
     elif trans.order.status == Order.STATUS_REFUNDED:
@@ -111,20 +91,54 @@ def _get_unknown_transactions(job: BankImportJob, data: list, event: Event=None,
         trans.checksum = trans.calculate_checksum()
         if trans.checksum not in known_checksums:
             trans.state = BankTransaction.STATE_UNCHECKED
-            trans.save()
             transactions.append(trans)
             known_checksums.add(trans.checksum)
 
+    BankTransaction.objects.bulk_create(transactions)
+    if transactions and transactions[0].pk is None:
+        # Not all database backends return the IDs of the inserted rows
+        pks = dict(BankTransaction.objects.filter(
+            import_job=job, state=BankTransaction.STATE_UNCHECKED
+        ).values_list('checksum', 'pk'))
+        for trans in transactions:
+            trans.pk = pks[trans.checksum]
+            trans._state.adding = False
     return transactions
 
 
+def _match_transactions(event: Event, transactions: list):
+    """
+    Matches a list of ``(transaction, code)`` tuples of the same event to the event's orders.
+    All orders are looked up with one query and the event is locked once per chunk instead
+    of once per payment.
+    """
+    for i in range(0, len(transactions), MATCH_CHUNK_SIZE):
+        chunk = transactions[i:i + MATCH_CHUNK_SIZE]
+        nomatch = []
+        with event.lock():
+            codes = set(code for trans, code in chunk)
+            codes |= set(Order.normalize_code(code) for code in codes)
+            # Orders fetched through the related manager share our event object, so mark_order_paid
+            # re-uses the lock we are already holding.
+            orders = {o.code: o for o in event.orders.filter(code__in=codes)}
+
+            for trans, code in chunk:
+                order = orders.get(code) or orders.get(Order.normalize_code(code))
+                if not order:
+                    nomatch.append(trans.pk)
+                    continue
+                with transaction.atomic(), buffered_logging():
+                    _handle_transaction(trans, order)
+
+        BankTransaction.objects.filter(pk__in=nomatch).update(state=BankTransaction.STATE_NOMATCH)
+
+
 @app.task(base=TransactionAwareTask, bind=True, max_retries=5, default_retry_delay=1)
 def process_banktransfers(self, job: int, data: list) -> None:
     with language("en"):  # We'll translate error messages at display time
         job = BankImportJob.objects.get(pk=job)
         job.state = BankImportJob.STATE_RUNNING
         job.save()
-        prefixes = []
 
         try:
             # Delete left-over transactions from a failed run before so they can reimported
@@ -134,29 +148,27 @@ def process_banktransfers(self, job: int, data: list) -> None:
 
             code_len = settings.ENTROPY['order_code']
             if job.event:
-                pattern = re.compile(job.event.slug.upper() + "[ \-_]*([A-Z0-9]{%s})" % code_len)
+                events = {job.event.slug.upper(): job.event}
+                pattern = re.compile("(" + re.escape(job.event.slug.upper()) + ")[ \-_]*([A-Z0-9]{%s})" % code_len)
             else:
-                if not prefixes:
-                    prefixes = [e.slug.upper().replace(".", r"\.").replace("-", r"\-")
-                                for e in job.organizer.events.all()]
+                events = {e.slug.upper(): e for e in job.organizer.events.all()}
+                prefixes = [slug.replace(".", r"\.").replace("-", r"\-") for slug in events]
                 pattern = re.compile("(%s)[ \-_]*([A-Z0-9]{%s})" % ("|".join(prefixes), code_len))
 
+            matched = defaultdict(list)
+            nomatch = []
             for trans in transactions:
                 match = pattern.search(trans.reference.replace(" ", "").replace("\n", "").upper())
-
-                if match:
-                    if job.event:
-                        code = match.group(1)
-                        with transaction.atomic():
-                            _handle_transaction(trans, code, event=job.event)
-                    else:
-                        slug = match.group(1)
-                        code = match.group(2)
-                        with transaction.atomic():
-                            _handle_transaction(trans, code, organizer=job.organizer, slug=slug)
+                # Without any events, the pattern degenerates to matching any code without a prefix
+                event = events.get(match.group(1)) if match else None
+                if event:
+                    matched[event].append((trans, match.group(2)))
                 else:
-                    trans.state = BankTransaction.STATE_NOMATCH
-                    trans.save()
+                    nomatch.append(trans.pk)
+            BankTransaction.objects.filter(pk__in=nomatch).update(state=BankTransaction.STATE_NOMATCH)
+
+            for event, event_transactions in matched.items():
+                _match_transactions(event, event_transactions)
         except LockTimeoutException:
             try:
                 self.retry()
@@ -1,11 +1,12 @@
 import json
 import logging
 import urllib.parse
+from datetime import timedelta
 
 import dateutil.parser
 from django.contrib import messages
 from django.core.exceptions import ValidationError
-from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.db.models import Max, OuterRef, Q, Subquery
 from django.http import (
     HttpResponseForbidden, HttpResponseNotFound, JsonResponse,
 )
@@ -21,8 +22,10 @@ from django.views.generic import TemplateView, View
 from pretix.base.models import Checkin, Event, Order, OrderPosition
 from pretix.base.models.event import SubEvent
 from pretix.base.services.checkin import (
-    CheckInError, RequiredQuestionsError, perform_checkin,
+    CheckInError, RequiredQuestionsError, get_checkin_counters,
+    perform_checkin,
 )
+from pretix.base.services.cleanup import REVOKED_SECRET_RETENTION
 from pretix.control.permissions import EventPermissionRequiredMixin
 from pretix.helpers.urls import build_absolute_uri
 from pretix.multidomain.urlreverse import (
@@ -33,6 +36,7 @@ from pretix.plugins.pretixdroid.models import AppConfiguration
 
 logger = logging.getLogger('pretix.plugins.pretixdroid')
 API_VERSION = 3
+SYNC_OVERLAP = timedelta(seconds=30)
 
 
 class ConfigCodeView(EventPermissionRequiredMixin, TemplateView):
@@ -316,10 +320,46 @@ class ApiSearchView(ApiView):
 
 
 class ApiDownloadView(ApiView):
+    """
+    Returns all tickets on the check-in list or, if the ``since`` parameter is set to the
+    ``cursor`` value of an earlier response, only the tickets that changed since then together
+    with the secrets of tickets that are no longer valid.
+    """
+
+    def _get_queryset(self):
+        qs = OrderPosition.objects.filter(
+            order__event=self.event,
+            order__status__in=[Order.STATUS_PAID] + ([Order.STATUS_PENDING] if self.config.list.include_pending else
+                                                     []),
+            subevent=self.config.list.subevent
+        )
+
+        if not self.config.list.all_products:
+            qs = qs.filter(item__in=self.config.list.limit_products.values_list('id', flat=True))
+
+        if not self.config.all_items:
+            qs = qs.filter(item__in=self.config.items.all())
+        return qs
+
+    def _get_since(self, cursor):
+        try:
+            since = dateutil.parser.parse(cursor)
+        except (ValueError, OverflowError):
+            return None
+        if since.tzinfo is None or since < now() - REVOKED_SECRET_RETENTION:
+            # Tombstones older than the retention period might already be gone, so the client
+            # needs a full download.
+            return None
+        # Changes committed by transactions that started before the last download, but finished
+        # after it, carry a timestamp slightly before the cursor. We therefore look back a bit.
+        return since - SYNC_OVERLAP
+
     def get(self, request, **kwargs):
         response = {
-            'version': API_VERSION
+            'version': API_VERSION,
+            'cursor': now().isoformat(),
         }
+        since = self._get_since(request.GET['since']) if request.GET.get('since') else None
 
         cqs = Checkin.objects.filter(
             position_id=OuterRef('pk'),
@@ -328,24 +368,31 @@ class ApiDownloadView(ApiView):
             m=Max('datetime')
         ).values('m')
 
-        qs = OrderPosition.objects.filter(
-            order__event=self.event,
-            order__status__in=[Order.STATUS_PAID] + ([Order.STATUS_PENDING] if self.config.list.include_pending else
-                                                     []),
-            subevent=self.config.list.subevent
-        ).annotate(
+        qs = self._get_queryset().annotate(
             last_checked_in=Subquery(cqs)
         ).select_related('item', 'variation', 'order', 'addon_to').prefetch_related(
             'addons', 'addons__item', 'addons__variation'
         )
 
-        if not self.config.list.all_products:
-            qs = qs.filter(item__in=self.config.list.limit_products.values_list('id', flat=True))
-
-        if not self.config.all_items:
-            qs = qs.filter(item__in=self.config.items.all())
-
-        response['results'] = [serialize_op(op, bool(op.last_checked_in), self.config.list) for op in qs]
+        if since:
+            positions = OrderPosition.objects.filter(order__event=self.event)
+            changed = set(positions.filter(last_modified__gt=since).values_list('id', flat=True))
+            changed |= set(positions.filter(order__last_modified__gt=since).values_list('id', flat=True))
+            changed |= set(Checkin.objects.filter(
+                list=self.config.list, last_modified__gt=since
+            ).values_list('position_id', flat=True))
+
+            results = [serialize_op(op, bool(op.last_checked_in), self.config.list) for op in qs.filter(id__in=changed)]
+            valid = {r['secret'] for r in results}
+            removed = set(positions.filter(id__in=changed).values_list('secret', flat=True))
+            removed |= set(self.event.revoked_secrets.filter(created__gt=since).values_list('secret', flat=True))
+
+            response['full'] = False
+            response['results'] = results
+            response['removed'] = sorted(removed - valid)
+        else:
+            response['full'] = True
+            response['results'] = [serialize_op(op, bool(op.last_checked_in), self.config.list) for op in qs]
 
         questions = self.event.questions.filter(ask_during_checkin=True).prefetch_related('items', 'options')
         response['questions'] = [serialize_question(q, items=True) for q in questions]
@@ -354,21 +401,11 @@ class ApiDownloadView(ApiView):
 
 class ApiStatusView(ApiView):
     def get(self, request, **kwargs):
+        counters = get_checkin_counters(self.config.list)
+        subevent_id = self.subevent.pk if self.subevent else None
 
-        cqs = Checkin.objects.filter(
-            position__order__event=self.event, position__subevent=self.subevent,
-            position__order__status__in=[Order.STATUS_PAID] + ([Order.STATUS_PENDING] if
-                                                               self.config.list.include_pending else []),
-            list=self.config.list
-        )
-        pqs = OrderPosition.objects.filter(
-            order__event=self.event,
-            order__status__in=[Order.STATUS_PAID] + ([Order.STATUS_PENDING] if self.config.list.include_pending else
-                                                     []),
-            subevent=self.subevent,
-        )
-        if not self.config.list.all_products:
-            pqs = pqs.filter(item__in=self.config.list.limit_products.values_list('id', flat=True))
+        def count(item_id=None, variation_id=None):
+            return counters.get((subevent_id, item_id, variation_id), (0, 0))
 
         ev = self.subevent or self.event
         response = {
@@ -387,25 +424,8 @@ class ApiStatusView(ApiView):
                 'timezone': self.event.settings.timezone,
                 'url': event_absolute_uri(self.event, 'presale:event.index')
             },
-            'checkins': cqs.count(),
-            'total': pqs.count()
-        }
-
-        op_by_item = {
-            p['item']: p['cnt']
-            for p in pqs.order_by().values('item').annotate(cnt=Count('id'))
-        }
-        op_by_variation = {
-            p['variation']: p['cnt']
-            for p in pqs.order_by().values('variation').annotate(cnt=Count('id'))
-        }
-        c_by_item = {
-            p['position__item']: p['cnt']
-            for p in cqs.order_by().values('position__item').annotate(cnt=Count('id'))
-        }
-        c_by_variation = {
-            p['position__variation']: p['cnt']
-            for p in cqs.order_by().values('position__variation').annotate(cnt=Count('id'))
+            'checkins': count()[1],
+            'total': count()[0]
         }
 
         response['items'] = []
@@ -414,16 +434,16 @@ class ApiStatusView(ApiView):
                 'id': item.pk,
                 'name': str(item),
                 'admission': item.admission,
-                'checkins': c_by_item.get(item.pk, 0),
-                'total': op_by_item.get(item.pk, 0),
+                'checkins': count(item.pk)[1],
+                'total': count(item.pk)[0],
                 'variations': []
             }
             for var in item.variations.all():
                 i['variations'].append({
                     'id': var.pk,
                     'name': str(var),
-                    'checkins': c_by_variation.get(var.pk, 0),
-                    'total': op_by_variation.get(var.pk, 0),
+                    'checkins': count(item.pk, var.pk)[1],
+                    'total': count(item.pk, var.pk)[0],
                 })
             response['items'].append(i)
 
@@ -1,63 +1,83 @@
 import pytz
+from django.conf import settings
 from django.utils.formats import date_format
 from i18nfield.strings import LazyI18nString
 
 from pretix.base.i18n import language
 from pretix.base.models import Event, InvoiceAddress, Order, User
 from pretix.base.services.async import ProfiledTask
-from pretix.base.services.mail import SendMailException, mail
+from pretix.base.services.mail import (
+    INVALID_ADDRESS, mail_send_batch, render_message,
+)
 from pretix.celery_app import app
 from pretix.multidomain.urlreverse import build_absolute_uri
 
+# Number of emails that are sent over the same connection to the mail server
+SEND_BATCH_SIZE = 100
+
 
 @app.task(base=ProfiledTask)
 def send_mails(event: int, user: int, subject: dict, message: dict, orders: list) -> None:
-    failures = []
+    orders = sorted(orders)
+    batches = [orders[i:i + SEND_BATCH_SIZE] for i in range(0, len(orders), SEND_BATCH_SIZE)]
+    for batch in batches:
+        if settings.HAS_CELERY:
+            # Batches are independent of each other, so multiple workers can send them in parallel
+            send_mail_batch.apply_async(args=(event, user, subject, message, batch))
+        else:
+            send_mail_batch(event, user, subject, message, batch)
+
+
+@app.task(base=ProfiledTask)
+def send_mail_batch(event: int, user: int, subject: dict, message: dict, orders: list) -> list:
     event = Event.objects.get(pk=event)
     user = User.objects.get(pk=user) if user else None
-    orders = Order.objects.filter(pk__in=orders)
+    orders = Order.objects.filter(pk__in=orders).select_related('invoice_address')
     subject = LazyI18nString(subject)
     message = LazyI18nString(message)
     tz = pytz.timezone(event.settings.timezone)
 
+    rendered = []
+    static_cache = {}
     for o in orders:
+        if not o.email or o.email == INVALID_ADDRESS:
+            continue
         try:
             invoice_name = o.invoice_address.name
             invoice_company = o.invoice_address.company
         except InvoiceAddress.DoesNotExist:
             invoice_name = ""
             invoice_company = ""
-        try:
-            with language(o.locale):
-                email_context = {
-                    'event': o.event,
-                    'code': o.code,
-                    'date': date_format(o.datetime.astimezone(tz), 'SHORT_DATETIME_FORMAT'),
-                    'expire_date': date_format(o.expires, 'SHORT_DATE_FORMAT'),
-                    'url': build_absolute_uri(event, 'presale:event.order', kwargs={
-                        'order': o.code,
-                        'secret': o.secret
-                    }),
-                    'invoice_name': invoice_name,
-                    'invoice_company': invoice_company,
-                }
-                mail(
-                    o.email,
-                    subject,
-                    message,
-                    email_context,
-                    event,
-                    locale=o.locale,
-                    order=o
-                )
-                o.log_action(
-                    'pretix.plugins.sendmail.order.email.sent',
-                    user=user,
-                    data={
-                        'subject': subject.localize(o.locale),
-                        'message': message.localize(o.locale).format_map(email_context),
-                        'recipient': o.email
-                    }
-                )
-        except SendMailException:
-            failures.append(o.email)
+        with language(o.locale):
+            email_context = {
+                'event': event,
+                'code': o.code,
+                'date': date_format(o.datetime.astimezone(tz), 'SHORT_DATETIME_FORMAT'),
+                'expire_date': date_format(o.expires, 'SHORT_DATE_FORMAT'),
+                'url': build_absolute_uri(event, 'presale:event.order', kwargs={
+                    'order': o.code,
+                    'secret': o.secret
+                }),
+                'invoice_name': invoice_name,
+                'invoice_company': invoice_company,
+            }
+            msg = render_message(o.email, subject, message, email_context, event, o,
+                                 static_cache=static_cache)
+        msg['order'] = o
+        rendered.append((o, email_context, msg))
+
+    failures = set(mail_send_batch(event, [msg for o, ctx, msg in rendered]))
+
+    for i, (o, email_context, msg) in enumerate(rendered):
+        if i in failures:
+            continue
+        o.log_action(
+            'pretix.plugins.sendmail.order.email.sent',
+            user=user,
+            data={
+                'subject': subject.localize(o.locale),
+                'message': message.localize(o.locale).format_map(email_context),
+                'recipient': o.email
+            }
+        )
+    return [rendered[i][0].pk for i in sorted(failures)]
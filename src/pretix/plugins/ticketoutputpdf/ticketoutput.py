@@ -4,18 +4,16 @@ from io import BytesIO
 
 from django.contrib.staticfiles import finders
 from django.core.files import File
-from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.http import HttpRequest
 from django.template.loader import get_template
 from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
-from PyPDF2 import PdfFileMerger
 from reportlab.pdfgen.canvas import Canvas
 
 from pretix.base.i18n import language
 from pretix.base.models import Order, OrderPosition
-from pretix.base.pdf import Renderer
+from pretix.base.pdf import Renderer, cached_background, merge_backgrounds
 from pretix.base.ticketoutput import BaseTicketOutput
 from pretix.plugins.ticketoutputpdf.models import (
     TicketLayout, TicketLayoutItem,
@@ -32,6 +30,7 @@ class PdfTicketOutput(BaseTicketOutput):
     def __init__(self, event, override_layout=None, override_background=None):
         self.override_layout = override_layout
         self.override_background = override_background
+        self._renderers = {}
         super().__init__(event)
 
     @cached_property
@@ -53,42 +52,47 @@ class PdfTicketOutput(BaseTicketOutput):
     def _register_fonts(self):
         Renderer._register_fonts()
 
+    def _get_renderer(self, layout: TicketLayout) -> Renderer:
+        # Layouts and backgrounds are read only once per output, no matter how many tickets use them
+        if layout.pk not in self._renderers:
+            objs = self.override_layout or json.loads(layout.layout) or self._legacy_layout()
+            self._renderers[layout.pk] = Renderer(self.event, objs, self._get_background(layout))
+        return self._renderers[layout.pk]
+
     def _draw_page(self, layout: TicketLayout, canvas: Canvas, op: OrderPosition, order: Order):
-        objs = self.override_layout or json.loads(layout.layout) or self._legacy_layout()
-        Renderer(self.event, objs, None).draw_page(canvas, order, op)
+        self._get_renderer(layout).draw_page(canvas, order, op)
+
+    def _render_positions(self, positions, order: Order):
+        buffer = BytesIO()
+        p = self._create_canvas(buffer)
+        backgrounds = []
+        bg_pdfs = {}
+        for op in positions:
+            layout = self.layout_map.get(op.item_id, self.default_layout)
+            self._draw_page(layout, p, op, order)
+            if layout.pk not in bg_pdfs:
+                bg_pdfs[layout.pk] = self._get_renderer(layout).background_pdf()
+            backgrounds.append(bg_pdfs[layout.pk])
+        p.save()
+        return merge_backgrounds(buffer, backgrounds, _('Ticket'))
 
     def generate_order(self, order: Order):
-        merger = PdfFileMerger()
+        positions = []
+        for op in order.positions.select_related('item', 'variation', 'subevent'):
+            if op.addon_to_id and not self.event.settings.ticket_download_addons:
+                continue
+            if not op.item.admission and not self.event.settings.ticket_download_nonadm:
+                continue
+            positions.append(op)
+
         with language(order.locale):
-            for op in order.positions.all():
-                if op.addon_to_id and not self.event.settings.ticket_download_addons:
-                    continue
-                if not op.item.admission and not self.event.settings.ticket_download_nonadm:
-                    continue
-
-                buffer = BytesIO()
-                p = self._create_canvas(buffer)
-                layout = self.layout_map.get(op.item_id, self.default_layout)
-                self._draw_page(layout, p, op, order)
-                p.save()
-                outbuffer = self._render_with_background(layout, buffer)
-                merger.append(ContentFile(outbuffer.read()))
-
-        outbuffer = BytesIO()
-        merger.write(outbuffer)
-        merger.close()
-        outbuffer.seek(0)
+            outbuffer = self._render_positions(positions, order)
         return 'order%s%s.pdf' % (self.event.slug, order.code), 'application/pdf', outbuffer.read()
 
     def generate(self, op):
-        buffer = BytesIO()
-        p = self._create_canvas(buffer)
         order = op.order
-        layout = self.layout_map.get(op.item_id, self.default_layout)
         with language(order.locale):
-            self._draw_page(layout, p, op, order)
-        p.save()
-        outbuffer = self._render_with_background(layout, buffer)
+            outbuffer = self._render_positions([op], order)
         return 'order%s%s.pdf' % (self.event.slug, order.code), 'application/pdf', outbuffer.read()
 
     def _create_canvas(self, buffer):
@@ -104,15 +108,19 @@ class PdfTicketOutput(BaseTicketOutput):
     def _get_default_background(self):
         return open(finders.find('pretixpresale/pdf/ticket_default_a4.pdf'), "rb")
 
-    def _render_with_background(self, layout: TicketLayout, buffer, title=_('Ticket')):
+    def _get_background(self, layout: TicketLayout):
         bg_file = layout.background
         if self.override_background:
-            bgf = default_storage.open(self.override_background.name, "rb")
+            name = self.override_background.name
         elif isinstance(bg_file, File) and bg_file.name:
-            bgf = default_storage.open(bg_file.name, "rb")
+            name = bg_file.name
         else:
-            bgf = self._get_default_background()
-        return Renderer(self.event, None, bgf).render_background(buffer, title)
+            return cached_background(('default', self.identifier), self._get_default_background)
+        # Uploaded files never change their content without getting a new name
+        return cached_background(('storage', name), lambda: default_storage.open(name, "rb"))
+
+    def _render_with_background(self, layout: TicketLayout, buffer, title=_('Ticket')):
+        return self._get_renderer(layout).render_background(buffer, title)
 
     def settings_content_render(self, request: HttpRequest) -> str:
         """
@@ -13,6 +13,7 @@ from django.views.generic.base import TemplateResponseMixin
 
 from pretix.base.models import Order
 from pretix.base.models.orders import InvoiceAddress
+from pretix.base.services.admission import leave_queue
 from pretix.base.services.cart import (
     get_fees, set_cart_addons, update_tax_rates,
 )
@@ -598,6 +599,7 @@ class ConfirmStep(CartMixin, AsyncAction, TemplateFlowStep):
                        translation.get_language(), self.invoice_address.pk, meta_info)
 
     def get_success_message(self, value):
+        leave_queue(self.request.event, get_or_create_cart_id(self.request))
         create_empty_cart_id(self.request)
         return None
 
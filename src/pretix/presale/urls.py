@@ -7,6 +7,7 @@ import pretix.presale.views.event
 import pretix.presale.views.locale
 import pretix.presale.views.order
 import pretix.presale.views.organizer
+import pretix.presale.views.queue
 import pretix.presale.views.robots
 import pretix.presale.views.user
 import pretix.presale.views.waiting
@@ -28,6 +29,8 @@ frame_wrapped_urls = [
         name='event.redeem'),
     url(r'^(?P<subevent>[0-9]+)/$', pretix.presale.views.event.EventIndex.as_view(), name='event.index'),
     url(r'^waitinglist', pretix.presale.views.waiting.WaitingView.as_view(), name='event.waitinglist'),
+    url(r'^queue/$', pretix.presale.views.queue.QueueView.as_view(), name='event.queue'),
+    url(r'^queue/status$', pretix.presale.views.queue.QueueStatus.as_view(), name='event.queue.status'),
     url(r'^$', pretix.presale.views.event.EventIndex.as_view(), name='event.index'),
 ]
 event_patterns = [
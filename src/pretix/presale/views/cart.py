@@ -18,6 +18,7 @@ from django.views.generic import TemplateView, View
 from pretix.base.models import (
     CartPosition, InvoiceAddress, QuestionAnswer, SubEvent, Voucher,
 )
+from pretix.base.services.admission import check_admission
 from pretix.base.services.cart import (
     CartError, add_items_to_cart, clear_cart, remove_cart_position,
 )
@@ -341,10 +342,24 @@ class CartAdd(EventViewMixin, CartActionMixin, AsyncAction, View):
             'has_cart': CartPosition.objects.filter(cart_id=cart_id, event=self.request.event).exists()
         }
 
+    def get_queue_url(self):
+        kwargs = {}
+        if 'cart_namespace' in self.kwargs:
+            kwargs['cart_namespace'] = self.kwargs['cart_namespace']
+        return eventreverse(self.request.event, 'presale:event.queue', kwargs=kwargs)
+
     def post(self, request, *args, **kwargs):
         items = self._items_from_post_data()
         if items:
-            return self.do(self.request.event.id, items, get_or_create_cart_id(self.request), translation.get_language(),
+            cart_id = get_or_create_cart_id(self.request)
+            admitted, position = check_admission(self.request.event, cart_id)
+            if not admitted:
+                if 'ajax' in self.request.GET or 'ajax' in self.request.POST:
+                    return JsonResponse({
+                        'redirect': self.get_queue_url()
+                    })
+                return redirect(self.get_queue_url())
+            return self.do(self.request.event.id, items, cart_id, translation.get_language(),
                            self.invoice_address.pk)
         else:
             if 'ajax' in self.request.GET or 'ajax' in self.request.POST:
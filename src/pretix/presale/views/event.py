@@ -85,6 +85,12 @@ def get_grouped_items(event, subevent=None, voucher=None):
     external_quota_cache = event.cache.get('item_quota_cache')
     quota_cache = external_quota_cache or {}
 
+    if not external_quota_cache:
+        # Calculate the availability of all quotas at once instead of one by one
+        quotas = [q for item in items for q in item._subevent_quotas]
+        quotas += [q for item in items for var in item.available_variations for q in var._subevent_quotas]
+        quota_cache.update(Quota.objects.bulk_availability(quotas))
+
     if subevent:
         item_price_override = subevent.item_price_overrides
         var_price_override = subevent.var_price_overrides
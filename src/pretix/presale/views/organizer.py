@@ -16,8 +16,9 @@ from pytz import UTC
 
 from pretix.base.i18n import language
 from pretix.base.models import (
-    Event, EventMetaValue, SubEvent, SubEventMetaValue,
+    CalendarEntry, Event, EventMetaValue, SubEvent, SubEventMetaValue,
 )
+from pretix.base.services.calendarindex import calendar_index_built
 from pretix.helpers.daterange import daterange
 from pretix.multidomain.urlreverse import eventreverse
 from pretix.presale.ical import get_ical
@@ -83,6 +84,35 @@ def filter_qs_by_attr(qs, request):
     return qs
 
 
+def filter_entries_by_attr(qs, request):
+    """
+    Applies the same filters as :py:func:`filter_qs_by_attr` to a queryset of calendar entries.
+    """
+    if not any(k.startswith("attr[") and k.endswith("]") for k in request.GET):
+        return qs
+    events = filter_qs_by_attr(request.organizer.events.all(), request)
+    subevents = filter_qs_by_attr(SubEvent.objects.filter(event__organizer=request.organizer), request)
+    return qs.filter(Q(subevent__isnull=True, event__in=events) | Q(subevent__in=subevents))
+
+
+def fetch_calendar_entries(qs):
+    """
+    Evaluates a queryset of calendar entries together with their events and subevents. All entries
+    of the same event share one event object, so that its settings are only loaded once.
+    """
+    entries = list(qs.select_related(
+        'event', 'event__organizer', 'subevent'
+    ).prefetch_related(
+        'event___settings_objects', 'event__organizer___settings_objects'
+    ))
+    events = {}
+    for entry in entries:
+        entry.event = events.setdefault(entry.event_id, entry.event)
+        if entry.subevent:
+            entry.subevent.event = entry.event
+    return entries
+
+
 class OrganizerIndex(OrganizerViewMixin, ListView):
     model = Event
     context_object_name = 'events'
@@ -133,9 +163,14 @@ class OrganizerIndex(OrganizerViewMixin, ListView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
+        timezones = dict(CalendarEntry.objects.filter(
+            event__in=[e.pk for e in ctx['events'] if e.has_subevents]
+        ).order_by().values_list('event', 'timezone').distinct())
         for event in ctx['events']:
-            tz = pytz.timezone(event.cache.get_or_set('timezone', lambda: event.settings.timezone))
             if event.has_subevents:
+                tz = pytz.timezone(
+                    timezones.get(event.pk) or event.cache.get_or_set('timezone', lambda: event.settings.timezone)
+                )
                 event.daterange = daterange(
                     event.min_from.astimezone(tz),
                     (event.max_fromto or event.max_to or event.max_from).astimezone(tz)
@@ -258,37 +293,50 @@ class CalendarView(OrganizerViewMixin, TemplateView):
                 self.year = now().year
                 self.month = now().month
         else:
-            next_ev = filter_qs_by_attr(Event.objects.filter(
-                organizer=self.request.organizer,
-                live=True,
-                is_public=True,
-                date_from__gte=now(),
-                has_subevents=False
-            ), self.request).order_by('date_from').first()
-            next_sev = filter_qs_by_attr(SubEvent.objects.filter(
-                event__organizer=self.request.organizer,
-                event__is_public=True,
-                event__live=True,
-                active=True,
-                date_from__gte=now()
-            ), self.request).select_related('event').order_by('date_from').first()
-
-            datetime_from = None
-            if (next_ev and next_sev and next_sev.date_from < next_ev.date_from) or (next_sev and not next_ev):
-                datetime_from = next_sev.date_from
-                next_ev = next_sev.event
-            elif next_ev:
-                datetime_from = next_ev.date_from
-
-            if datetime_from:
-                tz = pytz.timezone(next_ev.settings.timezone)
-                self.year = datetime_from.astimezone(tz).year
-                self.month = datetime_from.astimezone(tz).month
+            next_date = self._next_date() if calendar_index_built() else self._next_date_from_events()
+            if next_date:
+                self.year = next_date.year
+                self.month = next_date.month
             else:
                 self.year = now().year
                 self.month = now().month
         return super().get(request, *args, **kwargs)
 
+    def _next_date(self):
+        next_entry = filter_entries_by_attr(CalendarEntry.objects.filter(
+            organizer=self.request.organizer,
+            continued=False,
+            datetime_from__gte=now()
+        ), self.request).order_by('datetime_from').first()
+        return next_entry.day if next_entry else None
+
+    def _next_date_from_events(self):
+        next_ev = filter_qs_by_attr(Event.objects.filter(
+            organizer=self.request.organizer,
+            live=True,
+            is_public=True,
+            date_from__gte=now(),
+            has_subevents=False
+        ), self.request).order_by('date_from').first()
+        next_sev = filter_qs_by_attr(SubEvent.objects.filter(
+            event__organizer=self.request.organizer,
+            event__is_public=True,
+            event__live=True,
+            active=True,
+            date_from__gte=now()
+        ), self.request).select_related('event').order_by('date_from').first()
+
+        datetime_from = None
+        if (next_ev and next_sev and next_sev.date_from < next_ev.date_from) or (next_sev and not next_ev):
+            datetime_from = next_sev.date_from
+            next_ev = next_sev.event
+        elif next_ev:
+            datetime_from = next_ev.date_from
+
+        if datetime_from:
+            tz = pytz.timezone(next_ev.settings.timezone)
+            return datetime_from.astimezone(tz).date()
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data()
 
@@ -309,6 +357,27 @@ class CalendarView(OrganizerViewMixin, TemplateView):
         return ctx
 
     def _events_by_day(self, before, after):
+        if not calendar_index_built():
+            return self._events_by_day_from_events(before, after)
+
+        ebd = defaultdict(list)
+        entries = fetch_calendar_entries(filter_entries_by_attr(CalendarEntry.objects.filter(
+            organizer=self.request.organizer,
+            day__gte=before.date(),
+            day__lte=after.date(),
+        ), self.request))
+        for entry in entries:
+            ebd[entry.day].append({
+                'event': entry.subevent or entry.event,
+                'continued': entry.continued,
+                'time': entry.time,
+                'url': entry.url,
+                'timezone': entry.timezone,
+            })
+        self._multiple_timezones = len({entry.timezone for entry in entries}) > 1
+        return ebd
+
+    def _events_by_day_from_events(self, before, after):
         ebd = defaultdict(list)
         timezones = set()
         add_events_for_days(self.request, self.request.organizer.events, before, after, ebd, timezones)
@@ -326,6 +395,28 @@ class CalendarView(OrganizerViewMixin, TemplateView):
 @method_decorator(cache_page(300), name='dispatch')
 class OrganizerIcalDownload(OrganizerViewMixin, View):
     def get(self, request, *args, **kwargs):
+        if calendar_index_built():
+            entries = fetch_calendar_entries(filter_entries_by_attr(CalendarEntry.objects.filter(
+                organizer=self.request.organizer,
+                continued=False
+            ), request))
+            events = [entry.subevent or entry.event for entry in entries]
+        else:
+            events = self._events_from_events(request)
+
+        if 'locale' in request.GET and request.GET.get('locale') in dict(settings.LANGUAGES):
+            with language(request.GET.get('locale')):
+                cal = get_ical(events)
+        else:
+            cal = get_ical(events)
+
+        resp = HttpResponse(cal.serialize(), content_type='text/calendar')
+        resp['Content-Disposition'] = 'attachment; filename="{}.ics"'.format(
+            request.organizer.slug
+        )
+        return resp
+
+    def _events_from_events(self, request):
         events = list(
             filter_qs_by_attr(
                 self.request.organizer.events.filter(is_public=True, live=True, has_subevents=False),
@@ -351,15 +442,4 @@ class OrganizerIcalDownload(OrganizerViewMixin, View):
                 'date_from'
             )
         )
-
-        if 'locale' in request.GET and request.GET.get('locale') in dict(settings.LANGUAGES):
-            with language(request.GET.get('locale')):
-                cal = get_ical(events)
-        else:
-            cal = get_ical(events)
-
-        resp = HttpResponse(cal.serialize(), content_type='text/calendar')
-        resp['Content-Disposition'] = 'attachment; filename="{}.ics"'.format(
-            request.organizer.slug
-        )
-        return resp
+        return events
@@ -0,0 +1,54 @@
+from django.http import JsonResponse
+from django.shortcuts import redirect
+from django.utils.decorators import method_decorator
+from django.views.generic import TemplateView, View
+
+from pretix.base.services.admission import check_admission
+from pretix.multidomain.urlreverse import eventreverse
+from pretix.presale.views import EventViewMixin, allow_frame_if_namespaced
+from pretix.presale.views.cart import get_or_create_cart_id
+from pretix.presale.views.robots import NoSearchIndexViewMixin
+
+
+class QueueMixin(EventViewMixin):
+
+    def get_status_url(self):
+        kwargs = {}
+        if 'cart_namespace' in self.kwargs:
+            kwargs['cart_namespace'] = self.kwargs['cart_namespace']
+        return eventreverse(self.request.event, 'presale:event.queue.status', kwargs=kwargs)
+
+    def check(self):
+        return check_admission(self.request.event, get_or_create_cart_id(self.request))
+
+
+@method_decorator(allow_frame_if_namespaced, 'dispatch')
+class QueueView(NoSearchIndexViewMixin, QueueMixin, TemplateView):
+    template_name = 'pretixpresale/event/queue.html'
+
+    def get(self, request, *args, **kwargs):
+        self.admitted, self.position = self.check()
+        if self.admitted:
+            return redirect(self.get_index_url())
+        return super().get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['position'] = self.position
+        ctx['status_url'] = self.get_status_url()
+        return ctx
+
+
+class QueueStatus(QueueMixin, View):
+    """
+    Lightweight endpoint polled by the queue page. It does not touch the database unless the
+    visitor does not have a cart ID yet.
+    """
+
+    def get(self, request, *args, **kwargs):
+        admitted, position = self.check()
+        return JsonResponse({
+            'admitted': admitted,
+            'position': position,
+            'redirect': self.get_index_url() if admitted else None,
+        })
@@ -88,6 +88,10 @@ PRETIX_REGISTRATION = config.getboolean('pretix', 'registration', fallback=True)
 PRETIX_PASSWORD_RESET = config.getboolean('pretix', 'password_reset', fallback=True)
 PRETIX_LONG_SESSIONS = config.getboolean('pretix', 'long_sessions', fallback=True)
 PRETIX_ADMIN_AUDIT_COMMENTS = config.getboolean('pretix', 'audit_comments', fallback=False)
+PRETIX_QUOTA_LEDGER = config.getboolean('pretix', 'quota_ledger', fallback=False)
+PRETIX_LOG_ARCHIVE_AFTER = config.getint('pretix', 'log_archive_days', fallback=0)
+PRETIX_QUOTA_LOCKING = config.getboolean('locking', 'quotas', fallback=False)
+PRETIX_LOCK_WAIT = config.getfloat('locking', 'wait', fallback=0)
 PRETIX_SESSION_TIMEOUT_RELATIVE = 3600 * 3
 PRETIX_SESSION_TIMEOUT_ABSOLUTE = 3600 * 12
 
@@ -137,12 +141,16 @@ EMAIL_HOST_PASSWORD = config.get('mail', 'password', fallback='')
 EMAIL_USE_TLS = config.getboolean('mail', 'tls', fallback=False)
 EMAIL_USE_SSL = config.getboolean('mail', 'ssl', fallback=False)
 EMAIL_SUBJECT_PREFIX = '[pretix] '
+MAIL_RATE_LIMIT = config.getfloat('mail', 'ratelimit', fallback=0)
 
 ADMINS = [('Admin', n) for n in config.get('mail', 'admins', fallback='').split(",") if n]
 
 METRICS_ENABLED = config.getboolean('metrics', 'enabled', fallback=False)
 METRICS_USER = config.get('metrics', 'user', fallback="metrics")
 METRICS_PASSPHRASE = config.get('metrics', 'passphrase', fallback="")
+METRICS_FLUSH_INTERVAL = config.getfloat('metrics', 'flush_interval', fallback=5)
+# Fraction of requests and tasks of which the database queries are recorded
+METRICS_QUERY_SAMPLE_RATE = config.getfloat('metrics', 'query_sample_rate', fallback=0)
 
 CACHES = {
     'default': {
@@ -309,6 +317,9 @@ MIDDLEWARE = [
     'pretix.presale.middleware.EventMiddleware',
 ]
 
+if DEBUG:
+    MIDDLEWARE.insert(0, 'pretix.helpers.profile.middleware.QueryProfileMiddleware')
+
 try:
     import debug_toolbar  # noqa
     if DEBUG:
@@ -562,6 +573,7 @@ CELERY_TASK_ROUTES = ([
     ('pretix.base.services.cart.*', {'queue': 'checkout'}),
     ('pretix.base.services.orders.*', {'queue': 'checkout'}),
     ('pretix.base.services.mail.*', {'queue': 'mail'}),
+    ('pretix.plugins.sendmail.*', {'queue': 'mail'}),
     ('pretix.base.services.style.*', {'queue': 'background'}),
     ('pretix.base.services.update_check.*', {'queue': 'background'}),
     ('pretix.base.services.quotas.*', {'queue': 'background'}),
@@ -43,6 +43,9 @@ function async_task_check_callback(data, jqXHR, status) {
                                           'processed. If this takes longer than two minutes, please contact us or go ' +
                                           'back in your browser and try again.'));
     }
+    if (data.percentage) {
+        $("#loadingmodal p").append(" " + gettext('{percentage} % done').replace(/\{percentage\}/, data.percentage));
+    }
 }
 
 function async_task_check_error(jqXHR, textStatus, errorThrown) {
@@ -0,0 +1,41 @@
+/*global $ */
+var queue = {
+    _url: null,
+
+    check: function () {
+        "use strict";
+        $.ajax({
+            'type': 'GET',
+            'url': queue._url,
+            'dataType': 'json',
+            'success': queue.callback,
+            'error': function () {
+                window.setTimeout(queue.check, 15000);
+            }
+        });
+    },
+
+    callback: function (data) {
+        "use strict";
+        if (data.admitted) {
+            location.href = data.redirect;
+            return;
+        }
+        $("#queue-position").text(data.position);
+        window.setTimeout(queue.check, 5000);
+    },
+
+    init: function () {
+        "use strict";
+        queue._url = $("#queue-status").attr("data-status-url");
+        window.setTimeout(queue.check, 5000);
+    }
+};
+
+$(function () {
+    "use strict";
+
+    if ($("#queue-status").length) {
+        queue.init();
+    }
+});
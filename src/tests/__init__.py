@@ -1,6 +1,8 @@
 from django.db import DEFAULT_DB_ALIAS, connections
 from django.test.utils import CaptureQueriesContext
 
+from pretix.helpers.profile.queries import QueryProfile
+
 
 class _AssertNumQueriesContext(CaptureQueriesContext):
     # Inspired by /django/test/testcases.py
@@ -32,3 +34,27 @@ def assert_num_queries(num, func=None, *args, **kwargs):
 
     with context:
         func(*args, **kwargs)
+
+
+class _AssertQueryBudgetContext(QueryProfile):
+    def __init__(self, num, using):
+        self.num = num
+        super().__init__(using)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        assert self.count <= self.num, "%d queries executed, at most %d expected\nRepeated queries were:\n%s" % (
+            self.count, self.num,
+            '\n'.join(
+                '{}x {}'.format(count, fp) for fp, count in self.repeated(threshold=2)
+            )
+        )
+
+
+def assert_query_budget(num, using=DEFAULT_DB_ALIAS):
+    """
+    Asserts that the code within the block makes at most ``num`` database queries.
+    """
+    return _AssertQueryBudgetContext(num, using)
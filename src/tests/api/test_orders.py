@@ -9,6 +9,7 @@ from django.core import mail as djmail
 from django.utils.timezone import now
 from django_countries.fields import Country
 from pytz import UTC
+from tests import assert_query_budget
 
 from pretix.base.models import InvoiceAddress, Order, OrderPosition, Question
 from pretix.base.models.orders import CartPosition, OrderFee
@@ -202,6 +203,22 @@ def test_order_list(token_client, organizer, event, order, item, taxrule, questi
     assert [] == resp.data['results']
 
 
+@pytest.mark.django_db
+def test_order_list_query_budget(token_client, organizer, event, order, item, question):
+    for i in range(10):
+        o = Order.objects.create(
+            event=event, email='dummy@dummy.test', status=Order.STATUS_PENDING,
+            expires=now() + datetime.timedelta(days=10), total=23, payment_provider='banktransfer'
+        )
+        op = OrderPosition.objects.create(order=o, item=item, price=Decimal("23"))
+        op.answers.create(question=question, answer='S')
+
+    with assert_query_budget(15):
+        resp = token_client.get('/api/v1/organizers/{}/events/{}/orders/'.format(organizer.slug, event.slug))
+    assert resp.status_code == 200
+    assert len(resp.data['results']) == 11
+
+
 @pytest.mark.django_db
 def test_order_detail(token_client, organizer, event, order, item, taxrule, question):
     res = dict(TEST_ORDER_RES)
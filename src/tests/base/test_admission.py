@@ -0,0 +1,41 @@
+import time
+
+from pretix.base.services import admission
+from pretix.base.services.admission import LocalAdmissionBackend
+
+
+def test_admit_up_to_size():
+    b = LocalAdmissionBackend()
+    assert b.check(1, 'a', 2, 60) == (True, 0)
+    assert b.check(1, 'b', 2, 60) == (True, 0)
+    assert b.check(1, 'c', 2, 60) == (False, 1)
+    assert b.check(1, 'd', 2, 60) == (False, 2)
+    assert b.check(1, 'c', 2, 60) == (False, 1)
+    assert b.check(1, 'a', 2, 60) == (True, 0)
+    assert b.check(2, 'e', 2, 60) == (True, 0)
+
+
+def test_leave_admits_next():
+    b = LocalAdmissionBackend()
+    b.check(1, 'a', 1, 60)
+    b.check(1, 'b', 1, 60)
+    b.check(1, 'c', 1, 60)
+    b.leave(1, 'a')
+    assert b.check(1, 'c', 1, 60) == (False, 1)
+    assert b.check(1, 'b', 1, 60) == (True, 0)
+
+
+def test_admission_expires():
+    b = LocalAdmissionBackend()
+    b.check(1, 'a', 1, 0.1)
+    assert b.check(1, 'b', 1, 0.1) == (False, 1)
+    time.sleep(0.15)
+    assert b.check(1, 'b', 1, 0.1) == (True, 0)
+
+
+def test_abandoned_queue_entries_dropped(monkeypatch):
+    b = LocalAdmissionBackend()
+    b.check(1, 'a', 1, 600)
+    b.check(1, 'b', 1, 600)
+    monkeypatch.setattr(admission, 'QUEUE_TIMEOUT', 0)
+    assert b.check(1, 'c', 1, 600) == (False, 1)
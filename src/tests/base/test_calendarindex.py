@@ -0,0 +1,105 @@
+from datetime import date, datetime, time
+
+import pytest
+from pytz import UTC
+
+from pretix.base.models import CalendarEntry, Event, Organizer
+from pretix.base.services.calendarindex import (
+    build_calendar_index, calendar_index_built, rebuild_calendar_index,
+    rebuild_organizer_calendar,
+)
+
+
+@pytest.fixture
+def event():
+    o = Organizer.objects.create(name='Dummy', slug='dummy')
+    return Event.objects.create(
+        organizer=o, name='Dummy', slug='dummy',
+        date_from=datetime(2018, 9, 1, 18, 0, tzinfo=UTC), date_to=datetime(2018, 9, 3, 18, 0, tzinfo=UTC),
+        live=True, is_public=True
+    )
+
+
+@pytest.mark.django_db
+def test_event_entries(event):
+    assert [(e.day, e.continued, e.time) for e in CalendarEntry.objects.all()] == [
+        (date(2018, 9, 1), False, time(18, 0)),
+        (date(2018, 9, 2), True, None),
+        (date(2018, 9, 3), True, None),
+    ]
+    assert CalendarEntry.objects.first().url == '/dummy/dummy/'
+
+    event.settings.show_date_to = False
+    event.settings.timezone = 'Europe/Berlin'
+    assert [(e.day, e.continued, e.time) for e in CalendarEntry.objects.all()] == [
+        (date(2018, 9, 1), False, time(20, 0)),
+    ]
+
+    event.settings.show_times = False
+    assert CalendarEntry.objects.first().time is None
+
+
+@pytest.mark.django_db
+def test_event_visibility(event):
+    event.is_public = False
+    event.save()
+    assert not CalendarEntry.objects.exists()
+
+    event.is_public = True
+    event.save()
+    assert CalendarEntry.objects.count() == 3
+
+    event.settings.timezone = 'Europe/Berlin'
+    event.delete()
+    assert not CalendarEntry.objects.exists()
+
+
+@pytest.mark.django_db
+def test_subevent_entries(event):
+    event.has_subevents = True
+    event.save()
+    assert not CalendarEntry.objects.exists()
+
+    se1 = event.subevents.create(name='SE1', date_from=datetime(2018, 10, 1, 10, 0, tzinfo=UTC), active=True)
+    se2 = event.subevents.create(name='SE2', date_from=datetime(2018, 10, 2, 10, 0, tzinfo=UTC), active=False)
+    entry = CalendarEntry.objects.get()
+    assert entry.subevent == se1
+    assert entry.url == '/dummy/dummy/{}/'.format(se1.pk)
+
+    se2.active = True
+    se2.save()
+    se1.date_from = datetime(2018, 10, 5, 10, 0, tzinfo=UTC)
+    se1.save()
+    assert [(e.subevent, e.day) for e in CalendarEntry.objects.all()] == [
+        (se2, date(2018, 10, 2)),
+        (se1, date(2018, 10, 5)),
+    ]
+
+    se2.delete()
+    assert CalendarEntry.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_organizer_settings(event):
+    event.settings.show_date_to = False
+    event.organizer.settings.timezone = 'America/New_York'
+    assert CalendarEntry.objects.get().time == time(14, 0)
+
+    CalendarEntry.objects.all().delete()
+    rebuild_organizer_calendar(event.organizer)
+    assert CalendarEntry.objects.get().timezone == 'America/New_York'
+
+
+@pytest.mark.django_db
+def test_index_built_once(event, monkeypatch):
+    queued = []
+    monkeypatch.setattr(rebuild_calendar_index, 'apply_async', lambda: queued.append(True))
+    build_calendar_index(None)
+    build_calendar_index(None)
+    assert len(queued) == 1
+    assert not calendar_index_built()
+
+    CalendarEntry.objects.all().delete()
+    rebuild_calendar_index()
+    assert calendar_index_built()
+    assert CalendarEntry.objects.count() == 3
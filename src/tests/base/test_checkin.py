@@ -0,0 +1,142 @@
+from collections import defaultdict
+from datetime import timedelta
+
+import pytest
+from django.utils.timezone import now
+
+from pretix.base.models import (
+    Checkin, CheckinListCounter, Event, Item, ItemVariation, Order,
+    OrderPosition, Organizer,
+)
+from pretix.base.services.checkin import (
+    get_checkin_counters, perform_checkin, rebuild_checkin_counters,
+)
+
+
+@pytest.fixture
+def env():
+    o = Organizer.objects.create(name='Dummy', slug='dummy')
+    event = Event.objects.create(
+        organizer=o, name='Dummy', slug='dummy',
+        date_from=now(), plugins='pretix.plugins.banktransfer'
+    )
+    shirt = Item.objects.create(event=event, name='T-Shirt', default_price=12)
+    shirt_red = ItemVariation.objects.create(item=shirt, default_price=14, value="Red")
+    ticket = Item.objects.create(event=event, name='Ticket', default_price=23)
+    order = Order.objects.create(
+        code='FOO', event=event, status=Order.STATUS_PAID,
+        datetime=now(), expires=now() + timedelta(days=10),
+        total=0, payment_provider='banktransfer'
+    )
+    OrderPosition.objects.create(order=order, item=shirt, variation=shirt_red, price=12)
+    OrderPosition.objects.create(order=order, item=ticket, price=23)
+    clist = event.checkin_lists.create(name="Default", all_products=True)
+    return event, order, shirt, shirt_red, ticket, clist
+
+
+def _counts(clist):
+    counters = {k: v for k, v in get_checkin_counters(clist).items() if v != (0, 0)}
+    clist.counters.all().delete()
+    # Compare to a fresh count
+    assert {k: v for k, v in get_checkin_counters(clist).items() if v != (0, 0)} == counters
+    return defaultdict(lambda: (0, 0), counters)
+
+
+@pytest.mark.django_db
+def test_counters_initial(env):
+    event, order, shirt, shirt_red, ticket, clist = env
+    counters = get_checkin_counters(clist)
+    assert counters[(None, None, None)] == (2, 0)
+    assert counters[(None, shirt.pk, None)] == (1, 0)
+    assert counters[(None, shirt.pk, shirt_red.pk)] == (1, 0)
+    assert counters[(None, ticket.pk, None)] == (1, 0)
+
+
+@pytest.mark.django_db
+def test_counters_checkin(env):
+    event, order, shirt, shirt_red, ticket, clist = env
+    get_checkin_counters(clist)
+    perform_checkin(order.positions.get(item=ticket), clist, {})
+    counters = _counts(clist)
+    assert counters[(None, None, None)] == (2, 1)
+    assert counters[(None, ticket.pk, None)] == (1, 1)
+
+    Checkin.objects.get().delete()
+    assert _counts(clist)[(None, ticket.pk, None)] == (1, 0)
+
+
+@pytest.mark.django_db
+def test_counters_order_status(env):
+    event, order, shirt, shirt_red, ticket, clist = env
+    perform_checkin(order.positions.get(item=ticket), clist, {})
+    get_checkin_counters(clist)
+
+    order.status = Order.STATUS_PENDING
+    order.save()
+    assert get_checkin_counters(clist)[(None, None, None)] == (0, 0)
+    assert _counts(clist)[(None, ticket.pk, None)] == (0, 0)
+
+    clist.include_pending = True
+    clist.save()
+    assert get_checkin_counters(clist)[(None, None, None)] == (2, 1)
+
+    order.status = Order.STATUS_CANCELED
+    order.save()
+    assert _counts(clist)[(None, None, None)] == (0, 0)
+
+
+@pytest.mark.django_db
+def test_counters_positions(env):
+    event, order, shirt, shirt_red, ticket, clist = env
+    get_checkin_counters(clist)
+
+    op = OrderPosition.objects.create(order=order, item=shirt, price=12)
+    counters = _counts(clist)
+    assert counters[(None, None, None)] == (3, 0)
+    assert counters[(None, shirt.pk, None)] == (2, 0)
+
+    op.item = ticket
+    op.save()
+    perform_checkin(op, clist, {})
+    counters = _counts(clist)
+    assert counters[(None, shirt.pk, None)] == (1, 0)
+    assert counters[(None, ticket.pk, None)] == (2, 1)
+
+    op.item = shirt
+    op.variation = shirt_red
+    op.save()
+    counters = _counts(clist)
+    assert counters[(None, ticket.pk, None)] == (1, 0)
+    assert counters[(None, shirt.pk, shirt_red.pk)] == (2, 1)
+
+    op.delete()
+    counters = _counts(clist)
+    assert counters[(None, None, None)] == (2, 0)
+    assert counters[(None, shirt.pk, shirt_red.pk)] == (1, 0)
+
+
+@pytest.mark.django_db
+def test_counters_limit_products(env):
+    event, order, shirt, shirt_red, ticket, clist = env
+    get_checkin_counters(clist)
+    clist.all_products = False
+    clist.save()
+    clist.limit_products.add(ticket)
+    assert not clist.counters.exists()
+    assert get_checkin_counters(clist)[(None, None, None)] == (1, 0)
+
+    OrderPosition.objects.create(order=order, item=shirt, price=12)
+    OrderPosition.objects.create(order=order, item=ticket, price=23)
+    assert _counts(clist)[(None, None, None)] == (2, 0)
+
+    clist.limit_products.remove(ticket)
+    assert not clist.counters.exists()
+
+
+@pytest.mark.django_db
+def test_counters_only_maintained_when_used(env):
+    event, order, shirt, shirt_red, ticket, clist = env
+    OrderPosition.objects.create(order=order, item=shirt, price=12)
+    assert not CheckinListCounter.objects.exists()
+    rebuild_checkin_counters(clist)
+    assert get_checkin_counters(clist)[(None, None, None)] == (3, 0)
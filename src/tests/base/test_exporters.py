@@ -0,0 +1,147 @@
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.utils.timezone import now
+
+from pretix.base.exporter import id_range_shards
+from pretix.base.exporters.json import JSONExporter
+from pretix.base.exporters.orderlist import OrderListExporter
+from pretix.base.models import (
+    CachedFile, Event, Order, OrderPosition, Organizer,
+)
+from pretix.base.models.orders import OrderFee
+from pretix.base.services.export import export
+
+
+@pytest.fixture
+def event():
+    o = Organizer.objects.create(name='Dummy', slug='dummy')
+    event = Event.objects.create(
+        organizer=o, name='Dummy', slug='dummy',
+        date_from=now(), plugins='pretix.plugins.banktransfer'
+    )
+    return event
+
+
+@pytest.fixture
+def item(event):
+    return event.items.create(name='Early-bird ticket', category=None, default_price=23, admission=True)
+
+
+@pytest.fixture
+def orders(event, item):
+    orders = []
+    for i in range(5):
+        o = Order.objects.create(
+            code='FOO{}'.format(i), event=event, email='dummy@dummy.test',
+            status=Order.STATUS_PENDING,
+            datetime=now() - timedelta(minutes=i), expires=now() + timedelta(days=10),
+            total=14, payment_provider='banktransfer', locale='en'
+        )
+        OrderPosition.objects.create(
+            order=o, item=item, variation=None, price=Decimal("14"), attendee_name="Peter"
+        )
+        orders.append(o)
+    return orders
+
+
+@pytest.mark.django_db
+def test_json_stream(event, item, orders, monkeypatch):
+    monkeypatch.setattr(JSONExporter, 'BATCH_SIZE', 2)
+    filename, filetype, chunks = JSONExporter(event).render_stream({})
+    assert filename == 'dummy_pretixdata.json'
+    assert filetype == 'application/json'
+    d = json.loads(''.join(chunks))
+    assert d['event']['slug'] == 'dummy'
+    assert [i['id'] for i in d['event']['items']] == [item.pk]
+    assert [o['code'] for o in d['event']['orders']] == ['FOO0', 'FOO1', 'FOO2', 'FOO3', 'FOO4']
+    assert d['event']['orders'][0]['positions'][0]['attendee_name'] == 'Peter'
+    assert d['event']['orders'][0]['total'] == '14.00'
+    assert d['event']['quotas'] == []
+
+
+@pytest.mark.django_db
+def test_export_writes_stream_to_file(event, orders):
+    cf = CachedFile.objects.create(expires=now() + timedelta(days=1))
+    export(event.pk, str(cf.id), 'json', {})
+    cf.refresh_from_db()
+    assert cf.filename == 'dummy_pretixdata.json'
+    assert cf.type == 'application/json'
+    d = json.loads(cf.file.read().decode())
+    assert d['event']['name'] == 'Dummy'
+    assert len(d['event']['orders']) == 5
+
+
+@pytest.mark.django_db
+def test_orderlist_batches(event, item, orders, monkeypatch):
+    monkeypatch.setattr(OrderListExporter, 'BATCH_SIZE', 2)
+    # Two orders at the same time must still both be exported exactly once
+    Order.objects.filter(pk=orders[2].pk).update(datetime=orders[1].datetime)
+    OrderFee.objects.create(order=orders[0], fee_type='payment', value=Decimal('1.00'),
+                            tax_rate=Decimal('0.00'), tax_value=Decimal('0.00'))
+    OrderFee.objects.create(order=orders[0], fee_type='shipping', value=Decimal('2.00'),
+                            tax_rate=Decimal('19.00'), tax_value=Decimal('0.32'))
+
+    filename, filetype, chunks = OrderListExporter(event).render_stream({'paid_only': False})
+    assert filename == 'dummy_orders.csv'
+    lines = b''.join(chunks).decode().strip().split('\r\n')
+    assert len(lines) == 6
+    codes = [line.split(',')[0].strip('"') for line in lines[1:]]
+    assert codes == ['FOO4', 'FOO3', 'FOO1', 'FOO2', 'FOO0']
+    assert '"3.00"' in lines[5]
+
+
+@pytest.mark.django_db
+def test_orderlist_paid_only(event, item, orders):
+    orders[0].status = Order.STATUS_PAID
+    orders[0].save()
+    filename, filetype, data = OrderListExporter(event).render({'paid_only': True})
+    lines = data.decode().strip().split('\r\n')
+    assert len(lines) == 2
+    assert lines[1].startswith('"FOO0"')
+
+
+def _render_sharded(ex, form_data):
+    files = []
+    for shard in ex.get_shards(form_data):
+        f = io.BytesIO()
+        for chunk in ex.render_shard(form_data, shard):
+            f.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        f.seek(0)
+        files.append(f)
+    filename, filetype, chunks = ex.merge_shards(form_data, files)
+    return b''.join(c.encode() if isinstance(c, str) else c for c in chunks)
+
+
+@pytest.mark.django_db
+def test_id_range_shards(event, orders):
+    shards = id_range_shards(event.orders.all(), 2)
+    assert len(shards) == 3
+    assert shards[0][0] == min(o.pk for o in orders)
+    assert shards[-1][1] == max(o.pk for o in orders)
+    assert sum(event.orders.filter(pk__gte=s[0], pk__lte=s[1]).count() for s in shards) == 5
+    assert id_range_shards(event.orders.all(), 5) is None
+
+
+@pytest.mark.django_db
+def test_json_sharded(event, orders, monkeypatch):
+    monkeypatch.setattr(JSONExporter, 'SHARD_SIZE', 2)
+    # Leave an empty shard
+    other = Event.objects.create(organizer=event.organizer, name='Other', slug='other', date_from=now())
+    Order.objects.filter(pk__in=[orders[2].pk, orders[3].pk]).update(event=other)
+    ex = JSONExporter(event)
+    d = json.loads(_render_sharded(ex, {}).decode())
+    assert d == json.loads(ex.render({})[2])
+
+
+@pytest.mark.django_db
+def test_orderlist_sharded(event, orders, monkeypatch):
+    monkeypatch.setattr(OrderListExporter, 'SHARD_SIZE', 2)
+    ex = OrderListExporter(event)
+    lines = _render_sharded(ex, {'paid_only': False}).decode().strip().split('\r\n')
+    expected = ex.render({'paid_only': False})[2].decode().strip().split('\r\n')
+    assert lines[0] == expected[0]
+    assert sorted(lines[1:]) == sorted(expected[1:])
@@ -9,8 +9,8 @@ from django.utils.timezone import now
 from django_countries.fields import Country
 
 from pretix.base.models import (
-    Event, Invoice, InvoiceAddress, Item, ItemVariation, Order, OrderPosition,
-    Organizer,
+    Event, Invoice, InvoiceAddress, InvoiceNumberSequence, Item, ItemVariation,
+    Order, OrderPosition, Organizer,
 )
 from pretix.base.models.orders import OrderFee
 from pretix.base.services.invoices import (
@@ -311,6 +311,32 @@ def test_invoice_numbers(env):
     assert inv3.number == '{}-{}-3'.format(event.slug.upper(), order.code)
 
 
+@pytest.mark.django_db
+def test_invoice_number_sequence(env):
+    event, order = env
+    assert generate_invoice(order).invoice_no == '00001'
+    seq = InvoiceNumberSequence.objects.get(organizer=event.organizer, prefix='DUMMY-')
+    assert seq.last_number == 1
+
+    # Numbers are given back if the invoice is not saved
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            Invoice.objects.create(order=order, event=event, organizer=event.organizer, date=now().date())
+            raise ValueError()
+    seq.refresh_from_db()
+    assert seq.last_number == 1
+
+    # Sequences are seeded from existing invoices if they do not exist yet
+    seq.delete()
+    assert generate_invoice(order).invoice_no == '00002'
+    assert InvoiceNumberSequence.objects.get(organizer=event.organizer, prefix='DUMMY-').last_number == 2
+
+    # The highest number is used, not the number of invoices
+    Invoice.objects.filter(invoice_no='00001').update(invoice_no='00007')
+    InvoiceNumberSequence.objects.all().delete()
+    assert generate_invoice(order).invoice_no == '00008'
+
+
 @pytest.mark.django_db
 def test_invoice_number_prefixes(env):
     event, order = env
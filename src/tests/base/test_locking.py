@@ -51,3 +51,117 @@ def test_lock_timeout_steal(event):
     locking.lock_event(ev)
     with pytest.raises(LockReleaseException):
         locking.release_event(event)
+
+
+@pytest.mark.django_db
+def test_quota_locking_disjoint_quotas(event, settings):
+    settings.PRETIX_QUOTA_LOCKING = True
+    q1 = event.quotas.create(name='Q1', size=10)
+    q2 = event.quotas.create(name='Q2', size=10)
+    with event.lock(quotas=[q1]):
+        ev = Event.objects.get(id=event.id)
+        with ev.lock(quotas=[q2]):
+            pass
+        with pytest.raises(LockTimeoutException):
+            with ev.lock(quotas=[q2, q1]):
+                pass
+        with pytest.raises(LockTimeoutException):
+            with ev.lock():
+                pass
+    ev = Event.objects.get(id=event.id)
+    with ev.lock(quotas=[q2, q1]):
+        pass
+
+
+@pytest.mark.django_db
+def test_quota_locking_excluded_by_event_lock(event, settings):
+    settings.PRETIX_QUOTA_LOCKING = True
+    q1 = event.quotas.create(name='Q1', size=10)
+    with event.lock():
+        ev = Event.objects.get(id=event.id)
+        with pytest.raises(LockTimeoutException):
+            with ev.lock(quotas=[q1]):
+                pass
+
+
+@pytest.mark.django_db
+def test_quota_locking_fallback(event, settings):
+    settings.PRETIX_QUOTA_LOCKING = True
+    with event.lock(quotas=[]):
+        ev = Event.objects.get(id=event.id)
+        with pytest.raises(LockTimeoutException):
+            with ev.lock():
+                pass
+
+
+@pytest.mark.django_db
+def test_quota_locking_disabled(event, settings):
+    settings.PRETIX_QUOTA_LOCKING = False
+    q1 = event.quotas.create(name='Q1', size=10)
+    q2 = event.quotas.create(name='Q2', size=10)
+    with event.lock(quotas=[q1]):
+        ev = Event.objects.get(id=event.id)
+        with pytest.raises(LockTimeoutException):
+            with ev.lock(quotas=[q2]):
+                pass
+
+
+@pytest.mark.django_db
+def test_quota_locking_reentrant(event, settings):
+    settings.PRETIX_QUOTA_LOCKING = True
+    q1 = event.quotas.create(name='Q1', size=10)
+    q2 = event.quotas.create(name='Q2', size=10)
+    with event.lock(quotas=[q1]):
+        with event.lock(quotas=[q1, q2]):
+            pass
+        ev = Event.objects.get(id=event.id)
+        with ev.lock(quotas=[q2]):
+            pass
+        with pytest.raises(LockTimeoutException):
+            with ev.lock(quotas=[q1]):
+                pass
+
+
+@pytest.mark.django_db
+def test_locking_wait(event, settings):
+    settings.PRETIX_LOCK_WAIT = 0.5
+    with event.lock():
+        ev = Event.objects.get(id=event.id)
+        t0 = time.perf_counter()
+        with pytest.raises(LockTimeoutException):
+            with ev.lock():
+                pass
+        assert time.perf_counter() - t0 >= 0.5
+
+
+class FakeMetric:
+    def __init__(self):
+        self.calls = []
+
+    def observe(self, amount, **kwargs):
+        self.calls.append((amount, kwargs))
+
+    def inc(self, amount=1, **kwargs):
+        self.calls.append((amount, kwargs))
+
+
+@pytest.mark.django_db
+def test_locking_metrics(event, settings, monkeypatch):
+    settings.METRICS_ENABLED = True
+    wait, hold, timeouts = FakeMetric(), FakeMetric(), FakeMetric()
+    monkeypatch.setattr(locking, 'pretix_lock_wait_seconds', wait)
+    monkeypatch.setattr(locking, 'pretix_lock_hold_seconds', hold)
+    monkeypatch.setattr(locking, 'pretix_lock_timeouts_total', timeouts)
+
+    with event.lock():
+        time.sleep(0.05)
+        ev = Event.objects.get(id=event.id)
+        with pytest.raises(LockTimeoutException):
+            with ev.lock():
+                pass
+
+    assert len(wait.calls) == 1
+    assert wait.calls[0][1] == {'event': 'dummy/dummy'}
+    assert len(hold.calls) == 1
+    assert hold.calls[0][0] >= 0.05
+    assert timeouts.calls == [(1, {'event': 'dummy/dummy'})]
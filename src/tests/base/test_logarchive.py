@@ -0,0 +1,143 @@
+from datetime import timedelta
+
+import pytest
+from django.db.models import Q
+from django.utils.timezone import now
+
+from pretix.base.models import (
+    Event, LogEntry, LogEntryArchive, Order, Organizer,
+)
+from pretix.base.services import logarchive
+
+
+@pytest.fixture
+def event():
+    o = Organizer.objects.create(name='Dummy', slug='dummy')
+    return Event.objects.create(
+        organizer=o, name='Dummy', slug='dummy',
+        date_from=now() - timedelta(days=100)
+    )
+
+
+@pytest.fixture
+def order(event):
+    return Order.objects.create(
+        code='FOO', event=event, email='dummy@dummy.test', status=Order.STATUS_PENDING,
+        datetime=now(), expires=now() + timedelta(days=10), total=0, payment_provider='banktransfer'
+    )
+
+
+def _log(obj, action, days_ago):
+    le = obj.log_action(action, data={'days': days_ago})
+    LogEntry.all.filter(pk=le.pk).update(datetime=now() - timedelta(days=days_ago))
+    return le.pk
+
+
+@pytest.mark.django_db
+def test_archive_and_read_back(monkeypatch, event, order):
+    monkeypatch.setattr(logarchive, 'ARCHIVE_CHUNK_SIZE', 2)
+    pks = [_log(order, 'pretix.event.order.comment', d) for d in (50, 40, 30)]
+    _log(event, 'pretix.event.changed', 35)
+    recent = _log(order, 'pretix.event.order.comment', 1)
+
+    assert logarchive.archive_logentries(event, now() - timedelta(days=20)) == 4
+    assert event.logentry_archives.count() == 2
+    assert list(order.all_logentries().values_list('pk', flat=True)) == [recent]
+
+    archived = order.archived_logentries()
+    assert [le.pk for le in archived] == list(reversed(pks))
+    assert archived[0].parsed_data == {'days': 30}
+    assert archived[0].content_object == order
+    assert [le.action_type for le in event.archived_logentries()] == ['pretix.event.changed']
+    assert len(logarchive.archived_logentries(event)) == 4
+
+
+@pytest.fixture
+def unpacked(monkeypatch):
+    archives = []
+    entries = LogEntryArchive.entries
+
+    def counting_entries(self):
+        archives.append(self.pk)
+        return entries(self)
+
+    monkeypatch.setattr(LogEntryArchive, 'entries', counting_entries)
+    return archives
+
+
+@pytest.mark.django_db
+def test_read_back_filtered(monkeypatch, event, order, unpacked):
+    monkeypatch.setattr(logarchive, 'ARCHIVE_CHUNK_SIZE', 2)
+    other = Order.objects.create(
+        code='BAR', event=event, email='dummy@dummy.test', status=Order.STATUS_PENDING,
+        datetime=now(), expires=now() + timedelta(days=10), total=0, payment_provider='banktransfer'
+    )
+    _log(order, 'pretix.event.order.comment', 50)
+    _log(order, 'pretix.event.order.email.order_placed', 45)
+    _log(other, 'pretix.event.order.comment', 40)
+    _log(other, 'pretix.event.order.comment', 35)
+    logarchive.archive_logentries(event)
+    assert event.logentry_archives.count() == 2
+
+    # Only the chunk containing the order is decompressed
+    assert len(order.archived_logentries()) == 2
+    assert len(unpacked) == 1
+
+    del unpacked[:]
+    archived = logarchive.ArchivedLogEntries(event, Q(action_type__contains='order.email'), obj=order)
+    assert archived.count() == 1
+    assert not unpacked
+    assert [le.action_type for le in archived] == ['pretix.event.order.email.order_placed']
+
+
+@pytest.mark.django_db
+def test_log_entry_list(monkeypatch, event, order, unpacked):
+    monkeypatch.setattr(logarchive, 'ARCHIVE_CHUNK_SIZE', 2)
+    archived_pks = [_log(order, 'pretix.event.order.comment', d) for d in (50, 40, 30, 25)]
+    logarchive.archive_logentries(event)
+    live_pks = [_log(order, 'pretix.event.order.comment', d) for d in (3, 2, 1)]
+
+    entries = logarchive.LogEntryList(order.all_logentries(), logarchive.ArchivedLogEntries(event, obj=order))
+    assert entries.count() == 7
+    assert not unpacked
+
+    # Pages within the live log entries do not read the archive
+    assert [le.pk for le in entries[0:3]] == list(reversed(live_pks))
+    assert not unpacked
+
+    # Pages at the border only read the chunks they need
+    assert [le.pk for le in entries[2:5]] == [live_pks[0], archived_pks[3], archived_pks[2]]
+    assert len(unpacked) == 1
+    assert [le.pk for le in entries[5:10]] == [archived_pks[1], archived_pks[0]]
+    assert len(unpacked) == 2
+
+
+@pytest.mark.django_db
+def test_restore(event, order):
+    pk = _log(order, 'pretix.event.order.comment', 50)
+    dt = LogEntry.objects.get(pk=pk).datetime
+    logarchive.archive_logentries(event)
+    assert not LogEntry.objects.exists()
+
+    assert logarchive.restore_logentries(event) == 1
+    assert not event.logentry_archives.exists()
+    le = LogEntry.objects.get()
+    assert le.pk == pk
+    assert le.datetime == dt
+    assert order.archived_logentries() == []
+
+
+@pytest.mark.django_db
+def test_archivable_events(event, order):
+    _log(order, 'pretix.event.order.comment', 50)
+    assert list(logarchive.archivable_events(30)) == [event]
+    assert list(logarchive.archivable_events(60)) == []
+
+    event.date_to = now() - timedelta(days=10)
+    event.save()
+    assert list(logarchive.archivable_events(30)) == []
+
+    logarchive.archive_logentries(event)
+    event.date_to = None
+    event.save()
+    assert list(logarchive.archivable_events(30)) == []
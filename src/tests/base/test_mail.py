@@ -1,13 +1,19 @@
 import os
+from datetime import timedelta
 
 import pytest
 from django.conf import settings
 from django.core import mail as djmail
 from django.utils.timezone import now
 from django.utils.translation import ugettext_lazy as _
+from i18nfield.strings import LazyI18nString
+from inlinestyler.utils import inline_css
+from lxml import etree
 
-from pretix.base.models import Event, Organizer, User
+from pretix.base.models import Event, Order, Organizer, User
+from pretix.base.services import mail as mail_service
 from pretix.base.services.mail import mail
+from pretix.base.templatetags.rich_text import markdown_compile
 
 
 @pytest.fixture
@@ -100,3 +106,62 @@ def test_sendmail_placeholder(env):
     assert len(djmail.outbox) == 1
     assert djmail.outbox[0].to == [user.email]
     assert djmail.outbox[0].subject == 'Dummy Test subject'
+
+
+@pytest.mark.django_db
+def test_send_mail_html_skeleton_cached(env, monkeypatch):
+    djmail.outbox = []
+    event, user, organizer = env
+    calls = []
+    inline_css = mail_service.inline_css
+
+    def counting_inline_css(html):
+        calls.append(html)
+        return inline_css(html)
+
+    monkeypatch.setattr(mail_service, 'inline_css', counting_inline_css)
+    mail_service._skeletons.clear()
+
+    for code in ('FOO', 'BAR'):
+        order = Order.objects.create(
+            code=code, event=event, email='dummy@dummy.dummy', status=Order.STATUS_PENDING,
+            datetime=now(), expires=now() + timedelta(days=10), total=0, payment_provider='banktransfer'
+        )
+        mail('dummy@dummy.dummy', 'Test subject', LazyI18nString('Your [order]({url}) {code}'),
+             {'url': 'https://example.org', 'code': code}, event, order=order)
+
+    assert len(calls) == 1
+    assert len(djmail.outbox) == 2
+    for m, code in zip(djmail.outbox, ('FOO', 'BAR')):
+        html = m.alternatives[0][0]
+        assert 'pretix-placeholder' not in html
+        assert 'font-weight: bold">order</a> ' + code in html
+        assert '/dummy/dummy/order/{}/'.format(code) in html
+
+    event.settings.set('mail_text_signature', 'This is a test signature.')
+    mail('dummy@dummy.dummy', 'Test subject', 'mailtest.txt', {}, event, order=order)
+    assert len(calls) == 2
+    assert 'This is a test signature.' in djmail.outbox[2].alternatives[0][0]
+
+
+def _content_styles(html):
+    content = etree.HTML(html).find('.//div[@class="content"]')
+    return [(e.tag, e.get('style'), (e.text or '').strip()) for e in content.iter()]
+
+
+@pytest.mark.django_db
+def test_inline_fragment_matches_inline_css(env):
+    event, user, organizer = env
+    body = markdown_compile(
+        "# Heading\n\nSome *text* with a [link](https://example.org).\n\n"
+        "## Subheading\n\n* One\n* Two\n\n> Quote\n\n"
+        "<table><tr><th>Head</th></tr><tr><td>Cell</td></tr></table>"
+    )
+    static = mail_service._static_parts(event, None, {})
+    skeleton, css, wrapper = mail_service._get_skeleton(event, static, True)
+    fragment = skeleton.replace(
+        mail_service.PLACEHOLDER_BODY, mail_service._inline_fragment(body, css, wrapper)
+    )
+    full = inline_css(wrapper.replace(mail_service.PLACEHOLDER_BODY, body))
+    assert _content_styles(fragment) == _content_styles(full)
+    assert any(tag == 'a' and style for tag, style, text in _content_styles(fragment))
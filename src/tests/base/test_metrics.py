@@ -34,7 +34,7 @@ class FakeRedis(object):
         pass
 
 
-@override_settings(HAS_REDIS=True)
+@override_settings(HAS_REDIS=True, METRICS_FLUSH_INTERVAL=0)
 def test_counter(monkeypatch):
 
     fake_redis = FakeRedis()
@@ -73,7 +73,7 @@ def test_counter(monkeypatch):
     assert fake_redis.storage[fullname_dimless] == 20
 
 
-@override_settings(HAS_REDIS=True)
+@override_settings(HAS_REDIS=True, METRICS_FLUSH_INTERVAL=0)
 def test_gauge(monkeypatch):
 
     fake_redis = FakeRedis()
@@ -131,7 +131,7 @@ def test_gauge(monkeypatch):
     assert fake_redis.storage[fullname_dimless] == 20
 
 
-@override_settings(HAS_REDIS=True)
+@override_settings(HAS_REDIS=True, METRICS_FLUSH_INTERVAL=0)
 def test_histogram(monkeypatch):
 
     fake_redis = FakeRedis()
@@ -166,8 +166,37 @@ def test_histogram(monkeypatch):
     assert fake_redis.storage['my_histogram_bucket{dimension="two",le="1.0"}'] == 1
 
 
+@override_settings(HAS_REDIS=True, METRICS_FLUSH_INTERVAL=3600)
+def test_batched_flush(monkeypatch):
+
+    fake_redis = FakeRedis()
+
+    monkeypatch.setattr(metrics, "redis", fake_redis, raising=False)
+    metrics.flush()
+
+    test_counter = metrics.Counter("my_counter", "this is a helpstring", ["dimension"])
+    test_gauge = metrics.Gauge("my_gauge", "this is a helpstring", ["dimension"])
+    test_hist = metrics.Histogram("my_histogram", "this is a helpstring", ["dimension"])
+
+    test_counter.inc(dimension="one")
+    test_counter.inc(2, dimension="one")
+    test_gauge.set(5, dimension="one")
+    test_gauge.inc(2, dimension="one")
+    test_hist.observe(3.0, dimension="one")
+    test_hist.observe(0.5, dimension="one")
+    assert fake_redis.storage == {}
+
+    metrics.flush()
+    assert fake_redis.storage['my_counter{dimension="one"}'] == 3
+    assert fake_redis.storage['my_gauge{dimension="one"}'] == 7
+    assert fake_redis.storage['my_histogram_count{dimension="one"}'] == 2
+    assert fake_redis.storage['my_histogram_sum{dimension="one"}'] == 3.5
+    assert fake_redis.storage['my_histogram_bucket{dimension="one",le="1.0"}'] == 1
+    assert fake_redis.storage['my_histogram_bucket{dimension="one",le="5.0"}'] == 2
+
+
 @pytest.mark.django_db
-@override_settings(HAS_REDIS=True, METRICS_USER="foo", METRICS_PASSPHRASE="bar")
+@override_settings(HAS_REDIS=True, METRICS_USER="foo", METRICS_PASSPHRASE="bar", METRICS_FLUSH_INTERVAL=0)
 def test_metrics_view(monkeypatch, client):
 
     fake_redis = FakeRedis()
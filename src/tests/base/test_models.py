@@ -2,6 +2,7 @@ import datetime
 import sys
 from datetime import date, timedelta
 from decimal import Decimal
+from unittest import mock
 
 import pytest
 import pytz
@@ -10,14 +11,14 @@ from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils.timezone import now
 
 from pretix.base.i18n import language
 from pretix.base.models import (
     CachedFile, CartPosition, CheckinList, Event, Item, ItemCategory,
-    ItemVariation, Order, OrderPosition, Organizer, Question, Quota, User,
-    Voucher, WaitingListEntry,
+    ItemVariation, Order, OrderPosition, Organizer, Question, Quota,
+    QuotaLedger, ReservedOrderCode, User, Voucher, WaitingListEntry,
 )
 from pretix.base.models.event import SubEvent
 from pretix.base.models.items import SubEventItem, SubEventItemVariation
@@ -25,6 +26,7 @@ from pretix.base.reldate import RelativeDate, RelativeDateWrapper
 from pretix.base.services.orders import (
     OrderError, cancel_order, mark_order_paid, perform_order,
 )
+from pretix.base.services.quotas import reconcile_quota_ledger
 
 
 class UserTestCase(TestCase):
@@ -441,6 +443,111 @@ class QuotaTestCase(BaseQuotaTestCase):
         self.event.has_subevents = False
         self.event.save()
 
+    def test_bulk_availability(self):
+        self.quota.items.add(self.item1)
+        self.quota.items.add(self.item2)
+        self.quota.variations.add(self.var1)
+        self.quota.size = 10
+        self.quota.save()
+        quota2 = Quota.objects.create(name="Test 2", size=5, event=self.event)
+        quota2.items.add(self.item2)
+        quota2.variations.add(self.var1)
+        quota2.variations.add(self.var2)
+        quota3 = Quota.objects.create(name="Unlimited", size=None, event=self.event)
+        quota3.items.add(self.item1)
+
+        order = Order.objects.create(event=self.event, status=Order.STATUS_PAID,
+                                     expires=now() + timedelta(days=3),
+                                     total=4)
+        OrderPosition.objects.create(order=order, item=self.item1, price=2)
+        OrderPosition.objects.create(order=order, item=self.item2, variation=self.var1, price=2)
+        order = Order.objects.create(event=self.event, status=Order.STATUS_PENDING,
+                                     expires=now() + timedelta(days=3),
+                                     total=2)
+        OrderPosition.objects.create(order=order, item=self.item2, variation=self.var2, price=2)
+        Voucher.objects.create(quota=self.quota, event=self.event, block_quota=True, max_usages=2)
+        Voucher.objects.create(item=self.item2, variation=self.var2, event=self.event, block_quota=True,
+                               max_usages=3, redeemed=1)
+        CartPosition.objects.create(event=self.event, item=self.item1, price=2,
+                                    expires=now() + timedelta(days=3))
+        CartPosition.objects.create(event=self.event, item=self.item1, price=2,
+                                    expires=now() - timedelta(days=3))
+        WaitingListEntry.objects.create(event=self.event, item=self.item2, variation=self.var2, email='foo@bar.com')
+
+        res = Quota.objects.bulk_availability([self.quota, quota2, quota3])
+        self.assertEqual(res, {
+            self.quota.pk: (Quota.AVAILABILITY_OK, 10 - 2 - 2 - 1),
+            quota2.pk: (Quota.AVAILABILITY_RESERVED, 0),
+            quota3.pk: (Quota.AVAILABILITY_OK, None),
+        })
+        self.assertEqual(res, {q.pk: q.availability() for q in (self.quota, quota2, quota3)})
+        self.assertEqual(
+            Quota.objects.bulk_availability([quota2], count_waitinglist=False)[quota2.pk],
+            (Quota.AVAILABILITY_OK, 1)
+        )
+
+
+@override_settings(PRETIX_QUOTA_LEDGER=True)
+class QuotaLedgerTestCase(QuotaTestCase):
+    # All tests of QuotaTestCase are run again with the ledger enabled
+
+    def test_ledger_incremental(self):
+        self.quota.items.add(self.item1)
+        self.quota.size = 5
+        self.quota.save()
+        self.assertEqual(self.quota.availability(), (Quota.AVAILABILITY_OK, 5))
+        order = Order.objects.create(event=self.event, status=Order.STATUS_PENDING,
+                                     expires=now() + timedelta(days=3),
+                                     total=4)
+        op = OrderPosition.objects.create(order=order, item=self.item1, price=2)
+        OrderPosition.objects.create(order=order, item=self.item1, price=2)
+        ledger = QuotaLedger.objects.get(quota=self.quota)
+        self.assertEqual((ledger.paid_orders, ledger.pending_orders), (0, 2))
+
+        order.status = Order.STATUS_PAID
+        order.save()
+        ledger.refresh_from_db()
+        self.assertEqual((ledger.paid_orders, ledger.pending_orders), (2, 0))
+
+        op.item = self.item3
+        op.save()
+        ledger.refresh_from_db()
+        self.assertEqual(ledger.paid_orders, 1)
+
+        wle = WaitingListEntry.objects.create(event=self.event, item=self.item1, email='foo@bar.com')
+        ledger.refresh_from_db()
+        self.assertEqual(ledger.waiting_list, 1)
+        wle.delete()
+        ledger.refresh_from_db()
+        self.assertEqual(ledger.waiting_list, 0)
+        self.assertEqual(self.quota.availability(), (Quota.AVAILABILITY_OK, 4))
+
+    def test_ledger_reset_on_quota_change(self):
+        self.quota.items.add(self.item1)
+        order = Order.objects.create(event=self.event, status=Order.STATUS_PAID,
+                                     expires=now() + timedelta(days=3),
+                                     total=4)
+        OrderPosition.objects.create(order=order, item=self.item3, variation=self.var3, price=2)
+        self.assertEqual(self.quota.availability(), (Quota.AVAILABILITY_OK, 2))
+        self.quota.items.add(self.item3)
+        self.quota.variations.add(self.var3)
+        self.assertFalse(QuotaLedger.objects.filter(quota=self.quota).exists())
+        self.assertEqual(self.quota.availability(), (Quota.AVAILABILITY_OK, 1))
+
+    def test_ledger_reconciliation(self):
+        self.quota.items.add(self.item1)
+        order = Order.objects.create(event=self.event, status=Order.STATUS_PAID,
+                                     expires=now() + timedelta(days=3),
+                                     total=4)
+        OrderPosition.objects.create(order=order, item=self.item1, price=2)
+        ledger = self.quota.get_ledger()
+        self.assertEqual(reconcile_quota_ledger(ledger), {})
+
+        QuotaLedger.objects.filter(pk=ledger.pk).update(paid_orders=0, pending_orders=3)
+        self.assertEqual(reconcile_quota_ledger(ledger), {'paid_orders': 1, 'pending_orders': -3})
+        ledger.refresh_from_db()
+        self.assertEqual((ledger.paid_orders, ledger.pending_orders), (1, 0))
+
 
 class WaitingListTestCase(BaseQuotaTestCase):
 
@@ -866,6 +973,14 @@ class OrderTestCase(BaseQuotaTestCase):
         assert p1.secret != p2.secret
         assert self.order.can_user_cancel is False
 
+    def test_no_duplicate_order_code(self):
+        event2 = Event.objects.create(organizer=self.event.organizer, name='Second', slug='second', date_from=now())
+        Order.objects.create(code='ABCDE', status=Order.STATUS_PENDING, event=event2, total=0)
+        with mock.patch('pretix.base.models.orders.get_random_string', side_effect=['ABCDE', 'FGHJK']):
+            order = Order.objects.create(status=Order.STATUS_PENDING, event=self.event, total=0)
+        assert order.code == 'FGHJK'
+        assert ReservedOrderCode.objects.filter(organizer=self.event.organizer, code='ABCDE').exists()
+
 
 class ItemCategoryTest(TestCase):
     """
@@ -1154,7 +1269,7 @@ class CheckinListTestCase(TestCase):
         op3.checkins.create(list=cls.cl_both)
 
         o = Order.objects.create(
-            code='FOO', event=cls.event, email='dummy@dummy.test',
+            code='BAR', event=cls.event, email='dummy@dummy.test',
             status=Order.STATUS_PENDING,
             datetime=now(), expires=now() + timedelta(days=10),
             total=Decimal("30"), payment_provider='banktransfer', locale='en'
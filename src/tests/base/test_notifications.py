@@ -7,7 +7,8 @@ from django.db import transaction
 from django.utils.timezone import now
 
 from pretix.base.models import (
-    Event, Item, Order, OrderPosition, Organizer, User,
+    Event, Item, LogEntry, Order, OrderPosition, Organizer, User,
+    buffered_logging,
 )
 
 
@@ -67,6 +68,46 @@ def test_notification_trigger_event_specific(event, order, user, monkeypatch_on_
     assert len(djmail.outbox) == 1
 
 
+@pytest.mark.django_db
+def test_buffered_logging(event, order, user, monkeypatch_on_commit):
+    djmail.outbox = []
+    user.notification_settings.create(
+        method='mail', event=event, action_type='pretix.event.order.paid', enabled=True
+    )
+    LogEntry.objects.all().delete()
+    with transaction.atomic(), buffered_logging():
+        order.log_action('pretix.event.order.comment', {})
+        with buffered_logging():
+            order.log_action('pretix.event.order.email.order_paid', {})
+        assert not LogEntry.objects.exists()
+        order.log_action('pretix.event.order.paid', {})
+        assert LogEntry.objects.get().action_type == 'pretix.event.order.paid'
+    assert LogEntry.objects.count() == 3
+    assert len(djmail.outbox) == 1
+
+
+@pytest.mark.django_db
+def test_buffered_logging_keeps_time(event, order):
+    LogEntry.objects.all().delete()
+    with transaction.atomic(), buffered_logging():
+        le = order.log_action('pretix.event.order.comment', {})
+        t = le.datetime
+        assert t
+        order.log_action('pretix.event.order.email.order_paid', {})
+    assert LogEntry.objects.get(action_type='pretix.event.order.comment').datetime == t
+
+
+@pytest.mark.django_db
+def test_buffered_logging_discarded_on_error(event, order):
+    LogEntry.objects.all().delete()
+    with pytest.raises(ValueError):
+        with buffered_logging():
+            order.log_action('pretix.event.order.comment', {})
+            raise ValueError()
+    order.log_action('pretix.event.order.comment', {})
+    assert LogEntry.objects.count() == 1
+
+
 @pytest.mark.django_db
 def test_notification_trigger_global(event, order, user, monkeypatch_on_commit):
     djmail.outbox = []
@@ -0,0 +1,106 @@
+from datetime import timedelta
+
+import pytest
+from django.utils.timezone import now
+
+from pretix.base.models import (
+    Event, EventActivity, Item, Order, OrderPosition, Organizer, Quota,
+)
+from pretix.base.services import quotas
+from pretix.base.services.quotas import (
+    refresh_event_quota_caches, refresh_quota_caches,
+)
+
+
+@pytest.fixture
+def env():
+    quotas._activity.clear()
+    o = Organizer.objects.create(name='Dummy', slug='dummy')
+    event = Event.objects.create(
+        organizer=o, name='Dummy', slug='dummy',
+        date_from=now(),
+    )
+    ticket = Item.objects.create(event=event, name='Ticket', default_price=23)
+    quota = Quota.objects.create(event=event, name='Tickets', size=10)
+    quota.items.add(ticket)
+    yield event, ticket, quota
+    quotas._activity.clear()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_activity_recorded(env):
+    event, ticket, quota = env
+    activity = EventActivity.objects.get(event=event)
+    assert activity.quotas_refreshed is None
+
+    refresh_event_quota_caches(event.pk)
+    activity.refresh_from_db()
+    assert activity.quotas_refreshed
+    quota.refresh_from_db()
+    assert quota.cached_availability_number == 10
+
+    EventActivity.objects.filter(event=event).update(
+        last_activity=now() - timedelta(hours=1), quotas_refreshed=now()
+    )
+    quota.availability()
+    activity.refresh_from_db()
+    assert activity.last_activity < activity.quotas_refreshed
+
+    quotas._activity.clear()
+    order = Order.objects.create(
+        code='FOO', event=event, status=Order.STATUS_PAID,
+        datetime=now(), expires=now() + timedelta(days=10), total=23
+    )
+    OrderPosition.objects.create(order=order, item=ticket, price=23)
+    activity.refresh_from_db()
+    assert activity.last_activity > activity.quotas_refreshed
+
+
+@pytest.mark.django_db(transaction=True)
+def test_refresh_only_active_events(env, settings):
+    settings.HAS_CELERY = False
+    event, ticket, quota = env
+    other = Event.objects.create(
+        organizer=event.organizer, name='Other', slug='other',
+        date_from=now(),
+    )
+    other_quota = Quota.objects.create(event=other, name='Tickets', size=5)
+    EventActivity.objects.filter(event=other).update(
+        last_activity=now() - timedelta(hours=1), quotas_refreshed=now()
+    )
+
+    refresh_quota_caches()
+    quota.refresh_from_db()
+    other_quota.refresh_from_db()
+    assert quota.cached_availability_time
+    assert not other_quota.cached_availability_time
+    assert not EventActivity.objects.filter(event=event, quotas_refreshed__isnull=True).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_refresh_hot_cache(env):
+    event, ticket, quota = env
+    refresh_event_quota_caches(event.pk)
+    quota.refresh_from_db()
+    assert quota.cached_availability_number == 10
+    assert quota.cache_is_hot()
+
+    quotas._activity.clear()
+    order = Order.objects.create(
+        code='FOO', event=event, status=Order.STATUS_PAID,
+        datetime=now(), expires=now() + timedelta(days=10), total=23
+    )
+    OrderPosition.objects.create(order=order, item=ticket, price=23)
+
+    refresh_event_quota_caches(event.pk)
+    quota.refresh_from_db()
+    assert quota.cached_availability_number == 9
+
+
+@pytest.mark.django_db(transaction=True)
+def test_refresh_budget(env):
+    event, ticket, quota = env
+    refresh_event_quota_caches(event.pk, budget=-1)
+    quota.refresh_from_db()
+    assert not quota.cached_availability_time
+    assert EventActivity.objects.get(event=event).quotas_refreshed is None
@@ -411,6 +411,18 @@ class EventsTest(SoupTest):
         self.event1.settings.flush()
         assert self.event1.settings.get('ticket_download', as_type=bool)
 
+    def test_ticket_settings_pregenerate_again(self):
+        self.event1.settings.ticket_download_pregenerated = now()
+        doc = self.get_doc('/control/event/%s/%s/settings/tickets' % (self.orga1.slug, self.event1.slug))
+        data = extract_form_fields(doc.select("form")[0])
+        data['ticket_download'] = 'on'
+        data['ticket_download_pregenerate'] = 'on'
+        self.post_doc('/control/event/%s/%s/settings/tickets' % (self.orga1.slug, self.event1.slug),
+                      data, follow=True)
+        self.event1.settings.flush()
+        assert self.event1.settings.ticket_download_pregenerate
+        assert self.event1.settings.ticket_download_pregenerated is None
+
     def test_create_event_unauthorized(self):
         doc = self.post_doc('/control/events/add', {
             'event_wizard-current_step': 'foundation',
@@ -9,12 +9,13 @@ from django_countries.fields import Country
 from tests.base import SoupTest
 
 from pretix.base.models import (
-    Event, InvoiceAddress, Item, Order, OrderPosition, Organizer, Question,
-    QuestionAnswer, Quota, Team, User,
+    Event, InvoiceAddress, Item, LogEntry, Order, OrderPosition, Organizer,
+    Question, QuestionAnswer, Quota, Team, User,
 )
 from pretix.base.services.invoices import (
     generate_cancellation, generate_invoice,
 )
+from pretix.base.services.logarchive import archive_logentries
 
 
 @pytest.fixture
@@ -633,6 +634,23 @@ def test_order_sendmail_simple_case(client, order_url, env):
     assert 'Test subject' in response.rendered_content
 
 
+@pytest.mark.django_db
+def test_order_mail_history_archived(client, order_url, env):
+    order = env[2]
+    order.log_action('pretix.event.order.email.custom_sent', data={'subject': 'Old subject'})
+    order.log_action('pretix.event.order.comment', data={'new_comment': 'Not a mail'})
+    LogEntry.all.update(datetime=now() - timedelta(days=100))
+    order.log_action('pretix.event.order.email.custom_sent', data={'subject': 'New subject'})
+    archive_logentries(env[0], now() - timedelta(days=50))
+    client.login(email='dummy@dummy.dummy', password='dummy')
+
+    response = client.get(order_url + '/mail_history')
+    assert response.status_code == 200
+    assert 'New subject' in response.rendered_content
+    assert 'Old subject' in response.rendered_content
+    assert len(response.context['logs']) == 2
+
+
 @pytest.mark.django_db
 def test_order_sendmail_preview(client, order_url, env):
     order = env[2]
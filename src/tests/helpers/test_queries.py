@@ -0,0 +1,35 @@
+import pytest
+
+from pretix.base.models import Organizer
+from pretix.helpers.profile.queries import QueryProfile, fingerprint
+
+
+def test_fingerprint():
+    assert fingerprint("SELECT * FROM foo WHERE id = 3 AND  name = 'it''s'") == \
+        "SELECT * FROM foo WHERE id = ? AND name = ?"
+    assert fingerprint("SELECT * FROM foo WHERE id IN (1, 2, 3)") == fingerprint("SELECT * FROM foo WHERE id IN (4)")
+
+
+@pytest.mark.django_db
+def test_query_profile():
+    for i in range(6):
+        Organizer.objects.create(name='Dummy', slug='dummy{}'.format(i))
+
+    with QueryProfile() as outer:
+        Organizer.objects.count()
+        with QueryProfile() as profile:
+            for i in range(6):
+                Organizer.objects.get(slug='dummy{}'.format(i))
+    assert profile.count == 6
+    assert outer.count == 7
+    assert len(profile.repeated()) == 1
+    assert profile.repeated()[0][1] == 6
+    assert profile.summary().startswith('6 queries;')
+
+
+@pytest.mark.django_db
+def test_query_profile_disabled():
+    with QueryProfile(enabled=False) as profile:
+        Organizer.objects.count()
+    assert profile.count == 0
+    assert not profile.repeated()
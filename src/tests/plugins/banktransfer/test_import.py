@@ -9,7 +9,7 @@ from django.utils.timezone import now
 from pretix.base.models import (
     Event, Item, Order, OrderPosition, Organizer, Quota, Team, User,
 )
-from pretix.plugins.banktransfer.models import BankImportJob
+from pretix.plugins.banktransfer.models import BankImportJob, BankTransaction
 from pretix.plugins.banktransfer.tasks import process_banktransfers
 
 
@@ -237,6 +237,51 @@ def test_wrong_event_organizer(env, orga_job):
     assert env[2].status == Order.STATUS_PENDING
 
 
+@pytest.mark.django_db
+def test_organizer_without_events():
+    o = Organizer.objects.create(name='Empty', slug='empty')
+    job = BankImportJob.objects.create(organizer=o)
+    process_banktransfers(job.pk, [{
+        'payer': 'Karla Kundin',
+        'reference': 'Bestellung DUMMY-1234S',
+        'date': '2016-01-26',
+        'amount': '23.00'
+    }])
+    job.refresh_from_db()
+    assert job.state == BankImportJob.STATE_COMPLETED
+    assert BankTransaction.objects.get().state == BankTransaction.STATE_NOMATCH
+
+
+@pytest.mark.django_db
+def test_mark_paid_organizer_batch(env, orga_job):
+    event2 = Event.objects.create(
+        organizer=env[0].organizer, name='Second', slug='second',
+        date_from=now(), plugins='pretix.plugins.banktransfer'
+    )
+    o3 = Order.objects.create(
+        code='ABCDE', event=event2,
+        status=Order.STATUS_PENDING,
+        datetime=now(), expires=now() + timedelta(days=10),
+        total=42, payment_provider='banktransfer'
+    )
+    process_banktransfers(orga_job, [
+        {'payer': 'Karla Kundin', 'reference': 'Bestellung DUMMY-1234S', 'date': '2016-01-26', 'amount': '23.00'},
+        {'payer': 'Karla Kundin', 'reference': 'Bestellung DUMMY-1Z3AS', 'date': '2016-01-27', 'amount': '23.00'},
+        {'payer': 'Karl Kunde', 'reference': 'Bestellung SECOND-ABCDE', 'date': '2016-01-26', 'amount': '42.00'},
+        {'payer': 'Karl Kunde', 'reference': 'Bestellung SECOND-1Z3AS', 'date': '2016-01-26', 'amount': '23.00'},
+        {'payer': 'Karl Kunde', 'reference': 'Spende', 'date': '2016-01-26', 'amount': '5.00'},
+    ])
+    env[2].refresh_from_db()
+    assert env[2].status == Order.STATUS_PAID
+    o3.refresh_from_db()
+    assert o3.status == Order.STATUS_PAID
+    states = list(BankTransaction.objects.order_by('pk').values_list('state', flat=True))
+    assert states == [
+        BankTransaction.STATE_VALID, BankTransaction.STATE_DUPLICATE, BankTransaction.STATE_VALID,
+        BankTransaction.STATE_NOMATCH, BankTransaction.STATE_NOMATCH,
+    ]
+
+
 @pytest.mark.django_db
 def test_import_very_long_csv_file(client, env):
     client.login(email='dummy@dummy.dummy', password='dummy')
@@ -1,4 +1,5 @@
 import json
+import urllib.parse
 from datetime import timedelta
 
 import pytest
@@ -320,6 +321,84 @@ def test_download_item_restricted_list(client, env):
     assert jdata['results'][0]['secret'] == env[4].secret
 
 
+def _age_data(event):
+    # Make all data look like it has not been touched since long before the test runs
+    ts = now() - timedelta(hours=1)
+    Order.objects.filter(event=event).update(last_modified=ts)
+    OrderPosition.objects.filter(order__event=event).update(last_modified=ts)
+    Checkin.objects.filter(position__order__event=event).update(last_modified=ts)
+
+
+def _download(client, env, since):
+    resp = client.get('/pretixdroid/api/%s/%s/download/?key=%s&since=%s' % (
+        env[0].organizer.slug, env[0].slug, 'abcdefg', urllib.parse.quote(since.isoformat())))
+    return json.loads(resp.content.decode("utf-8"))
+
+
+@pytest.mark.django_db
+def test_download_delta_unchanged(client, env):
+    AppConfiguration.objects.create(event=env[0], key='abcdefg', list=env[5])
+    _age_data(env[0])
+    jdata = _download(client, env, now() - timedelta(minutes=10))
+    assert not jdata['full']
+    assert jdata['results'] == []
+    assert jdata['removed'] == []
+    assert jdata['cursor']
+
+
+@pytest.mark.django_db
+def test_download_delta_changed(client, env):
+    AppConfiguration.objects.create(event=env[0], key='abcdefg', list=env[5])
+    _age_data(env[0])
+    o2 = Order.objects.create(
+        code='BAR', event=env[0], status=Order.STATUS_PAID,
+        datetime=now(), expires=now() + timedelta(days=10),
+        total=0, payment_provider='banktransfer'
+    )
+    op3 = OrderPosition.objects.create(order=o2, item=env[4].item, price=23, secret='abcdef')
+    jdata = _download(client, env, now() - timedelta(minutes=10))
+    assert [r['secret'] for r in jdata['results']] == ['abcdef']
+
+    _age_data(env[0])
+    op3.attendee_name = 'Paul'
+    op3.save()
+    jdata = _download(client, env, now() - timedelta(minutes=10))
+    assert [r['secret'] for r in jdata['results']] == ['abcdef']
+    assert jdata['results'][0]['attendee_name'] == 'Paul'
+
+    _age_data(env[0])
+    Checkin.objects.create(position=op3, list=env[5])
+    jdata = _download(client, env, now() - timedelta(minutes=10))
+    assert [r['secret'] for r in jdata['results']] == ['abcdef']
+    assert jdata['results'][0]['redeemed']
+
+
+@pytest.mark.django_db
+def test_download_delta_removed(client, env):
+    AppConfiguration.objects.create(event=env[0], key='abcdefg', list=env[5])
+    _age_data(env[0])
+    env[4].secret = 'abcdef'
+    env[4].save()
+    jdata = _download(client, env, now() - timedelta(minutes=10))
+    assert sorted(r['secret'] for r in jdata['results']) == ['1234', 'abcdef']
+    assert jdata['removed'] == ['5678910']
+
+    _age_data(env[0])
+    env[2].status = Order.STATUS_CANCELED
+    env[2].save()
+    jdata = _download(client, env, now() - timedelta(minutes=10))
+    assert jdata['results'] == []
+    assert jdata['removed'] == ['1234', '5678910', 'abcdef']
+
+
+@pytest.mark.django_db
+def test_download_delta_expired_cursor(client, env):
+    AppConfiguration.objects.create(event=env[0], key='abcdefg', list=env[5])
+    jdata = _download(client, env, now() - timedelta(days=60))
+    assert jdata['full']
+    assert len(jdata['results']) == 2
+
+
 @pytest.mark.django_db
 def test_status(client, env):
     AppConfiguration.objects.create(event=env[0], key='abcdefg', list=env[5])
@@ -1,12 +1,16 @@
 import datetime
+import smtplib
+import time
 
 import pytest
 from django.core import mail as djmail
+from django.core.mail.backends.locmem import EmailBackend
 from django.utils.timezone import now
 
 from pretix.base.models import (
     Event, Item, ItemCategory, Order, OrderPosition, Organizer, Team, User,
 )
+from pretix.plugins.sendmail import tasks
 
 
 @pytest.fixture
@@ -230,3 +234,123 @@ def test_sendmail_placeholder(logged_in_client, sendmail_url, event, order):
     assert 'ORDER1234' in response.rendered_content
 
     assert len(djmail.outbox) == 0
+
+
+def _create_orders(item, count):
+    for i in range(count):
+        o = Order.objects.create(event=item.event, status=Order.STATUS_PENDING,
+                                 expires=now() + datetime.timedelta(hours=1),
+                                 total=13, code='BATCH{}'.format(i), email='batch{}@dummy.test'.format(i),
+                                 datetime=now(), payment_provider='banktransfer', locale='en')
+        OrderPosition.objects.create(order=o, item=item, price=13)
+
+
+@pytest.mark.django_db
+def test_sendmail_batches(monkeypatch, event, item):
+    monkeypatch.setattr(tasks, 'SEND_BATCH_SIZE', 2)
+    _create_orders(item, 5)
+    event.settings.mail_text_signature = 'Signature'
+    djmail.outbox = []
+
+    tasks.send_mails(event.pk, None, {'en': '{code}'}, {'en': 'Hello {code}'},
+                     list(Order.objects.values_list('pk', flat=True)))
+
+    assert sorted(m.subject for m in djmail.outbox) == ['BATCH{}'.format(i) for i in range(5)]
+    for m in djmail.outbox:
+        assert m.body.startswith('Hello ' + m.subject)
+        assert 'Signature' in m.body
+        assert m.to == ['batch{}@dummy.test'.format(m.subject[-1])]
+    for o in Order.objects.all():
+        assert o.all_logentries().filter(action_type='pretix.plugins.sendmail.order.email.sent').count() == 1
+
+
+@pytest.mark.django_db
+def test_sendmail_batch_failures(monkeypatch, event, item):
+    _create_orders(item, 3)
+    djmail.outbox = []
+    attempts = []
+    send_messages = EmailBackend.send_messages
+
+    def flaky_send_messages(self, messages):
+        attempts.append(messages[0].to[0])
+        if messages[0].to[0] == 'batch1@dummy.test' or attempts.count(messages[0].to[0]) == 1:
+            raise OSError('Connection lost')
+        return send_messages(self, messages)
+
+    monkeypatch.setattr(EmailBackend, 'send_messages', flaky_send_messages)
+    monkeypatch.setattr('pretix.base.services.mail.MAIL_RETRY_DELAY', 0)
+
+    failures = tasks.send_mail_batch(event.pk, None, {'en': '{code}'}, {'en': 'Hello {code}'},
+                                     list(Order.objects.values_list('pk', flat=True)))
+
+    assert failures == [Order.objects.get(code='BATCH1').pk]
+    assert sorted(m.subject for m in djmail.outbox) == ['BATCH0', 'BATCH2']
+    assert attempts.count('batch1@dummy.test') == 3
+    o = Order.objects.get(code='BATCH1')
+    assert not o.all_logentries().filter(action_type='pretix.plugins.sendmail.order.email.sent').exists()
+
+
+@pytest.mark.django_db
+def test_sendmail_batch_connection_failures(monkeypatch, event, item):
+    _create_orders(item, 3)
+    # Orders sharing an address with a failed one are still logged
+    Order.objects.update(email='batch@dummy.test')
+    djmail.outbox = []
+    connections = []
+    send_messages = EmailBackend.send_messages
+
+    def flaky_open(self):
+        connections.append(self)
+        # The first connection fails, the second one is lost while sending BATCH1 for the last time
+        if len(connections) == 1 or len(connections) == 4:
+            raise OSError('Connection refused')
+
+    def flaky_send_messages(self, messages):
+        if messages[0].subject == 'BATCH1':
+            raise OSError('Connection lost')
+        return send_messages(self, messages)
+
+    monkeypatch.setattr(EmailBackend, 'open', flaky_open)
+    monkeypatch.setattr(EmailBackend, 'send_messages', flaky_send_messages)
+    monkeypatch.setattr('pretix.base.services.mail.MAIL_RETRY_DELAY', 0)
+
+    failures = tasks.send_mail_batch(event.pk, None, {'en': '{code}'}, {'en': 'Hello {code}'},
+                                     list(Order.objects.values_list('pk', flat=True)))
+
+    assert failures == [Order.objects.get(code='BATCH1').pk]
+    assert sorted(m.subject for m in djmail.outbox) == ['BATCH0', 'BATCH2']
+    for o in Order.objects.all():
+        assert o.all_logentries().filter(
+            action_type='pretix.plugins.sendmail.order.email.sent'
+        ).exists() == (o.code != 'BATCH1')
+
+
+@pytest.mark.django_db
+def test_sendmail_batch_refused_recipient(monkeypatch, event, item):
+    _create_orders(item, 3)
+    djmail.outbox = []
+    connections = []
+    sleeps = []
+    open_connection = EmailBackend.open
+    send_messages = EmailBackend.send_messages
+
+    def counting_open(self):
+        connections.append(self)
+        return open_connection(self)
+
+    def refusing_send_messages(self, messages):
+        if messages[0].to[0] == 'batch1@dummy.test':
+            raise smtplib.SMTPRecipientsRefused({'batch1@dummy.test': (550, b'No such user')})
+        return send_messages(self, messages)
+
+    monkeypatch.setattr(EmailBackend, 'open', counting_open)
+    monkeypatch.setattr(EmailBackend, 'send_messages', refusing_send_messages)
+    monkeypatch.setattr(time, 'sleep', sleeps.append)
+
+    failures = tasks.send_mail_batch(event.pk, None, {'en': '{code}'}, {'en': 'Hello {code}'},
+                                     list(Order.objects.values_list('pk', flat=True)))
+
+    assert failures == [Order.objects.get(code='BATCH1').pk]
+    assert sorted(m.subject for m in djmail.outbox) == ['BATCH0', 'BATCH2']
+    assert len(connections) == 1
+    assert sleeps == []
@@ -1,14 +1,21 @@
 from datetime import timedelta
 from decimal import Decimal
 from io import BytesIO
+from unittest import mock
 
 import pytest
 from django.utils.timezone import now
 from PyPDF2 import PdfFileReader
+from PyPDF2.generic import IndirectObject
 
 from pretix.base.models import (
-    Event, Item, ItemVariation, Order, OrderPosition, Organizer,
+    CachedTicket, Event, Item, ItemVariation, Order, OrderPosition, Organizer,
 )
+from pretix.base.pdf import compile_layout, qr_matrix
+from pretix.base.services.tickets import (
+    _pregenerate_due, pregenerate, pregenerate_opening_downloads,
+)
+from pretix.plugins.ticketoutputpdf.models import TicketLayoutItem
 from pretix.plugins.ticketoutputpdf.ticketoutput import PdfTicketOutput
 
 
@@ -49,3 +56,143 @@ def test_generate_pdf(env0):
     assert ftype == 'application/pdf'
     pdf = PdfFileReader(BytesIO(buf))
     assert pdf.numPages == 1
+
+
+@pytest.mark.django_db
+def test_qrcode_cached(env0):
+    event, order = env0
+    o = PdfTicketOutput(event)
+    o.generate(order.positions.first())
+    hits = qr_matrix.cache_info().hits
+    o.generate(order.positions.first())
+    assert qr_matrix.cache_info().hits == hits + 1
+
+
+@pytest.mark.django_db
+def test_layout_compiled_once(env0):
+    event, order = env0
+    PdfTicketOutput(event).generate(order.positions.first())
+    hits = compile_layout.cache_info().hits
+    o = PdfTicketOutput(event)
+    o.generate(order.positions.first())
+    assert compile_layout.cache_info().hits == hits + 1
+    plan = o._renderers[None].plan
+    assert [e['type'] for e in plan] == [e['type'] for e in o._default_layout()]
+    assert all(e['static'] is None for e in plan if e['type'] == 'textarea')
+
+
+@pytest.mark.django_db
+def test_generate_order_pdf(env0):
+    event, order = env0
+    event.settings.set('ticket_download_nonadm', True)
+    o = PdfTicketOutput(event)
+    fname, ftype, buf = o.generate_order(order)
+    assert ftype == 'application/pdf'
+    pdf = PdfFileReader(BytesIO(buf))
+    assert pdf.numPages == 2
+    # Both tickets share the same layout, which is only parsed once
+    assert len(o._renderers) == 1
+
+
+@pytest.mark.django_db
+def test_generate_order_pdf_multiple_layouts(env0):
+    event, order = env0
+    event.settings.set('ticket_download_nonadm', True)
+    ticket = Item.objects.create(event=event, name='Ticket', default_price=23, admission=True)
+    OrderPosition.objects.create(order=order, item=ticket, price=23, secret='abcd')
+    layout = event.ticket_layouts.create(
+        name='Other', layout='[{"type": "barcodearea", "left": "10", "bottom": "10", "size": "40"}]'
+    )
+    TicketLayoutItem.objects.create(item=ticket, layout=layout)
+    o = PdfTicketOutput(event)
+    fname, ftype, buf = o.generate_order(order)
+    pdf = PdfFileReader(BytesIO(buf))
+    assert pdf.numPages == 3
+    assert len(o._renderers) == 2
+
+
+def _resolve(obj, seen=None):
+    seen = seen if seen is not None else set()
+    if isinstance(obj, IndirectObject):
+        if obj.idnum in seen:
+            return
+        seen.add(obj.idnum)
+        obj = obj.getObject()
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k != '/Parent':
+                _resolve(v, seen)
+    elif isinstance(obj, list):
+        for v in obj:
+            _resolve(v, seen)
+
+
+@pytest.mark.django_db
+def test_pregenerate(env0):
+    event, order = env0
+    event.plugins = 'pretix.plugins.ticketoutputpdf'
+    event.save()
+    event.settings.set('ticketoutput_pdf__enabled', True)
+    event.settings.set('ticket_download_nonadm', True)
+    order.status = Order.STATUS_PAID
+    order.save()
+    pending = Order.objects.create(
+        code='BAR', event=event, status=Order.STATUS_PENDING,
+        datetime=now(), expires=now() + timedelta(days=10), total=12, payment_provider='banktransfer'
+    )
+    OrderPosition.objects.create(order=pending, item=order.positions.first().item, price=12)
+    CachedTicket.objects.create(order_position=order.positions.first(), provider='pdf', extension='',
+                                type='', file=None)
+
+    result = pregenerate.apply(args=(event.pk,)).get()
+    assert result['count'] == 2
+    cts = CachedTicket.objects.filter(provider='pdf')
+    assert {ct.order_position.order_id for ct in cts} == {order.pk}
+    assert len(cts) == 2
+    assert all(ct.file and ct.extension == '.pdf' for ct in cts)
+    for ct in cts:
+        # All tickets are rendered by the same output, but every file needs to be complete on its own
+        pdf = PdfFileReader(BytesIO(ct.file.read()))
+        assert pdf.numPages == 1
+        _resolve(pdf.getPage(0))
+        assert ct.order_position.secret in pdf.getPage(0).extractText()
+
+    assert pregenerate.apply(args=(event.pk,)).get()['count'] == 0
+
+
+def test_pregenerate_due():
+    t = now()
+    assert _pregenerate_due(None, None, t)
+    assert not _pregenerate_due(None, t - timedelta(days=1), t)
+    assert not _pregenerate_due(t + timedelta(days=1), None, t)
+    assert _pregenerate_due(t + timedelta(minutes=30), None, t)
+    assert _pregenerate_due(t + timedelta(minutes=30), t - timedelta(days=1), t)
+    assert not _pregenerate_due(t + timedelta(minutes=30), t - timedelta(minutes=10), t)
+
+
+@pytest.mark.django_db
+def test_pregenerate_opening_downloads(env0):
+    event, order = env0
+    event.date_from = now() + timedelta(days=1)
+    event.save()
+    past = Event.objects.create(
+        organizer=event.organizer, name='Past', slug='past', live=True,
+        date_from=now() - timedelta(days=3), date_to=now() - timedelta(days=2)
+    )
+    series = Event.objects.create(
+        organizer=event.organizer, name='Series', slug='series', live=True,
+        date_from=now() - timedelta(days=3), has_subevents=True
+    )
+    series.subevents.create(name='Past', date_from=now() - timedelta(days=3), active=True)
+    se = series.subevents.create(name='Future', date_from=now() + timedelta(days=3), active=True)
+    for e in (event, past, series):
+        e.settings.set('ticket_download', True)
+        e.settings.set('ticket_download_pregenerate', True)
+
+    with mock.patch('pretix.base.services.tickets.pregenerate.apply_async') as apply_async:
+        pregenerate_opening_downloads(None)
+    assert sorted(c[1]['args'] for c in apply_async.call_args_list) == sorted([(event.pk,), (series.pk, [se.pk])])
+
+    with mock.patch('pretix.base.services.tickets.pregenerate.apply_async') as apply_async:
+        pregenerate_opening_downloads(None)
+    assert not apply_async.called
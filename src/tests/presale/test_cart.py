@@ -15,6 +15,7 @@ from pretix.base.models import (
 from pretix.base.models.items import (
     ItemAddOn, SubEventItem, SubEventItemVariation,
 )
+from pretix.base.services import admission
 from pretix.base.services.cart import CartError, CartManager, error_messages
 from pretix.testutils.sessions import get_cart_session_key
 
@@ -107,6 +108,33 @@ class CartTest(CartTestMixin, TestCase):
         self.assertIsNone(objs[0].variation)
         self.assertEqual(objs[0].price, 23)
 
+    def test_queue(self):
+        self.addCleanup(setattr, admission, '_backend', None)
+        admission._backend = admission.LocalAdmissionBackend()
+        self.event.settings.queue_size = 1
+        admission.check_admission(self.event, 'other')
+        response = self.client.post('/%s/%s/cart/add' % (self.orga.slug, self.event.slug), {
+            'item_%d' % self.ticket.id: '1'
+        }, follow=True)
+        self.assertRedirects(response, '/%s/%s/queue/' % (self.orga.slug, self.event.slug),
+                             target_status_code=200)
+        doc = BeautifulSoup(response.rendered_content, "lxml")
+        assert doc.select('#queue-position')[0].text == '1'
+        assert not CartPosition.objects.filter(cart_id=self.session_key, event=self.event).exists()
+
+        response = self.client.get('/%s/%s/queue/status' % (self.orga.slug, self.event.slug))
+        assert response.json() == {'admitted': False, 'position': 1, 'redirect': None}
+
+        admission.leave_queue(self.event, 'other')
+        response = self.client.get('/%s/%s/queue/status' % (self.orga.slug, self.event.slug))
+        assert response.json() == {
+            'admitted': True, 'position': 0, 'redirect': '/%s/%s/' % (self.orga.slug, self.event.slug)
+        }
+        self.client.post('/%s/%s/cart/add' % (self.orga.slug, self.event.slug), {
+            'item_%d' % self.ticket.id: '1'
+        }, follow=True)
+        assert CartPosition.objects.filter(cart_id=self.session_key, event=self.event).exists()
+
     def _set_session(self, key, value):
         session = self.client.session
         session['carts'][get_cart_session_key(self.client, self.event)][key] = value
@@ -11,6 +11,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from django.utils.timezone import now
 from django_countries.fields import Country
+from tests import assert_query_budget
 
 from pretix.base.decimal import round_decimal
 from pretix.base.models import (
@@ -791,6 +792,19 @@ class CheckoutTestCase(TestCase):
         self.assertEqual(Order.objects.count(), 1)
         self.assertEqual(OrderPosition.objects.count(), 1)
 
+    def test_confirm_query_budget(self):
+        for i in range(3):
+            CartPosition.objects.create(
+                event=self.event, cart_id=self.session_key, item=self.ticket,
+                price=23, expires=now() + timedelta(minutes=10)
+            )
+        self._set_session('payment', 'banktransfer')
+
+        with assert_query_budget(100):
+            response = self.client.post('/%s/%s/checkout/confirm/' % (self.orga.slug, self.event.slug))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(OrderPosition.objects.count(), 3)
+
     def test_subevent_confirm_expired_available(self):
         self.event.has_subevents = True
         self.event.save()
@@ -9,6 +9,7 @@ from django.core.exceptions import ValidationError
 from django.test import TestCase
 from django.utils.timezone import now
 from pytz import timezone
+from tests import assert_query_budget
 from tests.base import SoupTest
 
 from pretix.base.models import (
@@ -80,6 +81,20 @@ class ItemDisplayTest(EventTestMixin, SoupTest):
         self.assertIn('href="/redirect/?url=http%3A//example.org%3A', html)
         self.assertIn('href="/redirect/?url=http%3A//example.net%3A', html)
 
+    def test_query_budget(self):
+        q = Quota.objects.create(event=self.event, name='Quota', size=20)
+        cat = ItemCategory.objects.create(event=self.event, name="Everything", position=0)
+        for i in range(5):
+            item = Item.objects.create(event=self.event, name='Ticket {}'.format(i), default_price=12, category=cat)
+            q.items.add(item)
+            var = ItemVariation.objects.create(item=item, value='Variation {}'.format(i))
+            q.variations.add(var)
+        self.client.get('/%s/%s/' % (self.orga.slug, self.event.slug))
+
+        with assert_query_budget(20):
+            doc = self.get_doc('/%s/%s/' % (self.orga.slug, self.event.slug))
+        self.assertEqual(len(doc.select("section .product-row.variation")), 5)
+
     def test_not_active(self):
         q = Quota.objects.create(event=self.event, name='Quota', size=2)
         item = Item.objects.create(event=self.event, name='Early-bird ticket', default_price=0, active=False)
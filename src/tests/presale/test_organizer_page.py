@@ -5,6 +5,7 @@ from django.utils.timezone import now
 from pytz import UTC
 
 from pretix.base.models import Event, Organizer
+from pretix.base.settings import GlobalSettingsObject
 
 
 @pytest.fixture
@@ -18,6 +19,12 @@ def env():
     return o, event
 
 
+@pytest.fixture(params=[True, False], ids=['index', 'no-index'])
+def calendar_index(request):
+    # Calendars are built from the events directly until the calendar index has been built
+    GlobalSettingsObject().settings.set('calendar_index_built', request.param)
+
+
 @pytest.mark.django_db
 def test_organizer_page_shown(env, client):
     r = client.get('/mrmcd/')
@@ -118,7 +125,7 @@ def test_different_organizer_not_shown(env, client):
 
 
 @pytest.mark.django_db
-def test_calendar(env, client):
+def test_calendar(env, client, calendar_index):
     env[0].settings.event_list_type = 'calendar'
     e = Event.objects.create(
         organizer=env[0], name='MRMCD2017', slug='2017',
@@ -138,7 +145,25 @@ def test_calendar(env, client):
 
 
 @pytest.mark.django_db
-def test_attributes_in_calendar(env, client):
+def test_calendar_subevents(env, client, calendar_index):
+    e = Event.objects.create(
+        organizer=env[0], name='MRMCD2017', slug='2017',
+        date_from=datetime(now().year + 1, 9, 1, tzinfo=UTC),
+        live=True, is_public=True, has_subevents=True
+    )
+    se = e.subevents.create(date_from=datetime(now().year + 1, 10, 3, tzinfo=UTC), name='SE1', active=True)
+    r = client.get('/mrmcd/?style=calendar')
+    assert 'SE1' in r.rendered_content
+    assert 'October %d' % (now().year + 1) in r.rendered_content
+    assert '/mrmcd/2017/{}/'.format(se.pk) in r.rendered_content
+    se.active = False
+    se.save()
+    r = client.get('/mrmcd/?style=calendar&month=10&year=%d' % (now().year + 1))
+    assert 'SE1' not in r.rendered_content
+
+
+@pytest.mark.django_db
+def test_attributes_in_calendar(env, client, calendar_index):
     env[0].settings.event_list_type = 'calendar'
     e = Event.objects.create(
         organizer=env[0], name='MRMCD2017', slug='2017',
@@ -155,7 +180,7 @@ def test_attributes_in_calendar(env, client):
 
 
 @pytest.mark.django_db
-def test_ics(env, client):
+def test_ics(env, client, calendar_index):
     e = Event.objects.create(
         organizer=env[0], name='MRMCD2017', slug='2017',
         date_from=datetime(now().year + 1, 9, 1, tzinfo=UTC),
@@ -170,7 +195,7 @@ def test_ics(env, client):
 
 
 @pytest.mark.django_db
-def test_ics_subevents(env, client):
+def test_ics_subevents(env, client, calendar_index):
     e = Event.objects.create(
         organizer=env[0], name='MRMCD2017', slug='2017',
         date_from=datetime(now().year + 1, 9, 1, tzinfo=UTC),
@@ -183,7 +208,7 @@ def test_ics_subevents(env, client):
 
 
 @pytest.mark.django_db
-def test_ics_subevents_attributes(env, client):
+def test_ics_subevents_attributes(env, client, calendar_index):
     e0 = Event.objects.create(
         organizer=env[0], name='DS2017', slug='DS2017',
         date_from=datetime(now().year + 1, 9, 1, tzinfo=UTC),